@@ -5,4 +5,6 @@
 
 # Imports in this file enable use of common functionality directly from the
 # bailiwick namespace. Thus disable unused imports
-from .context import create_context, get_context  # noqa: F401
+from .context import (  # noqa: F401
+    activate_context, create_context, create_mapped_context, fork_registry, forked_registry,
+    get_context, register_context)
@@ -0,0 +1,547 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Compact, read-only binary layout for frozen contexts.
+
+:func:`dumps` writes a frozen :class:`~bailiwick.collections.ContextDict` into a single buffer.
+:func:`loads` returns a frozen ContextDict backed by a :class:`MappedMapping` which reads
+entries out of the buffer when they are looked up.  Nothing is decoded ahead of time so a buffer
+which lives in shared memory can be used by many processes without each of them keeping its own
+copy of the data.
+
+Layout
+======
+
+All integers are little endian.  The buffer starts with a header::
+
+    magic (8 bytes) | offset of the root mapping (u64) | size of the data (u64)
+
+Every value is stored at an offset which is referred to by the container that holds it.  Values
+start with a one byte tag.  Scalars follow the tag directly.  Tuples, frozensets, and mappings
+are aligned to 8 bytes and hold the offsets of their items.  A mapping holds a table of
+``(key hash, key offset, value offset)`` sorted by key hash so that a key can be found with a
+binary search, followed by the positions in the table in the original iteration order.  Key
+hashes are computed with :func:`hashlib.blake2b` over the encoded key so they are the same in
+every process.
+
+Values which are the same object in the context are only written once.
+
+:class:`~bailiwick.buffers.FrozenBuffer` values are stored as their format, item size, shape,
+and raw bytes.  The bytes are aligned to 8 bytes and are not copied when they are read back.  The
+FrozenBuffer that is returned views the buffer directly and keeps it alive.
+
+Files
+=====
+
+:func:`write_file` saves a context to a file and :func:`open_file` memory maps the file.  Opening
+the file only reads the header.  The operating system pages in the parts of the file that lookups
+touch so data which is never used does not take up memory.
+
+Shared memory
+=============
+
+:func:`export_shared` writes a context into a :class:`multiprocessing.shared_memory.SharedMemory`
+block and :func:`attach_shared` loads it in another process by name.  The pages of the block are
+shared by every process which attaches to it so memory use does not grow with the number of
+worker processes.  The process which exports the context owns the block and must ``close()`` and
+``unlink()`` it once the workers are done with it.  Shared memory requires Python-3.8 or later.
+
+Keys may be None, bools, ints, floats, strings, bytes, or tuples of those.  Keys are matched by
+type as well as by value so ``1``, ``1.0``, and ``True`` are different keys.  Values may be any
+of those types, FrozenBuffers, or frozensets and mappings of them.  Lists and sets are stored as
+tuples and frozensets.
+"""
+
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import typing as t
+
+from collections.abc import Mapping, Set
+
+from .buffers import FrozenBuffer, _from_bytes
+from .collections import ContextDict
+from .errors import MustBeFrozen
+
+__all__ = ('MAGIC', 'MappedMapping', 'attach_shared', 'dumps', 'export_shared', 'loads',
+           'open_file', 'write_file')
+
+
+#: First bytes of every buffer in this format.  The last byte is the format version.
+MAGIC = b'BWCTX\x00\x00\x02'
+
+#: Format versions which can be read.  Version 2 added buffers.
+_VERSIONS = frozenset((1, 2))
+
+_HEADER = struct.Struct('<8sQQ')
+
+_NONE = 0
+_TRUE = 1
+_FALSE = 2
+_INT = 3
+_BIGINT = 4
+_FLOAT = 5
+_STR = 6
+_BYTES = 7
+_TUPLE = 8
+_FROZENSET = 9
+_MAPPING = 10
+_BUFFER = 11
+
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+#: Tag, padding, and item count at the start of a container
+_CONTAINER = struct.Struct('<B3xI')
+#: One row of a mapping's table: key hash, key offset, value offset
+_ENTRY = struct.Struct('<QQQ')
+#: Tag, padding, number of dimensions, item size, and length of the format at the start of a
+#: buffer.  It is followed by the format, padding, the shape, the size of the data, and the data.
+_BUFFER_HEADER = struct.Struct('<B3xIII')
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _key_hash(encoded_key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(encoded_key, digest_size=8).digest(), 'little')
+
+
+def _encode_scalar(value: t.Any) -> t.Optional[bytes]:
+    """Return the encoding of a scalar or None if value is not a scalar."""
+    type_ = type(value)
+    if type_ is str:
+        data = value.encode('utf-8', 'surrogatepass')
+        return bytes((_STR,)) + _U32.pack(len(data)) + data
+    if value is None:
+        return bytes((_NONE,))
+    if type_ is bool:
+        return bytes((_TRUE if value else _FALSE,))
+    if type_ is int:
+        if -2**63 <= value < 2**63:
+            return bytes((_INT,)) + _I64.pack(value)
+        data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+        return bytes((_BIGINT,)) + _U32.pack(len(data)) + data
+    if type_ is float:
+        return bytes((_FLOAT,)) + _F64.pack(value)
+    if type_ is bytes:
+        return bytes((_BYTES,)) + _U32.pack(len(value)) + value
+    return None
+
+
+def _encode_key(key: t.Hashable) -> bytes:
+    encoded = _encode_scalar(key)
+    if encoded is not None:
+        return encoded
+
+    if type(key) is tuple:
+        return b''.join([bytes((_TUPLE,)), _U32.pack(len(key))] + [_encode_key(k) for k in key])
+
+    raise TypeError(f'Keys of type {type(key).__name__} cannot be stored in this format')
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.buffer = bytearray(_HEADER.size)
+        #: Offset that each object which has been written was written to.  Holds the object too
+        #: so that its id cannot be reused.
+        self._memo: t.Dict[int, t.Tuple[t.Any, int]] = {}
+        #: Hash and offset of each encoded key which has been written
+        self._keys: t.Dict[bytes, t.Tuple[int, int]] = {}
+
+    def _align(self) -> None:
+        self.buffer.extend(bytes(-len(self.buffer) % 8))
+
+    def write(self, value: t.Any) -> int:
+        entry = self._memo.get(id(value))
+        if entry is not None:
+            return entry[1]
+
+        encoded = _encode_scalar(value)
+        if encoded is not None:
+            offset = len(self.buffer)
+            self.buffer.extend(encoded)
+        elif isinstance(value, Mapping):
+            offset = self._write_mapping(value)
+        elif isinstance(value, FrozenBuffer):
+            offset = self._write_buffer(value)
+        elif isinstance(value, (tuple, list)):
+            offset = self._write_sequence(_TUPLE, value)
+        elif isinstance(value, Set):
+            offset = self._write_sequence(_FROZENSET, value)
+        else:
+            raise TypeError(f'Values of type {type(value).__name__} cannot be stored in this'
+                            ' format')
+
+        self._memo[id(value)] = (value, offset)
+        return offset
+
+    def _write_sequence(self, tag: int, value: t.Iterable) -> int:
+        offsets = [self.write(item) for item in value]
+
+        self._align()
+        offset = len(self.buffer)
+        self.buffer.extend(_CONTAINER.pack(tag, len(offsets)))
+        self.buffer.extend(struct.pack(f'<{len(offsets)}Q', *offsets))
+        return offset
+
+    def _write_buffer(self, value: FrozenBuffer) -> int:
+        format_ = value.format.encode('ascii')
+        ndim = len(value.shape)
+
+        self._align()
+        offset = len(self.buffer)
+        self.buffer.extend(_BUFFER_HEADER.pack(_BUFFER, ndim, value.itemsize, len(format_)))
+        self.buffer.extend(format_)
+        self._align()
+        self.buffer.extend(struct.pack(f'<{ndim}Q', *value.shape))
+        self.buffer.extend(_U64.pack(value.nbytes))
+        self.buffer.extend(value.memoryview().cast('B'))
+        return offset
+
+    def _write_key(self, key: t.Hashable) -> t.Tuple[int, int]:
+        encoded_key = _encode_key(key)
+        entry = self._keys.get(encoded_key)
+        if entry is None:
+            entry = self._keys[encoded_key] = (_key_hash(encoded_key), len(self.buffer))
+            self.buffer.extend(_U32.pack(len(encoded_key)))
+            self.buffer.extend(encoded_key)
+        return entry
+
+    def _write_mapping(self, value: t.Mapping) -> int:
+        entries = []
+        for position, (key, item) in enumerate(value.items()):
+            key_hash, key_offset = self._write_key(key)
+            entries.append((key_hash, key_offset, self.write(item), position))
+        entries.sort()
+
+        self._align()
+        offset = len(self.buffer)
+        self.buffer.extend(_CONTAINER.pack(_MAPPING, len(entries)))
+        table = [field for entry in entries for field in entry[:3]]
+        self.buffer.extend(struct.pack(f'<{len(table)}Q', *table))
+
+        order = [0] * len(entries)
+        for index, entry in enumerate(entries):
+            order[entry[3]] = index
+        self.buffer.extend(struct.pack(f'<{len(order)}I', *order))
+        return offset
+
+
+def dumps(ctx: ContextDict) -> bytes:
+    """
+    Encode a frozen context into the binary layout.
+
+    :arg ctx: The frozen ContextDict to encode.
+    :returns: The encoded context.
+    :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+    :raises TypeError: if the context holds keys or values which cannot be encoded.
+    """
+    if not ctx.frozen:
+        raise MustBeFrozen('A ContextDict must be frozen before it can be exported')
+
+    writer = _Writer()
+    root = writer.write(ctx)
+    _HEADER.pack_into(writer.buffer, 0, MAGIC, root, len(writer.buffer))
+    return bytes(writer.buffer)
+
+
+class _HashColumn:
+    """Sequence of the key hashes in a mapping's table for when memoryview cannot be used."""
+
+    __slots__ = ('_buffer', '_start', '_count')
+
+    def __init__(self, buffer: memoryview, start: int, count: int) -> None:
+        self._buffer = buffer
+        self._start = start
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> int:
+        return _U64.unpack_from(self._buffer, self._start + index * _ENTRY.size)[0]
+
+
+def _hash_column(buffer: memoryview, start: int, count: int) -> t.Sequence[int]:
+    if _LITTLE_ENDIAN and count:
+        # Every third 8 byte word of the table is a hash.  bisect can search this view of the
+        # buffer directly.
+        return buffer[start:start + count * _ENTRY.size].cast('Q')[::3]
+    return _HashColumn(buffer, start, count)
+
+
+def _product(numbers: t.Iterable[int]) -> int:
+    result = 1
+    for number in numbers:
+        result *= number
+    return result
+
+
+class _Reader:
+    """Decodes values from a buffer in the binary layout."""
+
+    __slots__ = ('buffer', 'owner')
+
+    def __init__(self, buffer: memoryview, owner: t.Any) -> None:
+        self.buffer = buffer
+        #: Object which must be kept alive for the buffer to stay valid
+        self.owner = owner
+
+    def _read_length(self, offset: int) -> t.Tuple[int, int]:
+        return _U32.unpack_from(self.buffer, offset)[0], offset + 4
+
+    def read_key(self, offset: int) -> t.Tuple[t.Any, int]:
+        """Decode an encoded key.  Returns the key and the offset after it."""
+        tag = self.buffer[offset]
+        if tag == _TUPLE:
+            count, offset = self._read_length(offset + 1)
+            items = []
+            for _dummy in range(count):
+                item, offset = self.read_key(offset)
+                items.append(item)
+            return tuple(items), offset
+        return self._read_scalar(tag, offset + 1)
+
+    def _read_scalar(self, tag: int, offset: int) -> t.Tuple[t.Any, int]:
+        if tag == _STR:
+            length, offset = self._read_length(offset)
+            return str(self.buffer[offset:offset + length], 'utf-8', 'surrogatepass'), \
+                offset + length
+        if tag == _INT:
+            return _I64.unpack_from(self.buffer, offset)[0], offset + 8
+        if tag <= _FALSE:
+            return (None, True, False)[tag], offset
+        if tag == _FLOAT:
+            return _F64.unpack_from(self.buffer, offset)[0], offset + 8
+
+        length, offset = self._read_length(offset)
+        data = bytes(self.buffer[offset:offset + length])
+        if tag == _BIGINT:
+            return int.from_bytes(data, 'little', signed=True), offset + length
+        return data, offset + length
+
+    def _read_buffer(self, offset: int) -> FrozenBuffer:
+        _tag, ndim, itemsize, format_length = _BUFFER_HEADER.unpack_from(self.buffer, offset)
+        start = offset + _BUFFER_HEADER.size
+        format_ = str(self.buffer[start:start + format_length], 'ascii')
+        start += format_length
+        start += -start % 8
+        shape = struct.unpack_from(f'<{ndim}Q', self.buffer, start)
+        start += ndim * 8
+        nbytes = _U64.unpack_from(self.buffer, start)[0]
+        start += 8
+
+        data = self.buffer[start:start + nbytes]
+        if len(data) != nbytes or nbytes != itemsize * _product(shape):
+            raise ValueError(f'The buffer at offset {offset} is truncated or corrupt')
+        if not data.readonly:
+            # The data must not be changed through the FrozenBuffer.  Python-3.7 does not have
+            # toreadonly() so the data is copied there.
+            data = data.toreadonly() if hasattr(data, 'toreadonly') else bytes(data)
+        return _from_bytes(data, format_, shape, itemsize, owner=self.owner)
+
+    def read(self, offset: int) -> t.Any:
+        """Decode the value at offset.  Mappings are returned as frozen ContextDicts."""
+        tag = self.buffer[offset]
+        if tag == _MAPPING:
+            return ContextDict._from_store(MappedMapping(self, offset), frozen=True)
+        if tag == _BUFFER:
+            return self._read_buffer(offset)
+
+        if tag in (_TUPLE, _FROZENSET):
+            count = _CONTAINER.unpack_from(self.buffer, offset)[1]
+            start = offset + _CONTAINER.size
+            items = (self.read(item_offset) for item_offset
+                     in struct.unpack_from(f'<{count}Q', self.buffer, start))
+            return tuple(items) if tag == _TUPLE else frozenset(items)
+
+        return self._read_scalar(tag, offset + 1)[0]
+
+
+class MappedMapping(Mapping):
+    """
+    Read-only Mapping over a mapping stored in the binary layout.
+
+    Looking up a key costs a binary search of the mapping's table and decoding that one value.
+    Iterating decodes the keys but not the values.  Nested mappings are returned as frozen
+    ContextDicts backed by MappedMappings over the same buffer.
+    """
+
+    __slots__ = ('_reader', '_count', '_table', '_hashes')
+
+    def __init__(self, reader: _Reader, offset: int) -> None:
+        self._reader = reader
+        self._count = _CONTAINER.unpack_from(reader.buffer, offset)[1]
+        self._table = offset + _CONTAINER.size
+        self._hashes = _hash_column(reader.buffer, self._table, self._count)
+
+    def _find(self, key: t.Hashable) -> int:
+        """Return the offset of the value for key or -1 if it is not present."""
+        try:
+            encoded_key = _encode_key(key)
+        except TypeError:
+            return -1
+
+        key_hash = _key_hash(encoded_key)
+        buffer = self._reader.buffer
+        index = bisect.bisect_left(self._hashes, key_hash)
+        while index < self._count:
+            entry_hash, key_offset, value_offset = _ENTRY.unpack_from(
+                buffer, self._table + index * _ENTRY.size)
+            if entry_hash != key_hash:
+                break
+            length = _U32.unpack_from(buffer, key_offset)[0]
+            if buffer[key_offset + 4:key_offset + 4 + length] == encoded_key:
+                return value_offset
+            index += 1
+        return -1
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        offset = self._find(key)
+        if offset == -1:
+            raise KeyError(key)
+        return self._reader.read(offset)
+
+    def __contains__(self, key: t.Any) -> bool:
+        return self._find(key) != -1
+
+    def __iter__(self) -> t.Iterator[t.Hashable]:
+        buffer = self._reader.buffer
+        order_start = self._table + self._count * _ENTRY.size
+        for position in range(self._count):
+            index = _U32.unpack_from(buffer, order_start + position * 4)[0]
+            key_offset = _ENTRY.unpack_from(buffer, self._table + index * _ENTRY.size)[1]
+            yield self._reader.read_key(key_offset + 4)[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __repr__(self) -> str:
+        return f'MappedMapping({dict(self.items())!r})'
+
+
+def loads(buffer: t.Any, owner: t.Any = None) -> ContextDict:
+    """
+    Return a frozen ContextDict which reads its entries from an encoded buffer.
+
+    :arg buffer: A bytes-like object holding data written by :func:`dumps`.  The data is not
+        copied so the buffer must not be modified while the context is in use.
+    :kwarg owner: An object which the context should keep a reference to for as long as it uses
+        the buffer.  For instance, the mmap or SharedMemory that the buffer belongs to.
+    :raises ValueError: if the buffer does not hold data in this format.
+    """
+    view = memoryview(buffer).cast('B')
+    if len(view) < _HEADER.size:
+        raise ValueError('The buffer is too small to hold a context')
+
+    magic, root, size = _HEADER.unpack_from(view, 0)
+    if magic[:-1] != MAGIC[:-1] or magic[-1] not in _VERSIONS:
+        raise ValueError('The buffer does not hold a context in a format that can be read')
+    if size > len(view):
+        raise ValueError(f'The buffer is truncated.  Expected {size} bytes but it has'
+                         f' {len(view)}')
+
+    # Shared memory may be larger than the data so only look at the data
+    return _Reader(view[:size], owner).read(root)
+
+
+def _shared_memory_type() -> t.Any:
+    try:
+        from multiprocessing.shared_memory import SharedMemory
+    except ImportError:
+        raise NotImplementedError('Sharing contexts through shared memory requires Python-3.8'
+                                  ' or later') from None
+    return SharedMemory
+
+
+def export_shared(ctx: ContextDict, name: t.Optional[str] = None) -> t.Any:
+    """
+    Write a frozen context into a new shared memory block.
+
+    Requires Python-3.8 or later.
+
+    :arg ctx: The frozen ContextDict to export.
+    :kwarg name: Name for the shared memory block.  By default, a unique name is generated.
+    :returns: The :class:`~multiprocessing.shared_memory.SharedMemory`.  Pass its ``name`` to
+        :func:`attach_shared` in other processes.  The caller must ``close()`` and ``unlink()``
+        it when it is no longer needed.
+    :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+    :raises NotImplementedError: on Python-3.7, which does not have
+        :mod:`multiprocessing.shared_memory`.
+    """
+    SharedMemory = _shared_memory_type()  # pylint: disable=invalid-name
+
+    data = dumps(ctx)
+    shm = SharedMemory(name=name, create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+def attach_shared(name: str) -> ContextDict:
+    """
+    Return a frozen ContextDict which reads from a block written by :func:`export_shared`.
+
+    Requires Python-3.8 or later.
+
+    The block is kept open for as long as the returned context, or a nested context retrieved
+    from it, is alive.
+
+    .. note:: Before Python-3.13, attaching registers the block with the process's resource
+        tracker.  Worker processes started by :mod:`multiprocessing` share the exporting
+        process's tracker so this is harmless for them.  An unrelated process which attaches will
+        remove the block when it exits.
+
+    :arg name: Name of the shared memory block.
+    :raises NotImplementedError: on Python-3.7, which does not have
+        :mod:`multiprocessing.shared_memory`.
+    """
+    SharedMemory = _shared_memory_type()  # pylint: disable=invalid-name
+
+    try:
+        shm = SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = SharedMemory(name=name)
+
+    return loads(shm.buf, owner=shm)
+
+
+def write_file(ctx: ContextDict, path: t.Union[str, os.PathLike]) -> None:
+    """
+    Save a frozen context to a file which :func:`open_file` can map.
+
+    The file is written under a temporary name and renamed into place so readers never see a
+    partially written file.
+
+    :arg ctx: The frozen ContextDict to save.
+    :arg path: Path to write the file to.
+    :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+    """
+    data = dumps(ctx)
+    tmp_path = f'{os.fspath(path)}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def open_file(path: t.Union[str, os.PathLike]) -> ContextDict:
+    """
+    Return a frozen ContextDict which reads from a file written by :func:`write_file`.
+
+    The file is memory mapped read-only and kept open for as long as the returned context, or a
+    nested context retrieved from it, is alive.  The file must not be modified while it is in
+    use.  Replace it with :func:`write_file` instead.
+
+    :arg path: Path to the file.
+    :raises ValueError: if the file does not hold a context.
+    """
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            raise ValueError(f'{path} is empty')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(mapped, owner=mapped)
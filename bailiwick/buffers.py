@@ -0,0 +1,265 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Immutable versions of objects which hold their data in a buffer.
+
+:class:`bytearray`, :class:`array.array`, and :class:`memoryview` are Sequences so without
+special rules the freezer would turn them into a tuple with one Python object for each element.
+:class:`~bailiwick.collections.DefaultFreezer` uses the functions here instead.  A bytearray
+becomes :class:`bytes`.  The others become a :class:`FrozenBuffer`, a read-only view of the
+data.  Their data is copied once, as a block, unless it is immutable already.
+
+NumPy arrays are always copied into a FrozenBuffer which holds a read-only array.  NumPy is never
+imported by this module.  Arrays can only exist once something else has imported it.
+"""
+
+import hashlib
+import sys
+import typing as t
+
+__all__ = ('FrozenBuffer', 'buffer_freezer', 'bytearray_freezer', 'is_ndarray_type',
+           'ndarray_freezer')
+
+
+def _numpy() -> t.Any:
+    return sys.modules.get('numpy')
+
+
+def is_ndarray_type(cls: type) -> bool:
+    """Return whether cls is a NumPy array type without importing NumPy."""
+    numpy = _numpy()
+    return numpy is not None and issubclass(cls, numpy.ndarray)
+
+
+class FrozenBuffer:
+    """
+    Read-only, hashable view of a block of data.
+
+    Buffers with the same format, shape, and bytes compare and hash equal.  Elements are compared
+    by their bytes so, unlike for floats, ``NaN`` equals ``NaN`` and ``-0.0`` does not equal
+    ``0.0``.
+
+    The format and shape are kept even when :class:`memoryview` cannot handle the format.  For
+    instance, big-endian and structured NumPy dtypes, ``array('u')``, and NumPy dtypes which have
+    no buffer format such as ``datetime64``.  Elements of those formats can only be read through
+    :attr:`obj` when it is a NumPy array.
+    """
+
+    __slots__ = ('_obj', '_view', '_format', '_shape', '_itemsize', '_hash', '_owner')
+
+    #: Tells :class:`~bailiwick.collections.DefaultFreezer` not to copy these
+    _bailiwick_immutable = True
+
+    def __init__(self, obj: t.Any) -> None:
+        """
+        :arg obj: Object which holds the data.  It must be immutable, C-contiguous, and support
+            the buffer protocol.  The freezer functions in this module make a FrozenBuffer from
+            mutable objects.
+        """
+        view = memoryview(obj)
+        self._obj = obj
+        #: View of the data.  It is read-only because obj is.
+        self._view: memoryview = view
+        self._format: str = view.format
+        self._shape: t.Tuple[int, ...] = view.shape
+        self._itemsize: int = view.itemsize
+        self._hash: t.Optional[int] = None
+        #: Object which must be kept alive for obj to stay valid.
+        self._owner: t.Any = None
+
+    @classmethod
+    def _from_view(cls, obj: t.Any, view: memoryview, format_: str, shape: t.Sequence[int],
+                   itemsize: int, owner: t.Any = None) -> 'FrozenBuffer':
+        """
+        Create a FrozenBuffer whose format and shape are not those of view.
+
+        :arg view: Read-only, C-contiguous view of the data.  When memoryview does not support
+            format_ this is a view of the bytes.
+        :arg owner: Object which must be kept alive for the view to stay valid.  Set for buffers
+            read by :mod:`bailiwick.binary`.
+        """
+        buffer = cls.__new__(cls)
+        buffer._obj = obj
+        buffer._view = view
+        buffer._format = format_
+        buffer._shape = tuple(shape)
+        buffer._itemsize = itemsize
+        buffer._hash = None
+        buffer._owner = owner
+        return buffer
+
+    @property
+    def obj(self) -> t.Any:
+        """
+        The read-only object which holds the data.
+
+        This is a read-only :class:`memoryview` with the format and shape of the original object
+        or, for NumPy arrays, a NumPy array whose ``writeable`` flag is False.  When a buffer whose
+        format memoryview cannot cast to is unpickled or read by :mod:`bailiwick.binary`, this is
+        a view of the bytes.
+        """
+        return self._obj
+
+    @property
+    def format(self) -> str:
+        return self._format
+
+    @property
+    def shape(self) -> t.Tuple[int, ...]:
+        return self._shape
+
+    @property
+    def itemsize(self) -> int:
+        return self._itemsize
+
+    @property
+    def nbytes(self) -> int:
+        return self._view.nbytes
+
+    def memoryview(self) -> memoryview:
+        """
+        Return a read-only memoryview of the data.
+
+        Its format and shape are :attr:`format` and :attr:`shape` unless memoryview cannot
+        handle the format.  Then it is a view of the bytes.
+        """
+        return self._view
+
+    def tobytes(self) -> bytes:
+        return self._view.tobytes()
+
+    def _typed(self) -> t.Any:
+        # The object whose elements have this buffer's format
+        obj = self._obj
+        if type(obj) is memoryview and obj.format != self._format:
+            raise NotImplementedError(f'The elements of a FrozenBuffer of format'
+                                      f' {self._format!r} cannot be read')
+        return obj
+
+    def tolist(self) -> t.List:
+        return self._typed().tolist()
+
+    def __len__(self) -> int:
+        if not self._shape:
+            raise TypeError('0-dim memory has no length')
+        return self._shape[0]
+
+    def __getitem__(self, index: t.Any) -> t.Any:
+        return self._typed()[index]
+
+    def _bytes_view(self) -> memoryview:
+        return self._view.cast('B')
+
+    def __hash__(self) -> int:
+        # Cached because hashing reads all of the data
+        if self._hash is None:
+            data_digest = hashlib.blake2b(self._bytes_view(), digest_size=16).digest()
+            self._hash = hash((self._format, self._shape, data_digest))
+        return self._hash
+
+    def __eq__(self, other: t.Any) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, FrozenBuffer):
+            return NotImplemented
+        if self._format != other._format or self._shape != other._shape:
+            return False
+        if self._hash is not None and other._hash is not None and self._hash != other._hash:
+            return False
+        # Comparing byte views compares the memory directly rather than element by element
+        return self._bytes_view() == other._bytes_view()
+
+    def __reduce__(self) -> t.Tuple:
+        if is_ndarray_type(type(self._obj)):
+            # Pickling the array itself loses the byte order of some dtypes
+            return (_restore_ndarray_bytes, (self.tobytes(), self._obj.dtype, self._shape))
+        return (_restore_buffer, (self.tobytes(), self._format, self._shape, self._itemsize))
+
+    def __repr__(self) -> str:
+        return f'FrozenBuffer(format={self.format!r}, shape={self.shape!r})'
+
+
+def _cast_view(data: t.Any, format_: str, shape: t.Sequence[int]) -> t.Any:
+    view = memoryview(data)
+    try:
+        return view.cast(format_, shape)
+    except (TypeError, ValueError):
+        # memoryview can only cast to native single character formats.  Keep the bytes.
+        return view.cast('B')
+
+
+def _from_bytes(data: t.Any, format_: str, shape: t.Sequence[int], itemsize: int,
+                owner: t.Any = None) -> FrozenBuffer:
+    """Create a FrozenBuffer from read-only bytes and the format and shape they had."""
+    view = _cast_view(data, format_, shape)
+    return FrozenBuffer._from_view(view, view, format_, shape, itemsize, owner)
+
+
+def _restore_buffer(data: bytes, format_: str, shape: t.Sequence[int],
+                    itemsize: t.Optional[int] = None) -> FrozenBuffer:
+    if itemsize is None:
+        # Pickled before the item size was recorded
+        return FrozenBuffer(_cast_view(data, format_, shape))
+    return _from_bytes(data, format_, shape, itemsize)
+
+
+def _wrap_ndarray(array: t.Any) -> FrozenBuffer:
+    # array must be read-only and C-contiguous
+    try:
+        return FrozenBuffer(array)
+    except (TypeError, ValueError, BufferError):
+        # dtypes such as datetime64 have no buffer format.  View the bytes instead.
+        view = memoryview(array.reshape(-1).view('u1'))
+        return FrozenBuffer._from_view(array, view, array.dtype.str, array.shape,
+                                       array.dtype.itemsize)
+
+
+def _restore_ndarray(array: t.Any) -> FrozenBuffer:
+    # Restores FrozenBuffers which were pickled with the array
+    array.setflags(write=False)
+    return _wrap_ndarray(array)
+
+
+def _restore_ndarray_bytes(data: bytes, dtype: t.Any, shape: t.Sequence[int]) -> FrozenBuffer:
+    # Unpickling dtype imported NumPy
+    array = _numpy().frombuffer(data, dtype=dtype).reshape(shape)
+    return _wrap_ndarray(array)
+
+
+def bytearray_freezer(obj: bytearray) -> bytes:
+    return bytes(obj)
+
+
+def buffer_freezer(obj: t.Any) -> FrozenBuffer:
+    """
+    Freeze an object which supports the buffer protocol, such as an :class:`array.array` or a
+    :class:`memoryview`.
+
+    Read-only memoryviews of :class:`bytes` are already immutable and are used without copying.
+    Anything else is copied once into a bytes object.
+    """
+    view = obj if isinstance(obj, memoryview) else memoryview(obj)
+    if view.readonly and type(view.obj) is bytes and view.c_contiguous:
+        return FrozenBuffer(view)
+    return _from_bytes(view.tobytes(), view.format, view.shape, view.itemsize)
+
+
+def ndarray_freezer(obj: t.Any) -> FrozenBuffer:
+    """
+    Freeze a NumPy array.
+
+    The array is always copied once into a new read-only array.  An array which is read-only
+    already is copied as well because whoever holds it can make it writeable again.  Arrays whose
+    dtype has no buffer format, such as ``datetime64``, are hashed and compared by their bytes and
+    their dtype.
+
+    :raises TypeError: if the array holds Python objects.  Those have no buffer to share.
+    """
+    if obj.dtype.hasobject:
+        raise TypeError('NumPy arrays of Python objects cannot be frozen')
+
+    obj = _numpy().array(obj, order='C', copy=True)
+    obj.setflags(write=False)
+    return _wrap_ndarray(obj)
@@ -3,12 +3,27 @@
 # License: LGPLv3+
 # Copyright: Toshio Kuratomi, 2021
 
+import array
+import collections
+import functools
+import itertools
+import operator
+import sys
+import threading
 import typing as t
 
-from collections.abc import Container, Mapping, Sequence, Set
-from itertools import chain
+from collections.abc import Mapping, Sequence, Set
 
-from .errors import MustBeFrozen
+from .buffers import buffer_freezer, bytearray_freezer, is_ndarray_type, ndarray_freezer
+from .errors import CyclicData, MustBeFrozen
+from .lazy import LazyFrozenMap
+from .overlay import MAX_OVERLAY_DEPTH, OverlayMap
+from .paths import PATH_SEPARATOR, PathIndex
+from .persistent import PersistentMap, PersistentMapBuilder
+
+if t.TYPE_CHECKING:
+    from .pool import InternPool  # pylint: disable=unused-import
+    from .schema import Schema  # pylint: disable=unused-import
 
 
 class FreezeRuleDoesNotMatch(Exception):
@@ -31,100 +46,732 @@ def identity_freezer(obj: t.Any) -> t.Any:
     return obj
 
 
+#: Nesting depth at which the recursive freezer switches to keeping containers on an explicit
+#: stack.  This keeps freezing deeply nested data from raising :exc:`RecursionError`.
+MAX_RECURSION_DEPTH = 100
+
+#: Number of frozen tuples and frozensets holding nested containers which a freezer remembers.
+#: Freezing one of them again returns it without looking at its items.
+FROZEN_CONTAINER_CACHE_SIZE = 1024
+
+#: A rule for a builtin container type.  It takes the container and the current nesting depth.
+_ContainerRule = t.Callable[[t.Any, int], t.Any]
+
+#: State of a container that the iterative freezer is part of the way through freezing.  This is
+#: an iterator of (key, value) pairs from the container, a mutable object to store the frozen
+#: values in by key, and a function to turn that object into the frozen container.  If the
+#: container could be frozen right away, the iterator is None and the second element is the
+#: frozen container.
+_Frame = t.Tuple[t.Optional[t.Iterator[t.Tuple[t.Any, t.Any]]], t.Any,
+                 t.Optional[t.Callable[[t.Any], t.Any]]]
+
+#: Function which starts the iterative freezing of a container.
+_FrameFactory = t.Callable[['DefaultFreezer', t.Any], _Frame]
+
+
+#: Marks a container in the memo which is still being frozen.
+_IN_PROGRESS = object()
+
+#: Returned when a container is not in the memo.
+_NOT_FOUND = object()
+
+
+class _Memo(dict):
+    """
+    Frozen versions of the containers seen while freezing a value.
+
+    This is keyed by the id() of the original container.  The values are tuples of the original
+    container (so that it cannot be garbage collected and have its id reused) and the frozen
+    container.
+    """
+
+    __slots__ = ('hits', 'reused')
+
+    def __init__(self) -> None:
+        super().__init__()
+        #: Number of times a container was found in the memo instead of being frozen again.
+        self.hits = 0
+        #: Number of containers which were already immutable and were returned without copying.
+        self.reused = 0
+
+    def lookup(self, obj: t.Any) -> t.Any:
+        """Return the frozen version of obj or :data:`_NOT_FOUND` if obj has not been seen."""
+        entry = self.get(id(obj))
+        if entry is None:
+            return _NOT_FOUND
+
+        if entry[1] is _IN_PROGRESS:
+            raise CyclicData(f'Cannot freeze a {type(obj).__name__} which contains itself.')
+
+        self.hits += 1
+        return entry[1]
+
+
+def _unchanged(original: t.Iterable, new_items: t.List) -> bool:
+    """Whether freezing the items of a container returned every item as it was."""
+    return all(map(operator.is_, new_items, original))
+
+
+def _tuple_from(original: t.Sequence, new_items: t.List) -> tuple:
+    if type(original) is tuple and _unchanged(original, new_items):
+        return original
+    return tuple(new_items)
+
+
+def _frozenset_from(original: t.AbstractSet, new_items: t.List) -> frozenset:
+    if type(original) is frozenset and _unchanged(original, new_items):
+        return original
+    return frozenset(new_items)
+
+
+def _mapping_frame(freezer: 'DefaultFreezer', obj: t.Mapping) -> _Frame:
+    if freezer._leaf_types.issuperset(map(type, obj.values())):
+        return None, freezer._finish_mapping(dict(obj)), None
+    return iter(obj.items()), {}, freezer._finish_mapping
+
+
+def _sequence_frame(freezer: 'DefaultFreezer', obj: t.Sequence) -> _Frame:
+    if freezer._frozen_containers.get(id(obj)) is obj:
+        return None, obj, None
+    if freezer._leaf_types.issuperset(map(type, obj)):
+        return None, tuple(obj), None
+    return enumerate(obj), [None] * len(obj), functools.partial(freezer._finish_sequence, obj)
+
+
+def _set_frame(freezer: 'DefaultFreezer', obj: t.AbstractSet) -> _Frame:
+    if freezer._frozen_containers.get(id(obj)) is obj:
+        return None, obj, None
+    if freezer._leaf_types.issuperset(map(type, obj)):
+        return None, frozenset(obj), None
+    return enumerate(obj), [None] * len(obj), functools.partial(freezer._finish_set, obj)
+
+
+def _context_dict_frame(freezer: 'DefaultFreezer', obj: 'ContextDict') -> _Frame:
+    if obj._frozen and obj.freezer is freezer:
+        return None, obj, None
+    return _mapping_frame(freezer, obj)
+
+
+def _predicated_frame(frame_type: _FrameFactory, freezer: 'DefaultFreezer', obj: t.Any) -> _Frame:
+    for rule in freezer.pre_rules:
+        try:
+            return None, rule(obj), None
+        except FreezeRuleDoesNotMatch:
+            continue
+
+    return frame_type(freezer, obj)
+
+
+#: How much of the data one call of a :class:`DefaultFreezer` reused.  ``deduplicated`` is the
+#: number of references to containers which had already been frozen in that call and ``reused``
+#: is the number of containers which were already immutable.
+FreezeStats = collections.namedtuple('FreezeStats', ('deduplicated', 'reused'))
+
+
 class DefaultFreezer:
+    """
+    Recursively convert a container and the objects inside of it into immutable data types.
+
+    The rule used for a value is chosen by the value's concrete type.  The first time a type is
+    seen its rule is resolved and cached so that later values of that type are dispatched with
+    a single dictionary lookup.  Rules are resolved in this order:
+
+    * Rules added with :meth:`register` for the type or one of its base classes.
+    * ``pre_rules``, the builtin rules, and then ``post_rules``.  ``pre_rules`` and ``post_rules``
+      are predicates which raise :exc:`FreezeRuleDoesNotMatch` when they do not apply so they are
+      tried on every value of a type that has no registered rule.  The builtin rules only depend
+      on the type so the one which matches is cached along with the type.  Types with a true
+      ``_bailiwick_immutable`` class attribute, such as the records made by
+      :class:`~bailiwick.schema.Schema`, are returned unchanged instead of using a builtin rule.
+      Buffers are not treated as Sequences: :class:`bytearray` becomes :class:`bytes` and
+      :class:`array.array`, :class:`memoryview`, and NumPy arrays become a
+      :class:`~bailiwick.buffers.FrozenBuffer` so their elements are not expanded into a tuple.
+    * If nothing matches, the value is returned unchanged.
+
+    Nested containers are frozen by recursive calls until they are :data:`MAX_RECURSION_DEPTH`
+    levels deep.  Containers nested deeper than that are kept on an explicit stack instead so
+    deeply nested data does not raise :exc:`RecursionError`.  Setting ``iterative`` to True uses
+    the explicit stack from the start so that freezing uses a constant amount of the Python stack.
+    The output is the same either way.  Values handled by registered rules are always frozen by
+    calling the rule.
+
+    If a :class:`~bailiwick.pool.InternPool` is given as ``pool``, the tuples, frozensets,
+    ContextDicts, strings, bytes and string keys that the freezer outputs are interned in it.
+    Values which are frozen separately but have the same contents then share one instance.
+
+    Data which is already immutable is reused rather than copied.  That covers ContextDicts
+    which this freezer has frozen before and tuples and frozensets whose contents did not need to
+    change.  Re-freezing data which was derived from frozen data, for instance with
+    :meth:`ContextDict.union`, then only copies the new parts.  Frozen ContextDicts are returned
+    without looking at their values.  So are the last :data:`FROZEN_CONTAINER_CACHE_SIZE` tuples
+    and frozensets with nested containers which this freezer returned.  The freezer keeps those
+    alive until they are pushed out by newer ones.  Tuples and frozensets which only hold
+    values that freeze to themselves are checked by the types of their items.
+
+    Within one call, a container which is referenced from several places in the data is only
+    frozen once and the frozen copy is shared by all of the places which referenced it.
+    Containers which contain themselves cannot be frozen and raise
+    :exc:`~bailiwick.errors.CyclicData`.
+
+    :meth:`freeze_with_stats` returns how many containers one call deduplicated and reused.
+    :attr:`deduplicated` and :attr:`reused` are the totals over every call that has been made
+    with this freezer, from any thread.  The default freezer is shared by every ContextDict so its
+    totals are process-wide.
+
+    .. note:: Types are checked against abstract base classes when they are first seen.
+        Registering a virtual subclass with an abc after that will not change the cached rule.
+    """
+
     def __init__(self, pre_rules: t.Optional[t.Sequence] = None,
-                 post_rules: t.Optional[t.Sequence] = None) -> None:
-        self.pre_rules: t.Sequence = pre_rules or tuple()
-        self._rules: t.Sequence = (string_freezer, bytes_freezer, self.mapping_freezer,
-                                   self.sequence_freezer, self.set_freezer)
+                 post_rules: t.Optional[t.Sequence] = None,
+                 iterative: bool = False, pool: t.Optional['InternPool'] = None) -> None:
+        self.iterative = iterative
+        self._pool = pool
+        self._sealed = False
+        #: Total number of references to already frozen containers which were reused instead of
+        #: freezing the container again.
+        self.deduplicated: int = 0
+        #: Total number of containers which were already immutable and were returned without
+        #: copying.
+        self.reused: int = 0
+        #: Guards the totals.  Calls can be made from several threads at once.
+        self._stats_lock = threading.Lock()
+        #: Tuples and frozensets with nested containers which this freezer returned, oldest
+        #: first.  Keyed by id.  Holding them keeps their ids from being reused.
+        self._frozen_containers: t.Dict[int, t.Any] = collections.OrderedDict()
+        self._pre_rules: t.Sequence = pre_rules or tuple()
+        self._post_rules: t.Sequence = post_rules or tuple()
 
-        self.post_rules: t.Sequence = post_rules or tuple()
+        #: Rules that the user has registered for specific types.
+        self._type_rules: t.Dict[type, t.Callable[[t.Any], t.Any]] = {}
+        #: Builtin rules.  These are checked in order after the pre_rules.
+        self._rules: t.Dict[type, t.Callable] = {
+            str: identity_freezer,
+            bytes: identity_freezer,
+            bytearray: bytearray_freezer,
+            memoryview: buffer_freezer,
+            array.array: buffer_freezer,
+            ContextDict: self._freeze_context_dict,
+            Mapping: self._freeze_mapping,
+            Sequence: self._freeze_sequence,
+            Set: self._freeze_set,
+        }
+        self._frame_types: t.Dict[t.Callable, _FrameFactory] = {
+            self._rules[ContextDict]: _context_dict_frame,
+            self._rules[Mapping]: _mapping_frame,
+            self._rules[Sequence]: _sequence_frame,
+            self._rules[Set]: _set_frame,
+        }
 
-    def mapping_freezer(self, obj: t.Any) -> 'ContextDict':
-        if not isinstance(obj, Mapping):
-            raise FreezeRuleDoesNotMatch
+        #: Cache of concrete type to the rule which handles it.  For builtin container types,
+        #: this also holds the function to start freezing the container iteratively.  For other
+        #: types, that is None.
+        self._dispatch: t.Dict[type, t.Tuple[t.Optional[_FrameFactory], t.Callable]] = {}
+        #: Types which have been resolved to a rule that returns the value unchanged.  Containers
+        #: whose values are all of these types can be copied without looking at each value.
+        self._leaf_types: t.Set[type] = set()
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        state = self.__dict__.copy()
+        del state['_stats_lock']
+        state['_frozen_containers'] = collections.OrderedDict()
+        return state
+
+    def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+        self.__dict__.update(state)
+        self._stats_lock = threading.Lock()
+
+    @property
+    def pool(self) -> t.Optional['InternPool']:
+        return self._pool
+
+    @property
+    def pre_rules(self) -> t.Sequence:
+        return self._pre_rules
+
+    @pre_rules.setter
+    def pre_rules(self, rules: t.Sequence) -> None:
+        self._check_not_sealed('setting pre_rules')
+        self._pre_rules = rules
+        self._clear_caches()
+
+    @property
+    def post_rules(self) -> t.Sequence:
+        return self._post_rules
+
+    @post_rules.setter
+    def post_rules(self, rules: t.Sequence) -> None:
+        self._check_not_sealed('setting post_rules')
+        self._post_rules = rules
+        self._clear_caches()
+
+    @property
+    def sealed(self) -> bool:
+        return self._sealed
+
+    def seal(self) -> None:
+        """
+        Prevent the rules from being changed.
+
+        A freezer which is shared by many ContextDicts is sealed so that changing it for one of
+        them cannot change how the others are frozen.
+        """
+        self._sealed = True
+
+    def _check_not_sealed(self, name: str) -> None:
+        if self._sealed:
+            raise AttributeError(f'DefaultFreezer object does not support {name} once sealed.'
+                                 ' Create a new DefaultFreezer instead')
+
+    def register(self, type_: type, rule: t.Callable[[t.Any], t.Any]) -> None:
+        """
+        Use ``rule`` to freeze values of ``type_`` and its subclasses.
 
+        Registered rules take precedence over the ``pre_rules``, the builtin rules, and the
+        ``post_rules``.  Unlike those, a registered rule is always used for its type so it should
+        not raise :exc:`FreezeRuleDoesNotMatch`.
+
+        :arg type_: The type which the rule handles.
+        :arg rule: Function which takes a value of ``type_`` and returns an immutable version of it.
+        """
+        self._check_not_sealed('register()')
+        self._type_rules[type_] = rule
+        self._clear_caches()
+
+    def _clear_caches(self) -> None:
+        self._dispatch.clear()
+        self._leaf_types.clear()
+        self._frozen_containers.clear()
+
+    @staticmethod
+    def _find_rule(cls: type, rules: t.Mapping[type, t.Callable]) -> t.Optional[t.Callable]:
+        # Exact types and real base classes first so that the most specific rule wins
+        for base in cls.__mro__:
+            if base in rules:
+                return rules[base]
+
+        # Then abcs and other virtual base classes
+        for type_, rule in rules.items():
+            if issubclass(cls, type_):
+                return rule
+
+        return None
+
+    def _resolve(self, cls: type) -> t.Tuple[t.Optional[_FrameFactory], t.Callable]:
+        rule = self._find_rule(cls, self._type_rules)
+        if rule is not None:
+            return None, rule
+
+        if getattr(cls, '_bailiwick_immutable', False):
+            # Types which declare that their instances are immutable (for instance, schema
+            # records) are never copied
+            rule = identity_freezer
+        elif is_ndarray_type(cls):
+            rule = ndarray_freezer
+        else:
+            rule = self._find_rule(cls, self._rules)
+        if rule is identity_freezer and self._pool is not None:
+            # Strings and bytes
+            rule = self._pool.intern
+        frame_type = self._frame_types.get(rule)
+        if self._pre_rules or self._post_rules:
+            if frame_type is not None:
+                frame_type = functools.partial(_predicated_frame, frame_type)
+            return frame_type, functools.partial(self._apply_predicate_rules, rule)
+
+        return frame_type, rule or identity_freezer
+
+    def _lookup(self, cls: type) -> t.Tuple[t.Optional[_FrameFactory], t.Callable]:
+        try:
+            return self._dispatch[cls]
+        except KeyError:
+            pass
+
+        entry = self._dispatch[cls] = self._resolve(cls)
+        if entry[1] is identity_freezer:
+            self._leaf_types.add(cls)
+        return entry
+
+    def _apply_predicate_rules(self, builtin_rule: t.Optional[t.Callable], obj: t.Any,
+                               depth: int = 0, memo: t.Optional[_Memo] = None) -> t.Any:
+        for rule in self._pre_rules:
+            try:
+                return rule(obj)
+            except FreezeRuleDoesNotMatch:
+                continue
+
+        if builtin_rule in self._frame_types:
+            return builtin_rule(obj, depth, _Memo() if memo is None else memo)
+
+        if builtin_rule is not None:
+            return builtin_rule(obj)
+
+        for rule in self._post_rules:
+            try:
+                return rule(obj)
+            except FreezeRuleDoesNotMatch:
+                continue
+
+        return obj
+
+    def _start_frame(self, frame_type: _FrameFactory, obj: t.Any, memo: _Memo
+                     ) -> t.Tuple[t.Optional[t.Iterator[t.Tuple[t.Any, t.Any]]], t.Any,
+                                  t.Optional[t.Callable[[t.Any], t.Any]], t.Any]:
+        frozen = memo.lookup(obj)
+        if frozen is not _NOT_FOUND:
+            return None, frozen, None, obj
+
+        items, result, finish = frame_type(self, obj)
+        if items is not None:
+            memo[id(obj)] = (obj, _IN_PROGRESS)
+        else:
+            result = self._finish(obj, result, memo)
+            memo[id(obj)] = (obj, result)
+        return items, result, finish, obj
+
+    def _freeze_iteratively(self, obj: t.Any, memo: _Memo) -> t.Any:
+        dispatch = self._dispatch
+        # Start with a frame that only holds obj so it is handled like any nested value
+        items, result, finish, source = enumerate((obj,)), [None], operator.itemgetter(0), None
+        stack = []
+        while True:
+            for key, value in items:
+                try:
+                    frame_type, rule = dispatch[type(value)]
+                except KeyError:
+                    frame_type, rule = self._lookup(type(value))
+
+                if frame_type is not None:
+                    frame = self._start_frame(frame_type, value, memo)
+                    if frame[0] is not None:
+                        # Save our place and descend into the nested container
+                        stack.append((items, result, finish, source, key))
+                        items, result, finish, source = frame
+                        break
+                    value = frame[1]
+
+                elif rule is not identity_freezer:
+                    value = rule(value)
+                result[key] = value
+            else:
+                value = finish(result)
+                if not stack:
+                    return value
+                value = self._finish(source, value, memo)
+                memo[id(source)] = (source, value)
+                items, result, finish, source, key = stack.pop()
+                result[key] = value
+
+    def _freeze_container(self, rule: _ContainerRule, obj: t.Any, depth: int,
+                          memo: _Memo) -> t.Any:
+        # Only finished containers are added to the memo here.  A container which contains itself
+        # makes the recursion deeper than MAX_RECURSION_DEPTH and then the iterative freezer
+        # detects the cycle.
+        obj_id = id(obj)
+        entry = memo.get(obj_id)
+        if entry is not None:
+            memo.hits += 1
+            return entry[1]
+
+        if depth >= MAX_RECURSION_DEPTH:
+            return self._freeze_iteratively(obj, memo)
+
+        frozen = self._finish(obj, rule(obj, depth, memo), memo)
+        memo[obj_id] = (obj, frozen)
+        return frozen
+
+    def _finish(self, obj: t.Any, frozen: t.Any, memo: _Memo) -> t.Any:
+        if frozen is obj:
+            memo.reused += 1
+            if isinstance(obj, ContextDict):
+                # This freezer created it so it is already in the pool
+                return obj
+        if self._pool is not None:
+            frozen = self._pool.intern(frozen)
+        return frozen
+
+    def _freeze_items(self, obj: t.Mapping, depth: int, memo: _Memo) -> t.Dict:
+        dispatch = self._dispatch
+        depth += 1
         new_dict = {}
         for key, value in obj.items():
-            if isinstance(value, Container):
-                value = self.__call__(value)
+            try:
+                frame_type, rule = dispatch[type(value)]
+            except KeyError:
+                frame_type, rule = self._lookup(type(value))
+
+            if frame_type is not None:
+                value = self._freeze_container(rule, value, depth, memo)
+            elif rule is not identity_freezer:
+                value = rule(value)
             new_dict[key] = value
 
-        new_dict = ContextDict.new(new_dict, freezer=self)
-        new_dict._frozen = True
         return new_dict
 
-    def _make_contained_containers_immutable(self, obj: t.Union[Sequence, Set]) -> t.List:
+    def _make_contained_containers_immutable(self, obj: t.Iterable, depth: int,
+                                             memo: _Memo) -> t.List:
+        dispatch = self._dispatch
+        depth += 1
         new_list = []
         for value in obj:
-            if isinstance(value, Container):
-                value = self.__call__(value)
+            try:
+                frame_type, rule = dispatch[type(value)]
+            except KeyError:
+                frame_type, rule = self._lookup(type(value))
+
+            if frame_type is not None:
+                value = self._freeze_container(rule, value, depth, memo)
+            elif rule is not identity_freezer:
+                value = rule(value)
             new_list.append(value)
+
         return new_list
 
+    def _freeze_context_dict(self, obj: 'ContextDict', depth: int, memo: _Memo) -> 'ContextDict':
+        if obj._frozen and obj.freezer is self:
+            # Everything inside of it has been through this freezer already
+            return obj
+        return self._freeze_mapping(obj, depth, memo)
+
+    def _freeze_mapping(self, obj: t.Mapping, depth: int, memo: _Memo) -> 'ContextDict':
+        if self._leaf_types.issuperset(map(type, obj.values())):
+            return self._finish_mapping(dict(obj))
+        return self._finish_mapping(self._freeze_items(obj, depth, memo))
+
+    def _finish_mapping(self, new_dict: t.Dict) -> 'ContextDict':
+        if self._pool is not None:
+            intern = self._pool.intern
+            new_dict = {intern(key) if type(key) is str else key: value
+                        for key, value in new_dict.items()}
+
+        return ContextDict._from_store(new_dict, freezer=self, frozen=True)
+
+    def _remember(self, frozen: t.Any) -> t.Any:
+        cache = self._frozen_containers
+        if len(cache) >= FROZEN_CONTAINER_CACHE_SIZE:
+            # Forget the oldest.  Another thread may have emptied the cache already.
+            try:
+                cache.popitem(last=False)
+            except KeyError:
+                pass
+        cache[id(frozen)] = frozen
+        return frozen
+
+    def _finish_sequence(self, original: t.Sequence, new_items: t.List) -> tuple:
+        return self._remember(_tuple_from(original, new_items))
+
+    def _finish_set(self, original: t.AbstractSet, new_items: t.List) -> frozenset:
+        return self._remember(_frozenset_from(original, new_items))
+
+    def _freeze_sequence(self, obj: t.Sequence, depth: int, memo: _Memo) -> tuple:
+        if self._frozen_containers.get(id(obj)) is obj:
+            return obj
+        if self._leaf_types.issuperset(map(type, obj)):
+            return tuple(obj)
+        return self._finish_sequence(
+            obj, self._make_contained_containers_immutable(obj, depth, memo))
+
+    def _freeze_set(self, obj: t.AbstractSet, depth: int, memo: _Memo) -> frozenset:
+        if self._frozen_containers.get(id(obj)) is obj:
+            return obj
+        if self._leaf_types.issuperset(map(type, obj)):
+            return frozenset(obj)
+        return self._finish_set(obj, self._make_contained_containers_immutable(obj, depth, memo))
+
+    def _freeze_root(self, rule: _ContainerRule, obj: t.Any) -> t.Any:
+        memo = _Memo()
+        frozen = self._freeze_container(rule, obj, 0, memo)
+        self._add_stats(memo)
+        return frozen
+
+    def mapping_freezer(self, obj: t.Any) -> 'ContextDict':
+        if not isinstance(obj, Mapping):
+            raise FreezeRuleDoesNotMatch
+        return self._freeze_root(self._freeze_mapping, obj)
+
     def sequence_freezer(self, obj: t.Any) -> tuple:
         if not isinstance(obj, Sequence):
             raise FreezeRuleDoesNotMatch
-
-        return tuple(self._make_contained_containers_immutable(obj))
+        return self._freeze_root(self._freeze_sequence, obj)
 
     def set_freezer(self, obj: t.Any) -> frozenset:
         if not isinstance(obj, Set):
             raise FreezeRuleDoesNotMatch
+        return self._freeze_root(self._freeze_set, obj)
 
-        return frozenset(self._make_contained_containers_immutable(obj))
+    def _add_stats(self, memo: _Memo) -> None:
+        if memo.hits or memo.reused:
+            with self._stats_lock:
+                self.deduplicated += memo.hits
+                self.reused += memo.reused
 
-    def __call__(self, obj: t.Any) -> t.Any:
-        """Recursively convert a container and objects inside into immutable data types."""
-        for rule in chain(self.pre_rules, self._rules, self.post_rules):
+    def _freeze(self, obj: t.Any, memo: _Memo) -> t.Any:
+        if self.iterative:
+            frozen = self._freeze_iteratively(obj, memo)
+        else:
             try:
-                return rule(obj)
-            except FreezeRuleDoesNotMatch:
-                continue
+                frame_type, rule = self._dispatch[type(obj)]
+            except KeyError:
+                frame_type, rule = self._lookup(type(obj))
 
-        return obj
+            if frame_type is not None:
+                frozen = self._freeze_container(rule, obj, 0, memo)
+            else:
+                frozen = rule(obj)
+
+        self._add_stats(memo)
+        return frozen
+
+    def freeze_with_stats(self, obj: t.Any) -> t.Tuple[t.Any, FreezeStats]:
+        """
+        Freeze obj like calling the freezer does and report how much of it was reused.
+
+        :returns: The frozen value and a :data:`FreezeStats` for this call only.
+        """
+        memo = _Memo()
+        frozen = self._freeze(obj, memo)
+        return frozen, FreezeStats(memo.hits, memo.reused)
+
+    def __call__(self, obj: t.Any) -> t.Any:
+        """Recursively convert a container and objects inside into immutable data types."""
+        return self._freeze(obj, _Memo())
 
 
 class ContextDict(Mapping):
+    __slots__ = ('_store', '_must_be_frozen', 'freezer', '_frozen', '_hash', '_digest', '_paths',
+                 '__weakref__')
+
     def __init__(self, *args, **kwargs) -> None:
         self._store: t.Dict = dict(*args, **kwargs)
         self._must_be_frozen: bool = True
-        self.freezer: t.Callable[[t.Any], t.Any] = DefaultFreezer()
+        self.freezer: t.Callable[[t.Any], t.Any] = _DEFAULT_FREEZER
         self._frozen: bool = False
+        #: Hash of the contents.  Computed the first time a frozen ContextDict is hashed.
+        self._hash: t.Optional[int] = None
+        #: Digest of the contents.  Computed by :func:`bailiwick.delta.digest`.
+        self._digest: t.Optional[bytes] = None
+        #: Index of the nested values by path.  Only built when freeze() is asked to.
+        self._paths: t.Optional[PathIndex] = None
+
+    @classmethod
+    def _from_store(cls, store: t.Mapping, must_be_frozen: bool = True,
+                    freezer: t.Optional[t.Callable[[t.Any], t.Any]] = None,
+                    frozen: bool = False) -> 'ContextDict':
+        """Create a ContextDict which takes ownership of store instead of copying it."""
+        ctx = cls.__new__(cls)
+        ctx._store = store
+        ctx._must_be_frozen = must_be_frozen
+        ctx.freezer = _DEFAULT_FREEZER if freezer is None else freezer
+        ctx._frozen = frozen
+        ctx._hash = None
+        ctx._digest = None
+        ctx._paths = None
+        return ctx
 
     @classmethod
     def new(cls, ctx_data: t.Optional[t.Mapping] = None,
             must_be_frozen: bool = True,
-            freezer: t.Optional[t.Callable[[t.Any], t.Any]] = None) -> 'ContextDict':
-
-        if ctx_data is None:
-            ctx_data = {}
-
-        ctx = ContextDict(ctx_data)
-
-        if freezer is not None:
-            ctx.freezer = freezer
+            freezer: t.Optional[t.Callable[[t.Any], t.Any]] = None,
+            persistent: bool = False) -> 'ContextDict':
+        """
+        Create a new ContextDict.
 
-        ctx._must_be_frozen = must_be_frozen
-        ctx._frozen = False
+        :kwarg ctx_data: A Mapping of data to initialize the context with.
+        :kwarg must_be_frozen: Whether the context must be frozen before its members can be read.
+        :kwarg freezer: Function to use to make the ctx_data immutable.
+        :kwarg persistent: Store the frozen data in a :class:`~bailiwick.persistent.PersistentMap`.
+            :meth:`union` on a persistent context shares all of the entries which are not
+            overridden instead of copying them.  Looking up keys is somewhat slower.
+        """
+        store = {} if ctx_data is None else dict(ctx_data)
+        if persistent:
+            store = PersistentMapBuilder(pending=store)
 
-        return ctx
+        return cls._from_store(store, must_be_frozen=must_be_frozen, freezer=freezer)
 
     @property
     def frozen(self) -> bool:
         return self._frozen
 
-    def freeze(self) -> None:
-        self._store: ContextDict = self.freezer(self._store)
+    @property
+    def persistent(self) -> bool:
+        return isinstance(self._store, (PersistentMap, PersistentMapBuilder))
+
+    def freeze(self, lazy: bool = False, index_paths: bool = False,
+               schema: t.Optional['Schema'] = None) -> None:
+        """
+        Make the ContextDict and the data inside of it immutable.
+
+        Freezing a context which is already frozen leaves its data as it is.  Only
+        ``index_paths`` has an effect on it.
+
+        :kwarg lazy: Mark the context frozen right away but freeze each top-level value the
+            first time it is retrieved.  This makes freezing a context with many large values
+            cheaper when only a few of them are used.  Values made of builtin containers are
+            copied now and converted later.  Other values are frozen now.  See
+            :class:`~bailiwick.lazy.LazyFrozenMap`.
+        :kwarg index_paths: Build a :class:`~bailiwick.paths.PathIndex` of every nested value.
+            :meth:`get_path` and :meth:`prefix_items` then take a single dict lookup instead of
+            walking the nested contexts.  Building the index retrieves every value so it undoes
+            the savings of ``lazy``.  This can be used on a context which is already frozen.
+        :kwarg schema: A :class:`~bailiwick.schema.Schema` to validate the data against.  Values
+            are checked, converted, and frozen by the schema's compiled validator in the same
+            pass and defaults are filled in for missing keys.
+        :raises ~bailiwick.errors.SchemaError: if the data does not match schema.
+        :raises ValueError: if schema is given with ``lazy`` or for a context which is already
+            frozen.
+        """
+        if schema is not None:
+            self._freeze_with_schema(schema, lazy)
+        elif not self._frozen:
+            self._freeze_store(lazy)
+        if index_paths and self._paths is None:
+            self._paths = PathIndex(self._store)
+
+    def _freeze_with_schema(self, schema: 'Schema', lazy: bool) -> None:
+        if lazy:
+            raise ValueError('A schema cannot be used to freeze a context lazily')
+        if self._frozen:
+            raise ValueError('The context is already frozen so it cannot be validated against'
+                             ' a schema')
+
+        store = schema.validate(self._store, self.freezer)
+        if isinstance(self._store, PersistentMapBuilder):
+            store = PersistentMap(store)
+        self._store = store
+        self._frozen = True
+
+    def _freeze_store(self, lazy: bool) -> None:
+        # Stores which are frozen already are kept.  Some of them (for instance, contexts loaded
+        # from :mod:`bailiwick.binary`) would have to be decoded to freeze them again.
+        store = self._store
+        if lazy and type(store) is dict:
+            self._store = LazyFrozenMap(store, self.freezer)
+        elif isinstance(store, PersistentMapBuilder):
+            # Entries in the base were frozen when it was built so only the pending ones need it
+            if store.pending:
+                self._store = store.base.update(self.freezer(store.pending))
+            else:
+                self._store = store.base
+        elif not isinstance(store, (PersistentMap, OverlayMap, LazyFrozenMap)):
+            self._store = self.freezer(store)
         self._frozen = True
 
     def __getitem__(self, key: t.Hashable) -> t.Any:
-        if not self.frozen:
+        if not self._frozen:
             if self._must_be_frozen:
                 raise MustBeFrozen('This ContextDict must be frozen before accessing'
                                    ' its members.')
         return self._store[key]
 
+    def __contains__(self, key: t.Any) -> bool:
+        if not self._frozen:
+            if self._must_be_frozen:
+                raise MustBeFrozen('This ContextDict must be frozen before accessing'
+                                   ' its members.')
+        # The store may be able to check for the key without retrieving its value
+        return key in self._store
+
     def __iter__(self) -> t.Any:
         return self._store.__iter__()
 
@@ -132,19 +779,59 @@ class ContextDict(Mapping):
         return self._store.__len__()
 
     def __hash__(self) -> int:
-        if self.frozen:
-            return hash(frozenset(self.items()))
-        raise MustBeFrozen('A ContextDict must be frozen before it can be hashed')
+        if self._hash is not None:
+            return self._hash
+
+        if not self.frozen:
+            raise MustBeFrozen('A ContextDict must be frozen before it can be hashed')
+
+        if isinstance(self._store, (ContextDict, PersistentMap)):
+            # freeze() stores a frozen mapping which can cache the same hash
+            self._hash = hash(self._store)
+        else:
+            self._hash = hash(frozenset(self._store.items()))
+        return self._hash
 
     def __eq__(self, other: t.Any) -> bool:
-        try:
-            if self.__hash__() == hash(other):
-                return True
-        except (TypeError, MustBeFrozen):
-            if self._store == other:
+        if self is other:
+            return True
+
+        if isinstance(other, ContextDict):
+            if self._digest is not None and self._digest == other._digest:
+                # Contents with the same digest are equal.  Different digests can still be equal
+                # (for instance, 1 and 1.0) so those are compared the usual way.
                 return True
+            if self.frozen and other.frozen:
+                try:
+                    if hash(self) != hash(other):
+                        return False
+                except (TypeError, MustBeFrozen):
+                    # Contents are not hashable (for instance, if the freezer did not convert
+                    # a list or left a nested ContextDict unfrozen) so we can only compare the
+                    # contents
+                    pass
+            other = other._store
+        elif not isinstance(other, Mapping):
+            return NotImplemented
+        elif not isinstance(other, dict):
+            other = dict(other.items())
+
+        return self._store == other
+
+    def __sizeof__(self) -> int:
+        # The store is private to the ContextDict so count it as part of its size
+        return object.__sizeof__(self) + sys.getsizeof(self._store)
 
-        return False
+    def __reduce__(self) -> t.Tuple:
+        store = self._store
+        if not isinstance(store, (dict, ContextDict, PersistentMap, PersistentMapBuilder)):
+            # Overlays and lazily frozen stores refer to objects which cannot be pickled
+            store = dict(store.items())
+
+        # The default freezer is recreated by the unpickling process rather than copied
+        freezer = None if self.freezer is _DEFAULT_FREEZER else self.freezer
+        return (_restore_context_dict, (type(self), store, self._must_be_frozen, freezer,
+                                        self._frozen))
 
     def __repr__(self) -> str:
         return (f'ContextDict({repr(self._store)}, must_be_frozen={self._must_be_frozen},'
@@ -156,11 +843,159 @@ class ContextDict(Mapping):
 
         .. note:: The new context is unfrozen but only entries in the overriding mapping could be
             mutable.
+
+        .. note:: If this context is persistent, the new context shares this context's entries.
+            Creating and freezing it only costs time proportional to the size of the overriding
+            mapping.
+        """
+        if self.persistent:
+            store = self._store
+            if isinstance(store, PersistentMap):
+                store = PersistentMapBuilder(store)
+            else:
+                store = store.copy()
+            store.pending.update(overriding_mapping)
+        else:
+            store = dict(self._store, **overriding_mapping)
+
+        return ContextDict._from_store(store, must_be_frozen=self._must_be_frozen,
+                                       freezer=self.freezer)
+
+    def derive(self, overriding_mapping: t.Mapping,
+               max_depth: int = MAX_OVERLAY_DEPTH) -> 'ContextDict':
+        """
+        Create a new frozen ContextDict which overrides some of this context's entries.
+
+        Unlike :meth:`union`, the new context does not copy this one.  It stores the frozen
+        overriding entries and looks up everything else in this context.  That makes deriving a
+        context cost time and memory proportional to the size of the overriding mapping.
+
+        Contexts derived from derived contexts form a chain.  The chain is flattened when it would
+        become longer than ``max_depth`` or when lookups which have to skip past overlays have
+        cost as much as flattening it would.
+
+        :arg overriding_mapping: Entries to add or override.  These are frozen with this
+            context's freezer.
+        :kwarg max_depth: Maximum length of the chain of derived contexts.
+        """
+        if not self.frozen:
+            raise MustBeFrozen('A ContextDict must be frozen before contexts can be derived'
+                               ' from it')
+
+        overrides = self.freezer(dict(overriding_mapping))
+        while isinstance(overrides, ContextDict):
+            overrides = overrides._store
+
+        parent = self._store
+        while isinstance(parent, ContextDict):
+            parent = parent._store
+        if isinstance(parent, OverlayMap) and parent.depth >= max_depth:
+            parent = parent.flattened()
+
+        return ContextDict._from_store(OverlayMap(overrides, parent),
+                                       must_be_frozen=self._must_be_frozen, freezer=self.freezer,
+                                       frozen=True)
+
+    def getter(self, *keys: t.Hashable) -> t.Callable[[], t.Any]:
+        """
+        Return a function which returns the values of keys in this context.
+
+        This is for loops which read the same keys many times.  A frozen context cannot change so
+        the keys are looked up once, when the getter is created, and calling the getter just
+        returns the values.  That is faster than ``ctx[key]`` or even a lookup in a plain dict.
+
+        :arg keys: The keys to look up.  If there is one, the getter returns its value.  If there
+            are several, the getter returns a tuple of their values like
+            :func:`operator.itemgetter`.
+        :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+        :raises KeyError: if a key is not present.
+        """
+        if not keys:
+            raise TypeError('getter() requires at least one key')
+        self._check_frozen_for('getter')
+
+        if len(keys) == 1:
+            value = self._store[keys[0]]
+        else:
+            value = tuple(self._store[key] for key in keys)
+        return itertools.repeat(value).__next__
+
+    def path_getter(self, *path: t.Hashable) -> t.Callable[[], t.Any]:
+        """
+        Return a function which returns the value found by following path through nested data.
+
+        ``ctx.path_getter('db', 'hosts', 0)()`` returns ``ctx['db']['hosts'][0]``.  As with
+        :meth:`getter`, the path is followed once, when the getter is created.
+
+        :arg path: Keys and indexes to follow.
+        :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+        :raises KeyError: if a key is not present.
+        :raises IndexError: if an index is out of range.
+        """
+        if not path:
+            raise TypeError('path_getter() requires at least one key')
+        self._check_frozen_for('path_getter')
+
+        value = self._store[path[0]]
+        for key in path[1:]:
+            value = value[key]
+        return itertools.repeat(value).__next__
+
+    def get_path(self, path: str) -> t.Any:
+        """
+        Return the value at a dotted path through nested mappings.
+
+        ``ctx.get_path('db.pool.size')`` returns ``ctx['db']['pool']['size']``.  If the context
+        was frozen with ``index_paths``, this is a single dict lookup.
+
+        :arg path: String keys joined by ``.``.
+        :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+        :raises KeyError: if there is no value at path.
         """
-        new_ctx = ContextDict(self._store, **overriding_mapping)
-        new_ctx._must_be_frozen = self._must_be_frozen
-        new_ctx.freezer = self.freezer
-        return new_ctx
+        self._check_frozen_for('get_path')
+        if self._paths is not None:
+            return self._paths[path]
+
+        value = self._store
+        try:
+            for key in path.split(PATH_SEPARATOR):
+                value = value[key]
+        except (TypeError, IndexError):
+            # Tried to look up a key in a value which is not a mapping
+            raise KeyError(path)
+        return value
+
+    def prefix_items(self, prefix: str = '') -> t.Iterator[t.Tuple[str, t.Any]]:
+        """
+        Iterate over the dotted paths nested under prefix and their values, sorted by path.
+
+        ``ctx.prefix_items('db')`` returns the entries of ``ctx['db']`` and of every mapping
+        nested inside of it.  If the context was frozen with ``index_paths``, the paths are found
+        with a binary search.  Otherwise, an index of the mapping at prefix is built to answer
+        the query and then thrown away.
+
+        :kwarg prefix: Path of a mapping.  Its own entry is not included.  If this is empty, all
+            paths are returned.
+        :raises ~bailiwick.errors.MustBeFrozen: if the context is not frozen.
+        :raises KeyError: if there is nothing at prefix.
+        """
+        self._check_frozen_for('prefix_items')
+        if self._paths is not None:
+            if prefix and prefix not in self._paths:
+                raise KeyError(prefix)
+            return self._paths.prefix_items(prefix)
+
+        if not prefix:
+            return PathIndex(self._store).prefix_items()
+        value = self.get_path(prefix)
+        if not isinstance(value, Mapping):
+            return iter(())
+        return ((f'{prefix}{PATH_SEPARATOR}{path}', item)
+                for path, item in PathIndex(value).prefix_items())
+
+    def _check_frozen_for(self, name: str) -> None:
+        if not self._frozen:
+            raise MustBeFrozen(f'A ContextDict must be frozen before {name}() can be used')
 
     #
     # The following are only allowed while ContextDict is unfrozen
@@ -200,3 +1035,15 @@ class ContextDict(Mapping):
         if self.frozen:
             raise AttributeError('ContextDict object does not support update() once frozen')
         return self._store.update(*args, **kwargs)
+
+
+#: Freezer used by ContextDicts which are not given one.  It is sealed since they all share it.
+_DEFAULT_FREEZER = DefaultFreezer()
+_DEFAULT_FREEZER.seal()
+
+
+def _restore_context_dict(cls: t.Type[ContextDict], store: t.Mapping, must_be_frozen: bool,
+                          freezer: t.Optional[t.Callable[[t.Any], t.Any]],
+                          frozen: bool) -> ContextDict:
+    """Recreate a ContextDict that was pickled."""
+    return cls._from_store(store, must_be_frozen=must_be_frozen, freezer=freezer, frozen=frozen)
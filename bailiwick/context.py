@@ -3,23 +3,115 @@
 # License: LGPLv3+
 # Copyright: Toshio Kuratomi, 2021
 
+import contextlib
 import contextvars
+import functools
+import inspect
+import os
+import threading
 import typing as t
 
+from .binary import open_file
 from .collections import ContextDict
-from .errors import DuplicateContext
+from .errors import DuplicateContext, MustBeFrozen
 
+#: A registry maps each context name to a ContextVar whose default is the context that was
+#: created with that name.  Registries are never modified once they are in use.  Creating a
+#: context replaces the registry with a new one so that forks can share them safely.
+_Registry = t.Dict[str, contextvars.ContextVar]
 
-#: Storage for all of our contexts.
-_CONTEXT = contextvars.ContextVar('_bailiwick_contexts')
-_CONTEXT.set({})
+#: Storage for all of our contexts.  This is used by every thread and task which has not forked
+#: the registry.
+_GLOBAL_REGISTRY: _Registry = {}
+_GLOBAL_REGISTRY_LOCK = threading.Lock()
 
-__all__ = ('create_context', 'get_context')
+#: Registry forked by the current thread or task.  This is the registry that was forked from
+#: and a registry of the contexts created since then.  None when the global registry is in use.
+_CONTEXT: 'contextvars.ContextVar[t.Optional[t.Tuple[_Registry, _Registry]]]' = (
+    contextvars.ContextVar('_bailiwick_contexts', default=None))
+
+__all__ = ('activate_context', 'create_context', 'create_mapped_context', 'fork_registry',
+           'forked_registry', 'get_context', 'register_context', 'ContextActivation')
+
+
+def _lookup(ctx_name: str) -> contextvars.ContextVar:
+    forked = _CONTEXT.get()
+    if forked is None:
+        return _GLOBAL_REGISTRY[ctx_name]
+
+    ctx_var = forked[1].get(ctx_name)
+    if ctx_var is None:
+        return forked[0][ctx_name]
+    return ctx_var
+
+
+def _fork() -> t.Tuple[_Registry, _Registry]:
+    forked = _CONTEXT.get()
+    if forked is None:
+        return _GLOBAL_REGISTRY, {}
+
+    base, created = forked
+    if len(created) > len(base):
+        # Keep lookups at two dict lookups and copies on write small
+        return {**base, **created}, {}
+    return forked
+
+
+def _active_contexts() -> t.Dict[str, ContextDict]:
+    """Return the context that is active for each name."""
+    forked = _CONTEXT.get()
+    if forked is None:
+        registry = _GLOBAL_REGISTRY
+    else:
+        registry = {**forked[0], **forked[1]}
+    return {ctx_name: ctx_var.get() for ctx_name, ctx_var in registry.items()}
+
+
+def _use_registry(registry: _Registry) -> None:
+    """Replace the registry for the current thread or task with registry."""
+    _CONTEXT.set((registry, {}))
+
+
+def _check_unused(ctx_name: str) -> None:
+    try:
+        _lookup(ctx_name)
+    except KeyError:
+        return
+    raise DuplicateContext(f'{ctx_name} has already been used as the name of a context.'
+                           ' Choose a unique name or use get_context() if you want to'
+                           ' operate on the existing context.')
+
+
+def fork_registry() -> None:
+    """
+    Give the current thread or asyncio task its own copy of the context registry.
+
+    Contexts created afterwards with :func:`create_context` are only visible to this thread or
+    task and the asyncio tasks that it starts.  Forking takes constant time because the fork
+    shares the registry that it was made from.  Contexts created in the fork are kept in a
+    separate registry of their own which is copied when a context is added to it.
+
+    asyncio tasks start with a copy of the contextvars of the code which created them.  A task
+    started after a fork therefore shares the fork's contents but creating a context in the task
+    does not affect its parent or its siblings.
+    """
+    _CONTEXT.set(_fork())
+
+
+@contextlib.contextmanager
+def forked_registry() -> t.Iterator[None]:
+    """Fork the context registry for the duration of a with block.  See :func:`fork_registry`."""
+    token = _CONTEXT.set(_fork())
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
 
 
 def create_context(ctx_name: str, ctx_data: t.Optional[t.Mapping] = None,
                    must_be_frozen: bool = True,
-                   freezer: t.Optional[t.Callable] = None) -> ContextDict:
+                   freezer: t.Optional[t.Callable] = None,
+                   persistent: bool = False) -> ContextDict:
     """
     Create a new context.
 
@@ -30,23 +122,141 @@ def create_context(ctx_name: str, ctx_data: t.Optional[t.Mapping] = None,
     :kwarg freezer: Function to use to make the ctx_data immutable.  This should recurse any
         containers, changing from mutable data types to immutable ones.  This can be changed to an
         identity function to disable conversion to immutable types.
+    :kwarg persistent: Store the frozen data in a structure which :meth:`ContextDict.union`
+        can share with the contexts that it creates.
+    """
+    ctx = ContextDict.new(ctx_data=ctx_data, must_be_frozen=must_be_frozen, freezer=freezer,
+                          persistent=persistent)
+    register_context(ctx_name, ctx)
+    return ctx
+
+
+def create_mapped_context(ctx_name: str, path: t.Union[str, os.PathLike]) -> ContextDict:
+    """
+    Create a new context from a file written by :func:`bailiwick.binary.write_file`.
+
+    The file is memory mapped instead of being read.  Creating the context takes the same time
+    no matter how large the file is.  Each lookup only decodes the entry that was asked for.
+    The context is frozen.
+
+    :arg ctx_name: The name of the context
+    :arg path: Path to the file.
+    :raises ValueError: if the file does not hold a context.
+    """
+    ctx = open_file(path)
+    register_context(ctx_name, ctx)
+    return ctx
+
+
+def register_context(ctx_name: str, ctx: ContextDict) -> None:
+    """
+    Register an existing context under a name.
+
+    Use this for contexts which were made some other way than :func:`create_context`.  For
+    instance, by the functions in :mod:`bailiwick.loaders`.  The context is not copied.
+
+    :arg ctx_name: The name of the context
+    :arg ctx: The ContextDict to register.
+    :raises ~bailiwick.errors.DuplicateContext: if ctx_name has already been used.
     """
-    current_context = _CONTEXT.get('_bailiwick_contexts')
-    if ctx_name in current_context:
-        raise DuplicateContext(f'{ctx_name} has already been used as the name of a context.'
-                               ' Choose a unique name or use get_context() if you want to'
-                               ' operate on the existing context.')
+    global _GLOBAL_REGISTRY  # pylint: disable=global-statement
 
-    current_context[ctx_name] = ContextDict.new(ctx_data=ctx_data, must_be_frozen=must_be_frozen,
-                                                freezer=freezer)
+    ctx_var = contextvars.ContextVar(f'bailiwick.{ctx_name}', default=ctx)
 
-    return current_context[ctx_name]
+    forked = _CONTEXT.get()
+    if forked is not None:
+        _check_unused(ctx_name)
+        _CONTEXT.set((forked[0], {**forked[1], ctx_name: ctx_var}))
+        return
+
+    with _GLOBAL_REGISTRY_LOCK:
+        _check_unused(ctx_name)
+        _GLOBAL_REGISTRY = {**_GLOBAL_REGISTRY, ctx_name: ctx_var}
 
 
 def get_context(ctx_name: str) -> ContextDict:
     """
     Retrieve a context by name.
 
+    This returns the context which is active for ctx_name or the context which was created with
+    that name if none has been activated.
+
     :arg ctx_name: The name of the context
     """
-    return _CONTEXT.get('_bailiwick_contexts')[ctx_name]
+    return _lookup(ctx_name).get()
+
+
+class ContextActivation(contextlib.ContextDecorator):
+    """
+    Make a context the active one for a name until the block or function is exited.
+
+    Use :func:`activate_context` to create this.  An instance can be entered again once it has
+    been exited but it cannot be entered while it is already active.  Each ``with`` block which
+    may nest or run in another thread needs its own instance.  Decorated functions make a new
+    instance for every call.
+    """
+
+    def __init__(self, ctx_name: str, ctx: ContextDict) -> None:
+        if not ctx.frozen:
+            raise MustBeFrozen('A ContextDict must be frozen before it can be activated')
+
+        self.ctx_name = ctx_name
+        self.ctx = ctx
+        self._var: t.Optional[contextvars.ContextVar] = None
+        self._token: t.Optional[contextvars.Token] = None
+        self._lock = threading.Lock()
+
+    def _recreate_cm(self) -> 'ContextActivation':
+        # Each call of a decorated function needs its own token.  A fresh instance keeps
+        # concurrent and recursive calls from sharing one.
+        return type(self)(self.ctx_name, self.ctx)
+
+    def __call__(self, func: t.Callable) -> t.Callable:
+        if not inspect.iscoroutinefunction(func):
+            return super().__call__(func)
+
+        @functools.wraps(func)
+        async def inner(*args, **kwargs):
+            with self._recreate_cm():
+                return await func(*args, **kwargs)
+        return inner
+
+    def __enter__(self) -> ContextDict:
+        var = _lookup(self.ctx_name)
+        with self._lock:
+            if self._token is not None:
+                raise RuntimeError(f'This activation of {self.ctx_name} is already active.'
+                                   '  Call activate_context() again to nest activations')
+            self._var = var
+            self._token = var.set(self.ctx)
+        return self.ctx
+
+    def __exit__(self, *exc_info) -> None:
+        with self._lock:
+            var, token = self._var, self._token
+            self._var = self._token = None
+        var.reset(token)
+
+
+def activate_context(ctx_name: str, ctx: ContextDict) -> ContextActivation:
+    """
+    Make ctx the context returned by :func:`get_context` for ctx_name within a block.
+
+    This can be used as a context manager or as a decorator::
+
+        with activate_context('app', request_ctx):
+            handle_request()
+
+        @activate_context('app', request_ctx)
+        def handle_request():
+            ...
+
+    Activations are local to the thread or asyncio task they are made in and can be nested.
+    Activating and looking up a context take constant time.
+
+    :arg ctx_name: The name of a context which was made with :func:`create_context`.
+    :arg ctx: A frozen ContextDict to activate.
+    :raises KeyError: when entered if no context was created with ctx_name.
+    :raises ~bailiwick.errors.MustBeFrozen: if ctx is not frozen.
+    """
+    return ContextActivation(ctx_name, ctx)
@@ -0,0 +1,242 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Find the changes between frozen contexts and apply them to make new contexts.
+
+:func:`diff` compares two frozen contexts and returns the :class:`Change` entries which turn the
+first into the second.  :func:`apply_delta` applies those entries to a context.  The new context
+shares every nested value which did not change with the context it was made from so a delta is a
+compact way to send an updated context to another process which has the old one.
+
+Nested contexts are compared by a digest of their contents (a Merkle tree).  The digest of a
+frozen ContextDict is computed the first time it is needed and kept on the ContextDict so
+unchanged nested contexts are skipped in constant time after that.  Contexts which share nested
+values (for instance, ones made by :meth:`~bailiwick.collections.ContextDict.union`,
+:meth:`~bailiwick.collections.ContextDict.derive`, or :func:`apply_delta`) skip the shared values
+without computing their digests at all.
+"""
+
+import collections
+import hashlib
+import typing as t
+
+from .collections import ContextDict
+from .errors import MustBeFrozen
+from .persistent import PersistentMap
+
+__all__ = ('Change', 'apply_delta', 'diff', 'digest')
+
+
+#: One entry of a delta.  ``op`` is ``'set'`` or ``'delete'``.  ``path`` is a tuple of the keys to
+#: follow through nested contexts.  ``value`` is the new value for ``'set'`` and None for
+#: ``'delete'``.
+Change = collections.namedtuple('Change', ('op', 'path', 'value'))
+
+_DIGEST_SIZE = 16
+
+
+def _blake2b(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=_DIGEST_SIZE).digest()
+
+
+def _scalar_digest(value: t.Any) -> t.Optional[bytes]:
+    type_ = type(value)
+    if type_ is str:
+        return _blake2b(b's' + value.encode('utf-8', 'surrogatepass'))
+    if type_ is bytes:
+        return _blake2b(b'b' + value)
+    if type_ is int:
+        return _blake2b(b'i' + str(value).encode('ascii'))
+    if type_ is float:
+        return _blake2b(b'f' + value.hex().encode('ascii'))
+    if value is None or type_ is bool:
+        return _blake2b(repr(value).encode('ascii'))
+    return None
+
+
+def _context_digest(ctx: ContextDict) -> t.Optional[bytes]:
+    if ctx._digest is not None:
+        return ctx._digest
+
+    if not ctx.frozen:
+        raise MustBeFrozen('A ContextDict must be frozen before its digest can be computed')
+
+    entries = []
+    for key, value in ctx.items():
+        key_digest = digest(key)
+        value_digest = digest(value)
+        if key_digest is None or value_digest is None:
+            return None
+        entries.append(key_digest + value_digest)
+
+    # Entries are sorted because the order of a mapping does not affect equality
+    entries.sort()
+    ctx._digest = _blake2b(b'm' + b''.join(entries))
+    return ctx._digest
+
+
+def _items_digest(tag: bytes, items: t.Iterable, ordered: bool) -> t.Optional[bytes]:
+    digests = []
+    for item in items:
+        item_digest = digest(item)
+        if item_digest is None:
+            return None
+        digests.append(item_digest)
+
+    if not ordered:
+        digests.sort()
+    return _blake2b(tag + b''.join(digests))
+
+
+def digest(value: t.Any) -> t.Optional[bytes]:
+    """
+    Return a digest of a frozen value's contents.
+
+    Values which have the same digest are equal.  Equal values can have different digests when
+    their types differ (for instance, ``1`` and ``1.0``).  The digests of frozen ContextDicts
+    are cached on them.
+
+    :arg value: A string, bytes, number, bool, None, or a tuple, frozenset, or frozen
+        ContextDict of those.
+    :returns: The digest or None if value holds a type which cannot be digested.
+    :raises ~bailiwick.errors.MustBeFrozen: if value contains a ContextDict which is not frozen.
+    """
+    if isinstance(value, ContextDict):
+        return _context_digest(value)
+    if type(value) is tuple:
+        return _items_digest(b't', value, ordered=True)
+    if type(value) is frozenset:
+        return _items_digest(b'z', value, ordered=False)
+    return _scalar_digest(value)
+
+
+def _unchanged(old: t.Any, new: t.Any) -> bool:
+    if old is new:
+        return True
+
+    if isinstance(old, ContextDict) or type(old) in (tuple, frozenset):
+        old_digest = digest(old)
+        if old_digest is not None and old_digest == digest(new):
+            return True
+    return type(old) is type(new) and old == new
+
+
+def _diff(old: ContextDict, new: ContextDict, path: t.Tuple,
+          changes: t.List[Change]) -> None:
+    for key, new_value in new.items():
+        try:
+            old_value = old[key]
+        except KeyError:
+            changes.append(Change('set', path + (key,), new_value))
+            continue
+
+        if old_value is new_value:
+            continue
+        if isinstance(old_value, ContextDict) and isinstance(new_value, ContextDict):
+            old_digest = digest(old_value)
+            if old_digest is None or old_digest != digest(new_value):
+                _diff(old_value, new_value, path + (key,), changes)
+        elif not _unchanged(old_value, new_value):
+            changes.append(Change('set', path + (key,), new_value))
+
+    for key in old:
+        if key not in new:
+            changes.append(Change('delete', path + (key,), None))
+
+
+def diff(old: ContextDict, new: ContextDict) -> t.Tuple[Change, ...]:
+    """
+    Return the changes which turn old into new.
+
+    Nested contexts which changed are compared key by key so a change deep inside of a large
+    context is a single entry.  Other values which changed, including tuples, are replaced
+    whole.  Values whose types changed are treated as changed even if they are equal (for
+    instance, ``1`` and ``1.0``).
+
+    :arg old: The frozen context to compare from.
+    :arg new: The frozen context to compare to.
+    :returns: Tuple of :class:`Change`.  Empty if the contexts are the same.
+    :raises ~bailiwick.errors.MustBeFrozen: if either context is not frozen.
+    """
+    if not old.frozen or not new.frozen:
+        raise MustBeFrozen('ContextDicts must be frozen before they can be compared')
+
+    changes: t.List[Change] = []
+    if old is not new:
+        _diff(old, new, (), changes)
+    return tuple(changes)
+
+
+def _apply(base: ContextDict, changes: t.Sequence[Change], depth: int) -> ContextDict:
+    updates: t.Dict[t.Hashable, t.Any] = {}
+    deletions = set()
+    nested: t.Dict[t.Hashable, t.List[Change]] = {}
+    for change in changes:
+        key = change.path[depth]
+        if len(change.path) > depth + 1:
+            nested.setdefault(key, []).append(change)
+        elif change.op == 'delete':
+            if key not in base:
+                raise KeyError(change.path)
+            deletions.add(key)
+        elif change.op == 'set':
+            updates[key] = base.freezer(change.value)
+        else:
+            raise ValueError(f'Unknown change operation: {change.op}')
+
+    for key, nested_changes in nested.items():
+        value = base[key]
+        if not isinstance(value, ContextDict):
+            raise ValueError(f'Cannot apply changes below {nested_changes[0].path[:depth + 1]}'
+                             ' because it is not a context')
+        updates[key] = _apply(value, nested_changes, depth + 1)
+
+    return _rebuild(base, updates, deletions)
+
+
+def _rebuild(base: ContextDict, updates: t.Dict[t.Hashable, t.Any],
+             deletions: t.Set[t.Hashable]) -> ContextDict:
+    store = base._store
+    while isinstance(store, ContextDict):
+        store = store._store
+
+    if isinstance(store, PersistentMap):
+        # Keep sharing the entries which did not change
+        for key in deletions:
+            store = store.delete(key)
+        store = store.update(updates)
+    else:
+        store = {key: value for key, value in base.items() if key not in deletions}
+        store.update(updates)
+
+    return ContextDict._from_store(store, must_be_frozen=base._must_be_frozen,
+                                   freezer=base.freezer, frozen=True)
+
+
+def apply_delta(base: ContextDict, delta: t.Iterable[t.Sequence]) -> ContextDict:
+    """
+    Return a new frozen context made by applying a delta from :func:`diff` to base.
+
+    Values which the delta does not touch are shared with base rather than copied.  New values
+    are frozen with base's freezer.
+
+    :arg base: The frozen context to apply the delta to.  It is not changed.
+    :arg delta: Iterable of :class:`Change` or of ``(op, path, value)`` tuples.
+    :raises ~bailiwick.errors.MustBeFrozen: if base is not frozen.
+    :raises KeyError: if the delta deletes a key which is not present or changes a value nested
+        under a key which is not present.
+    :raises ValueError: if the delta changes a value nested under a value which is not a context.
+    """
+    if not base.frozen:
+        raise MustBeFrozen('A ContextDict must be frozen before a delta can be applied to it')
+
+    changes = [Change(*change) for change in delta]
+    if not changes:
+        return base
+
+    for change in changes:
+        if not change.path:
+            raise ValueError('Changes must have a path of at least one key')
+    return _apply(base, changes, 0)
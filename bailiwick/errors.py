@@ -3,9 +3,17 @@
 # License: LGPLv3+
 # Copyright: Toshio Kuratomi, 2021
 
+class CyclicData(Exception):
+    """Tried to freeze data which contains a reference to itself."""
+
+
 class DuplicateContext(Exception):
     """Tried to create a context that already exists."""
 
 
 class MustBeFrozen(Exception):
     """An operation on a :class:`bailiwick.context.ContextDict` requires it to be frozen."""
+
+
+class SchemaError(ValueError):
+    """Data does not match a :class:`bailiwick.schema.Schema`."""
@@ -0,0 +1,177 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Executors which run their tasks with the contexts that were active when the task was submitted.
+
+:class:`ContextThreadPoolExecutor` runs each task in a copy of the submitting thread's
+contextvars, so the worker thread sees the same context objects without copying them.
+
+:class:`ContextProcessPoolExecutor` sends the frozen contexts to the worker processes.  Each
+context object is pickled once into a private directory and identified by a small token after
+that.  A worker process loads a context the first time one of its tasks needs it and keeps the
+most recently used ones for later tasks.
+"""
+
+import collections
+import contextvars
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import typing as t
+import weakref
+
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import context
+
+__all__ = ('ContextProcessPoolExecutor', 'ContextThreadPoolExecutor')
+
+
+#: Reference to a context that a worker process can load.  This is the name of the context and
+#: either the token of a context saved in the executor's directory or, for a context which could
+#: not be saved, the context itself.
+_ContextRef = t.Tuple[str, t.Any]
+
+#: Number of loaded contexts that each worker process keeps
+WORKER_CACHE_SIZE = 64
+
+#: A loaded context and the ContextVars which hold it by context name
+_LoadedContext = t.Tuple[t.Any, t.Dict[str, contextvars.ContextVar]]
+
+#: Contexts which this worker process has loaded.  Keyed by executor directory and token.  The
+#: least recently used are dropped first.
+_WORKER_CONTEXTS: 't.OrderedDict[t.Tuple[str, int], _LoadedContext]' = collections.OrderedDict()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor which runs tasks with the submitter's active contexts.
+
+    The task runs in a copy of the submitting thread's :class:`contextvars.Context`.  That carries
+    over the active contexts, forks of the registry, and any other contextvars.  Copying the
+    Context does not copy the contexts themselves.
+    """
+
+    def submit(self, fn: t.Callable, *args, **kwargs) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _load_context(directory: str, ctx_name: str, ref: t.Any) -> contextvars.ContextVar:
+    if type(ref) is not int:
+        return contextvars.ContextVar(f'bailiwick.{ctx_name}', default=ref)
+
+    key = (directory, ref)
+    try:
+        ctx, ctx_vars = _WORKER_CONTEXTS[key]
+    except KeyError:
+        with open(os.path.join(directory, f'{ref}.pickle'), 'rb') as f:
+            ctx = pickle.load(f)
+        ctx_vars = {}
+        _WORKER_CONTEXTS[key] = (ctx, ctx_vars)
+        if len(_WORKER_CONTEXTS) > WORKER_CACHE_SIZE:
+            _WORKER_CONTEXTS.popitem(last=False)
+    else:
+        _WORKER_CONTEXTS.move_to_end(key)
+
+    ctx_var = ctx_vars.get(ctx_name)
+    if ctx_var is None:
+        ctx_var = ctx_vars[ctx_name] = contextvars.ContextVar(
+            f'bailiwick.{ctx_name}', default=ctx)
+    return ctx_var
+
+
+def _run_in_registry(registry: context._Registry, fn: t.Callable, args: t.Tuple,
+                     kwargs: t.Dict) -> t.Any:
+    context._use_registry(registry)
+    return fn(*args, **kwargs)
+
+
+def _call_with_contexts(directory: str, refs: t.Tuple[_ContextRef, ...], fn: t.Callable,
+                        args: t.Tuple, kwargs: t.Dict) -> t.Any:
+    registry = {ctx_name: _load_context(directory, ctx_name, ref) for ctx_name, ref in refs}
+    # Run in a fresh Context so that nothing is left behind for the next task in this process
+    return contextvars.Context().run(_run_in_registry, registry, fn, args, kwargs)
+
+
+def _forget_context(tokens: t.Dict[int, int], ctx_id: int, path: str) -> None:
+    # Called when a saved context is garbage collected.  Its id may be reused after this.
+    tokens.pop(ctx_id, None)
+    try:
+        os.remove(path)
+    except OSError:
+        # The directory was removed by shutdown()
+        pass
+
+
+class ContextProcessPoolExecutor(ProcessPoolExecutor):
+    """
+    ProcessPoolExecutor which runs tasks with the submitter's active contexts.
+
+    When a task is submitted, the frozen context which is active for each name is sent along with
+    it.  Unfrozen contexts are left out.  Contexts must be picklable.
+
+    Each context object is only pickled once per executor.  Contexts are told apart by identity
+    rather than equality because equal contexts can hold values of different types (for instance,
+    ``1`` and ``True``).  The pickled contexts are stored in a temporary directory which is removed
+    by :meth:`shutdown` or when the executor is garbage collected.  A context's pickle is removed
+    as soon as the context is garbage collected.  Contexts which cannot be weakly referenced (for
+    instance, :class:`~bailiwick.schema.Schema` records) are pickled along with each task instead.
+
+    Takes the same arguments as :class:`~concurrent.futures.ProcessPoolExecutor`.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._ctx_directory = tempfile.mkdtemp(prefix='bailiwick-')
+        self._remove_ctx_directory = weakref.finalize(self, shutil.rmtree, self._ctx_directory,
+                                                      ignore_errors=True)
+        self._ctx_lock = threading.Lock()
+        #: Token of each context which has been saved for the workers.  Keyed by id of the
+        #: context.  Entries are removed when the context is garbage collected.
+        self._ctx_tokens: t.Dict[int, int] = {}
+        #: Tokens are never reused because workers cache contexts by token
+        self._next_token = itertools.count()
+
+    def _save_context(self, ctx: t.Any) -> t.Any:
+        token = self._ctx_tokens.get(id(ctx))
+        if token is not None:
+            return token
+
+        with self._ctx_lock:
+            token = self._ctx_tokens.get(id(ctx))
+            if token is not None:
+                return token
+
+            token = next(self._next_token)
+            path = os.path.join(self._ctx_directory, f'{token}.pickle')
+            try:
+                weakref.finalize(ctx, _forget_context, self._ctx_tokens, id(ctx), path)
+            except TypeError:
+                # Cannot tell when the context goes away so do not keep a copy of it
+                return ctx
+
+            with open(f'{path}.tmp', 'wb') as f:
+                pickle.dump(ctx, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Workers must never see a partially written file
+            os.replace(f'{path}.tmp', path)
+            self._ctx_tokens[id(ctx)] = token
+        return token
+
+    def submit(self, fn: t.Callable, *args, **kwargs) -> Future:
+        active = [(ctx_name, ctx) for ctx_name, ctx in context._active_contexts().items()
+                  if ctx.frozen]
+        refs = tuple((ctx_name, self._save_context(ctx)) for ctx_name, ctx in active)
+        future = super().submit(_call_with_contexts, self._ctx_directory, refs, fn, args, kwargs)
+        # Keep the contexts (and so their pickles) alive until the worker has loaded them
+        future.add_done_callback(lambda _future: active.clear())
+        return future
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        super().shutdown(wait=wait, **kwargs)
+        if wait:
+            self._remove_ctx_directory()
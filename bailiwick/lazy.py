@@ -0,0 +1,167 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Read-only mapping which freezes each of its values the first time it is used.
+
+Values are copied when the mapping is created so that changes which the caller makes to them
+afterwards are not seen.  Copying builtin containers is cheaper than freezing them.
+"""
+
+import threading
+import typing as t
+
+from collections.abc import Mapping
+
+__all__ = ('LazyFrozenMap',)
+
+
+#: Types whose values cannot change.  They are kept as they are in the copy.
+_IMMUTABLE_TYPES = frozenset((type(None), bool, int, float, complex, str, bytes, range,
+                              frozenset))
+
+#: Nesting depth at which a value is frozen right away instead of being copied.  The freezer
+#: can handle deeper nesting than the copy can and reports containers which contain themselves.
+_MAX_COPY_DEPTH = 100
+
+#: Copies of the containers seen so far.  Keyed by id of the original.  The originals are kept
+#: alive by the values being copied so their ids cannot be reused.
+_Memo = t.Dict[int, t.Any]
+
+#: Returned when a container is not in the memo.
+_NOT_FOUND = object()
+
+
+class _NotCopyable(Exception):
+    """Raised for values which have to be frozen right away because they cannot be copied."""
+
+
+def _copy_dict(value: t.Dict, memo: _Memo, depth: int) -> t.Dict:
+    immutable = _IMMUTABLE_TYPES
+    return {key: item if type(item) in immutable else _copy(item, memo, depth)
+            for key, item in value.items()}
+
+
+def _copy_list(value: t.List, memo: _Memo, depth: int) -> t.List:
+    immutable = _IMMUTABLE_TYPES
+    return [item if type(item) in immutable else _copy(item, memo, depth) for item in value]
+
+
+def _copy_tuple(value: t.Tuple, memo: _Memo, depth: int) -> t.Tuple:
+    return tuple(_copy_list(value, memo, depth))
+
+
+#: Functions which copy a container holding other containers
+_COPIERS: t.Dict[type, t.Callable[[t.Any, _Memo, int], t.Any]] = {
+    dict: _copy_dict,
+    list: _copy_list,
+    tuple: _copy_tuple,
+}
+
+
+def _copy(value: t.Any, memo: _Memo, depth: int = 0) -> t.Any:
+    """
+    Copy a value which is made of builtin containers and immutable scalars.
+
+    Containers of other containers which are referenced more than once are copied once so the
+    freezer still sees them as shared.  Containers of immutable values are cheap to copy so they
+    are copied each time they are seen.
+
+    :raises _NotCopyable: if the value holds anything else or is nested too deeply.  Containers
+        which contain themselves are nested too deeply.
+    """
+    cls = type(value)
+    if cls is dict:
+        items = value.values()
+    elif cls is list or cls is tuple:
+        items = value
+    elif cls is set or cls is bytearray:
+        # The items of a set are hashable so they are immutable already
+        return cls(value)
+    elif cls in _IMMUTABLE_TYPES:
+        return value
+    else:
+        raise _NotCopyable
+
+    if _IMMUTABLE_TYPES.issuperset(map(type, items)):
+        return value if cls is tuple else cls(value)
+
+    if depth >= _MAX_COPY_DEPTH:
+        raise _NotCopyable
+    copied = memo.get(id(value), _NOT_FOUND)
+    if copied is _NOT_FOUND:
+        copied = memo[id(value)] = _COPIERS[cls](value, memo, depth + 1)
+    return copied
+
+
+class LazyFrozenMap(Mapping):
+    """
+    Mapping which freezes its values when they are first looked up.
+
+    Values which are made of dicts, lists, tuples, sets, bytearrays, and immutable scalars are
+    copied when the LazyFrozenMap is created.  Each is passed through the freezer the first time
+    it is retrieved and the frozen value replaces the copy.  Other values, such as nested
+    ContextDicts or objects which the freezer has rules for, are frozen right away.  Changes made
+    to the original values after the LazyFrozenMap is created are therefore never seen.  Errors
+    from freezing the other values are raised by the constructor.  Only freezer rules for the
+    builtin types can raise when a value is retrieved.
+
+    Iterating over the keys or checking whether a key is present does not freeze anything.
+    Retrieving all of the values (for instance, by hashing or comparing the mapping) freezes all
+    of them.
+
+    :arg values: Mapping of the unfrozen values.  It is not changed.
+    :arg freezer: Function which returns a frozen version of a value.
+    """
+
+    __slots__ = ('_values', '_pending', '_freezer', '_lock')
+
+    def __init__(self, values: t.Mapping, freezer: t.Callable[[t.Any], t.Any]) -> None:
+        copied = {}
+        pending = set()
+        memo: _Memo = {}
+        for key, value in values.items():
+            try:
+                copied[key] = _copy(value, memo)
+            except _NotCopyable:
+                copied[key] = freezer(value)
+            else:
+                pending.add(key)
+
+        self._values = copied
+        #: Keys whose values have not been frozen yet
+        self._pending: t.Set = pending
+        self._freezer = freezer
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of values which have not been frozen yet."""
+        return len(self._pending)
+
+    def _freeze_value(self, key: t.Hashable) -> t.Any:
+        with self._lock:
+            if key in self._pending:
+                # Store the frozen value before the key stops being pending so that readers
+                # which do not take the lock never see the unfrozen value
+                self._values[key] = self._freezer(self._values[key])
+                self._pending.discard(key)
+            return self._values[key]
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        if self._pending and key in self._pending:
+            return self._freeze_value(key)
+        return self._values[key]
+
+    def __contains__(self, key: t.Any) -> bool:
+        return key in self._values
+
+    def __iter__(self) -> t.Iterator[t.Hashable]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f'LazyFrozenMap({dict(self.items())!r})'
@@ -0,0 +1,168 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Load frozen contexts from configuration sources.
+
+The loaders return frozen :class:`~bailiwick.collections.ContextDict` which can be registered
+with :func:`~bailiwick.context.register_context`.  Where the parser allows it, frozen nodes are
+built while the source is parsed so that the data is not walked a second time by
+:meth:`ContextDict.freeze() <bailiwick.collections.ContextDict.freeze>`:
+
+* :func:`load_json` builds a ContextDict as soon as each JSON object has been parsed.
+* :func:`load_env` and :func:`load_env_file` build nested ContextDicts out of the variables
+  directly.  :func:`load_env_file` reads the file one line at a time.
+* :func:`load_toml` uses :mod:`tomllib` (or :mod:`tomli` before Python-3.11).  Those parsers do not
+  have hooks to build the nodes so the parsed data is frozen afterwards.
+"""
+
+import json
+import os
+import typing as t
+
+from .collections import _DEFAULT_FREEZER, ContextDict
+
+__all__ = ('load_env', 'load_env_file', 'load_json', 'load_toml')
+
+
+def _frozen_mapping(items: t.Union[t.Dict, t.Iterable[t.Tuple[t.Hashable, t.Any]]]
+                    ) -> ContextDict:
+    return ContextDict._from_store(dict(items), frozen=True)
+
+
+def _freeze_json_value(value: t.Any) -> t.Any:
+    # Objects have already been frozen by the time they are seen here.  Only arrays need work.
+    if type(value) is list:
+        return tuple([_freeze_json_value(item) for item in value])
+    return value
+
+
+def _json_object(pairs: t.List[t.Tuple[str, t.Any]]) -> ContextDict:
+    return _frozen_mapping((key, _freeze_json_value(value)) for key, value in pairs)
+
+
+def _root(data: t.Any, source: str) -> ContextDict:
+    if not isinstance(data, ContextDict):
+        raise ValueError(f'The top level of {source} must be a mapping,'
+                         f' not {type(data).__name__}')
+    return data
+
+
+def load_json(fp: t.Union[t.TextIO, t.BinaryIO]) -> ContextDict:
+    """
+    Load a frozen context from a JSON document.
+
+    Each JSON object becomes a frozen ContextDict and each array becomes a tuple.
+
+    :arg fp: File object to read the JSON from.
+    :raises json.JSONDecodeError: if the document is not valid JSON.
+    :raises ValueError: if the document is not a JSON object.
+    """
+    return _root(json.load(fp, object_pairs_hook=_json_object), 'a JSON context')
+
+
+def load_toml(fp: t.BinaryIO) -> ContextDict:
+    """
+    Load a frozen context from a TOML document.
+
+    Tables become frozen ContextDicts and arrays become tuples.
+
+    :arg fp: File object opened in binary mode to read the TOML from.
+    :raises ImportError: if neither :mod:`tomllib` nor :mod:`tomli` is available.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError as exc:
+            raise ImportError('Loading TOML requires Python-3.11 or the tomli library') from exc
+
+    return _DEFAULT_FREEZER(tomllib.load(fp))
+
+
+def _nest(variables: t.Iterable[t.Tuple[str, str]], prefix: str, separator: str,
+          lowercase: bool) -> ContextDict:
+    root: t.Dict[str, t.Any] = {}
+    for name, value in variables:
+        if not name.startswith(prefix):
+            continue
+        name = name[len(prefix):]
+        if lowercase:
+            name = name.lower()
+
+        *parents, key = name.split(separator) if separator else (name,)
+        table = root
+        for parent in parents:
+            table = table.setdefault(parent, {})
+            if not isinstance(table, dict):
+                raise ValueError(f'{prefix}{name} is nested under a variable which has a value')
+        if isinstance(table.get(key), dict):
+            raise ValueError(f'{prefix}{name} has a value and nested variables')
+        table[key] = value
+
+    return _freeze_tables(root)
+
+
+def _freeze_tables(table: t.Dict[str, t.Any]) -> ContextDict:
+    for key, value in table.items():
+        if type(value) is dict:
+            table[key] = _freeze_tables(value)
+    return _frozen_mapping(table)
+
+
+def load_env(environ: t.Optional[t.Mapping[str, str]] = None, prefix: str = '',
+             separator: str = '__', lowercase: bool = True) -> ContextDict:
+    """
+    Load a frozen context from environment variables.
+
+    Variables whose names start with prefix are loaded with the prefix removed.  Names are split
+    on separator to create nested contexts.  For instance, with ``prefix='APP_'``,
+    ``APP_DB__HOST=localhost`` is loaded as ``{'db': {'host': 'localhost'}}``.  Values are
+    strings.
+
+    :kwarg environ: Mapping of the variables.  Defaults to :data:`os.environ`.
+    :kwarg prefix: Only load variables whose names start with this.
+    :kwarg separator: String which separates the levels of nesting in a name.  Set this to an
+        empty string to load the variables without nesting them.
+    :kwarg lowercase: Convert names to lowercase.
+    :raises ValueError: if a variable has a value and also has variables nested under it.
+    """
+    if environ is None:
+        environ = os.environ
+    return _nest(environ.items(), prefix, separator, lowercase)
+
+
+def _parse_env_lines(fp: t.TextIO) -> t.Iterator[t.Tuple[str, str]]:
+    for line_num, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('export '):
+            line = line[len('export '):].lstrip()
+
+        name, sep, value = line.partition('=')
+        name = name.strip()
+        if not sep or not name:
+            raise ValueError(f'Line {line_num} is not a NAME=value assignment: {line}')
+
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            value = value[1:-1]
+        yield name, value
+
+
+def load_env_file(fp: t.TextIO, prefix: str = '', separator: str = '__',
+                  lowercase: bool = True) -> ContextDict:
+    """
+    Load a frozen context from a file of ``NAME=value`` lines such as a ``.env`` file.
+
+    Blank lines and lines starting with ``#`` are skipped.  Names may be preceded by
+    ``export``.  Values may be enclosed in single or double quotes.  Other shell syntax is not
+    interpreted.  The remaining arguments are the same as for :func:`load_env`.
+
+    :arg fp: File object to read the variables from.
+    :raises ValueError: if a line is not an assignment or the variables cannot be nested.
+    """
+    return _nest(_parse_env_lines(fp), prefix, separator, lowercase)
@@ -0,0 +1,136 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""Cache the results of functions which depend on a context."""
+
+import collections
+import functools
+import threading
+import time
+import typing as t
+
+from .context import get_context
+from .errors import MustBeFrozen
+
+__all__ = ('CacheInfo', 'memoize')
+
+
+#: Statistics returned by the ``cache_info()`` method of memoized functions.  These are the same
+#: fields as the statistics of :func:`functools.lru_cache`.
+CacheInfo = collections.namedtuple('CacheInfo', ('hits', 'misses', 'maxsize', 'currsize'))
+
+_MISSING = object()
+
+
+def _context_key(ctx_name: str, keys: t.Optional[t.Tuple[t.Hashable, ...]]) -> t.Hashable:
+    ctx = get_context(ctx_name)
+    if not ctx.frozen:
+        raise MustBeFrozen(f'The {ctx_name} context must be frozen before memoized functions'
+                           ' can use it')
+    if keys is None:
+        # Frozen contexts cache their hash and dict lookups check identity first so this is cheap
+        # after the first call with each context
+        return ctx
+
+    get = ctx.get
+    return tuple([get(key, _MISSING) for key in keys])
+
+
+def _lru_memoize(func: t.Callable, ctx_name: str, keys: t.Optional[t.Tuple[t.Hashable, ...]],
+                 maxsize: t.Optional[int]) -> t.Callable:
+    # Without a ttl, lru_cache does everything that is needed.  The context key is passed in as
+    # an extra argument so that it is part of the key which lru_cache makes.
+    @functools.lru_cache(maxsize=maxsize)
+    def cached(_ctx_key, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return cached(_context_key(ctx_name, keys), *args, **kwargs)
+
+    def cache_info() -> CacheInfo:
+        return CacheInfo(*cached.cache_info())
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+def _ttl_memoize(func: t.Callable, ctx_name: str, keys: t.Optional[t.Tuple[t.Hashable, ...]],
+                 maxsize: t.Optional[int], ttl: float) -> t.Callable:
+    cache: 'collections.OrderedDict[t.Hashable, t.Tuple[float, t.Any]]' = (
+        collections.OrderedDict())
+    lock = threading.Lock()
+    stats = [0, 0]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache_key = (_context_key(ctx_name, keys), args, tuple(kwargs.items()) if kwargs else ())
+        now = time.monotonic()
+
+        with lock:
+            entry = cache.get(cache_key)
+            if entry is not None and entry[0] > now:
+                cache.move_to_end(cache_key)
+                stats[0] += 1
+                return entry[1]
+            stats[1] += 1
+
+        # Do not hold the lock while the function runs.  Concurrent calls may both compute the
+        # result but one slow call does not block the others.
+        result = func(*args, **kwargs)
+
+        with lock:
+            cache[cache_key] = (now + ttl, result)
+            cache.move_to_end(cache_key)
+            if maxsize is not None and len(cache) > maxsize:
+                cache.popitem(last=False)
+        return result
+
+    def cache_info() -> CacheInfo:
+        with lock:
+            return CacheInfo(stats[0], stats[1], maxsize, len(cache))
+
+    def cache_clear() -> None:
+        with lock:
+            cache.clear()
+            stats[:] = [0, 0]
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
+def memoize(ctx_name: str, keys: t.Optional[t.Iterable[t.Hashable]] = None,
+            maxsize: t.Optional[int] = 128, ttl: t.Optional[float] = None) -> t.Callable:
+    """
+    Decorator which caches a function's results for each context it is called with.
+
+    The results are keyed on the function's arguments and the context which is active for
+    ctx_name when it is called.  A result cached while one context was active is not returned
+    while another context is active.  The arguments must be hashable.
+
+    Like :func:`functools.lru_cache`, the decorated function has ``cache_info()`` and
+    ``cache_clear()`` methods.  ``cache_info()`` returns a :data:`CacheInfo` of the hits, misses,
+    maxsize, and current size of the cache.  Without a ttl, :func:`functools.lru_cache` holds
+    the results.
+
+    :arg ctx_name: The name of the context which the function depends on.
+    :kwarg keys: If given, the function only depends on these keys of the context.  Results are
+        shared by all contexts which have the same values for them.  Missing keys are allowed.
+    :kwarg maxsize: Maximum number of results to cache.  The least recently used result is
+        dropped when there are more.  None means the cache is unbounded.
+    :kwarg ttl: Number of seconds that a result stays valid.  None means results do not expire.
+    :raises ~bailiwick.errors.MustBeFrozen: when the function is called if the active context is
+        not frozen.
+    """
+    if keys is not None:
+        keys = tuple(keys)
+
+    def decorator(func: t.Callable) -> t.Callable:
+        if ttl is None:
+            return _lru_memoize(func, ctx_name, keys, maxsize)
+        return _ttl_memoize(func, ctx_name, keys, maxsize, ttl)
+
+    return decorator
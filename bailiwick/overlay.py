@@ -0,0 +1,131 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""Read-only mapping which layers a few overriding entries on top of a frozen parent."""
+
+import typing as t
+
+from collections.abc import Mapping
+
+from .persistent import PersistentMap
+
+__all__ = ('MAX_OVERLAY_DEPTH', 'OverlayMap')
+
+
+#: Default number of overlays which can be stacked before deriving another one flattens them.
+MAX_OVERLAY_DEPTH = 8
+
+#: Returned when a key is not present.
+_MISSING = object()
+
+
+class OverlayMap(Mapping):
+    """
+    Mapping of overriding entries backed by a parent mapping for all other keys.
+
+    Creating an OverlayMap costs time and memory proportional to the number of overrides.  When
+    the parent is another OverlayMap, a lookup which is not overridden has to check each overlay
+    in the chain.  The chain is flattened into a single mapping once the extra checks add up to
+    the cost of flattening it.  That keeps the amortized cost of a lookup within a constant
+    factor of a lookup in a flat mapping.
+
+    Both the overrides and the parent must be immutable.
+
+    :arg overrides: Mapping of the entries which override the parent.
+    :arg parent: Mapping holding all other entries.
+    """
+
+    __slots__ = ('_overrides', '_parent', 'depth', '_root_len', '_wasted', '_len')
+
+    def __init__(self, overrides: t.Mapping, parent: t.Mapping) -> None:
+        self._overrides = overrides
+        self._parent = parent
+        if isinstance(parent, OverlayMap):
+            #: Number of overlays in the chain, counting this one.
+            self.depth: int = parent.depth + 1
+            self._root_len: int = parent._root_len
+        else:
+            self.depth = 1
+            self._root_len = len(parent)
+        #: Number of overlays that lookups have had to skip past since the chain was flattened.
+        self._wasted = 0
+        self._len: t.Optional[int] = None
+
+    def flattened(self) -> t.Mapping:
+        """
+        Return a flat mapping with the same contents.
+
+        If the mapping at the bottom of the chain is a
+        :class:`~bailiwick.persistent.PersistentMap`, the result shares its structure.
+        Otherwise the result is a new dict.
+        """
+        layers = []
+        node: t.Mapping = self
+        while isinstance(node, OverlayMap):
+            layers.append(node._overrides)
+            node = node._parent
+
+        if isinstance(node, PersistentMap):
+            for layer in reversed(layers):
+                node = node.update(layer)
+            return node
+
+        flat = dict(node)
+        for layer in reversed(layers):
+            flat.update(layer)
+        return flat
+
+    def _compact(self) -> None:
+        # Readers see either the old parent or the new one.  Both have the same contents.
+        self._parent = self._parent.flattened()
+        self.depth = 1
+        self._root_len = len(self._parent)
+        self._wasted = 0
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        value = self._overrides.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        node = self._parent
+        if not isinstance(node, OverlayMap):
+            return node[key]
+
+        hops = 0
+        while isinstance(node, OverlayMap):
+            value = node._overrides.get(key, _MISSING)
+            if value is not _MISSING:
+                break
+            node = node._parent
+            hops += 1
+
+        self._wasted += hops
+        if self._wasted > self._root_len:
+            self._compact()
+
+        if value is _MISSING:
+            return node[key]
+        return value
+
+    def _parent_keys(self) -> t.Mapping:
+        if isinstance(self._parent, OverlayMap):
+            # Visiting every key costs as much as flattening
+            self._compact()
+        return self._parent
+
+    def __iter__(self) -> t.Iterator[t.Hashable]:
+        parent = self._parent_keys()
+        yield from parent
+        for key in self._overrides:
+            if key not in parent:
+                yield key
+
+    def __len__(self) -> int:
+        if self._len is None:
+            parent = self._parent_keys()
+            self._len = len(parent) + sum(1 for key in self._overrides if key not in parent)
+        return self._len
+
+    def __repr__(self) -> str:
+        return f'OverlayMap({self._overrides!r}, {self._parent!r})'
@@ -0,0 +1,79 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""Index of the dotted paths to every value in nested, frozen mappings."""
+
+import bisect
+import typing as t
+
+from collections.abc import Mapping
+
+__all__ = ('PATH_SEPARATOR', 'PathIndex')
+
+
+#: Separator between the keys in a path
+PATH_SEPARATOR = '.'
+
+
+class PathIndex:
+    """
+    Index of the values in nested mappings by their dotted paths.
+
+    ``index['db.pool.size']`` returns ``root['db']['pool']['size']`` with a single dict lookup.
+    Every mapping in the tree is indexed as well as the values inside of it.  Only string keys are
+    indexed and the mappings must not change after the index is built.
+
+    The index holds a dict of the paths and a sorted list of the same path strings for prefix
+    queries.
+
+    .. note:: A key which contains the separator makes paths ambiguous.  If two entries have the
+        same path, which one is indexed is unspecified.
+
+    :arg root: The mapping to index.
+    """
+
+    __slots__ = ('_values', '_paths')
+
+    def __init__(self, root: t.Mapping) -> None:
+        values: t.Dict[str, t.Any] = {}
+        # Walk the tree with an explicit stack so that deeply nested data does not recurse
+        stack: t.List[t.Tuple[str, t.Mapping]] = [('', root)]
+        while stack:
+            prefix, mapping = stack.pop()
+            for key, value in mapping.items():
+                if type(key) is not str:
+                    continue
+                path = f'{prefix}{key}'
+                values[path] = value
+                if isinstance(value, Mapping):
+                    stack.append((f'{path}{PATH_SEPARATOR}', value))
+
+        self._values = values
+        self._paths = sorted(values)
+
+    def __getitem__(self, path: str) -> t.Any:
+        return self._values[path]
+
+    def __contains__(self, path: t.Any) -> bool:
+        return path in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def prefix_items(self, prefix: str = '') -> t.Iterator[t.Tuple[str, t.Any]]:
+        """
+        Iterate over the paths nested under prefix and their values, sorted by path.
+
+        :kwarg prefix: Path of a mapping.  Its own entry is not included.  If this is empty, all
+            paths are returned.
+        """
+        if prefix:
+            prefix = f'{prefix}{PATH_SEPARATOR}'
+
+        paths = self._paths
+        index = bisect.bisect_left(paths, prefix)
+        while index < len(paths) and paths[index].startswith(prefix):
+            path = paths[index]
+            yield path, self._values[path]
+            index += 1
@@ -0,0 +1,392 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Immutable mapping which shares structure with the mappings it was derived from.
+
+:class:`PersistentMap` is a hash array mapped trie.  Setting or deleting a key returns a new map
+which copies only the nodes on the path to that key (at most one node per five bits of the hash)
+and shares everything else with the original.
+"""
+
+import typing as t
+
+from collections.abc import Mapping, MutableMapping
+
+__all__ = ('PersistentMap', 'PersistentMapBuilder')
+
+
+#: Number of bits of the hash which select an entry at each level of the trie.
+_BITS = 5
+
+#: Mask for the bits which select an entry at one level.
+_LEVEL_MASK = (1 << _BITS) - 1
+
+#: Hashes are made non-negative so that shifting them always runs out of bits.
+_HASH_MASK = (1 << 64) - 1
+
+#: Returned when a key is not present.
+_MISSING = object()
+
+#: An entry for a single key.  This is the masked hash of the key, the key, and the value.
+_Leaf = t.Tuple[int, t.Hashable, t.Any]
+
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:  # pragma: no cover  (Python < 3.10)
+    def _popcount(number: int) -> int:
+        return bin(number).count('1')
+
+
+def _hash(key: t.Hashable) -> int:
+    return hash(key) & _HASH_MASK
+
+
+def _same_key(leaf: _Leaf, key_hash: int, key: t.Hashable) -> bool:
+    return leaf[0] == key_hash and (leaf[1] is key or leaf[1] == key)
+
+
+class _BitmapNode:
+    """
+    Node with up to 32 entries, one for each value of the hash bits at this level.
+
+    ``bitmap`` has a bit set for each entry which is present.  ``entries`` only holds the present
+    entries so the position of an entry is the number of bits set below its bit.  Each entry is
+    either a leaf tuple or a child node.
+    """
+
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap: int, entries: t.Tuple) -> None:
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def _replace(self, index: int, entry: t.Any) -> '_BitmapNode':
+        entries = self.entries
+        return _BitmapNode(self.bitmap, entries[:index] + (entry,) + entries[index + 1:])
+
+    def assoc(self, shift: int, leaf: _Leaf) -> t.Tuple[t.Any, bool]:
+        """Return a node with leaf set in it and whether a new key was added."""
+        bit = 1 << ((leaf[0] >> shift) & _LEVEL_MASK)
+        index = _popcount(self.bitmap & (bit - 1))
+
+        if not self.bitmap & bit:
+            entries = self.entries[:index] + (leaf,) + self.entries[index:]
+            return _BitmapNode(self.bitmap | bit, entries), True
+
+        entry = self.entries[index]
+        if type(entry) is not tuple:
+            child, added = entry.assoc(shift + _BITS, leaf)
+            if child is entry:
+                return self, False
+            return self._replace(index, child), added
+
+        if not _same_key(entry, leaf[0], leaf[1]):
+            return self._replace(index, _merge(shift + _BITS, entry, leaf)), True
+
+        if entry[2] is leaf[2]:
+            return self, False
+        # Like dict, keep the key object which was stored first
+        return self._replace(index, (entry[0], entry[1], leaf[2])), False
+
+    def dissoc(self, shift: int, key_hash: int, key: t.Hashable) -> t.Any:
+        """
+        Return what should replace this node once key is removed.
+
+        This is a node, a single leaf which can be moved up into the parent, or None if nothing
+        is left.  Raises :exc:`KeyError` if the key is not present.
+        """
+        bit = 1 << ((key_hash >> shift) & _LEVEL_MASK)
+        if not self.bitmap & bit:
+            raise KeyError(key)
+
+        index = _popcount(self.bitmap & (bit - 1))
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            if not _same_key(entry, key_hash, key):
+                raise KeyError(key)
+            replacement = None
+        else:
+            replacement = entry.dissoc(shift + _BITS, key_hash, key)
+
+        if replacement is not None:
+            if type(replacement) is tuple and len(self.entries) == 1:
+                return replacement
+            return self._replace(index, replacement)
+
+        entries = self.entries[:index] + self.entries[index + 1:]
+        if not entries:
+            return None
+        if len(entries) == 1 and type(entries[0]) is tuple:
+            return entries[0]
+        return _BitmapNode(self.bitmap ^ bit, entries)
+
+
+class _CollisionNode:
+    """Node holding the leaves for keys whose hashes are entirely the same."""
+
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, key_hash: int, entries: t.Tuple[_Leaf, ...]) -> None:
+        self.hash = key_hash
+        self.entries = entries
+
+    def _find(self, key_hash: int, key: t.Hashable) -> int:
+        for index, entry in enumerate(self.entries):
+            if _same_key(entry, key_hash, key):
+                return index
+        return -1
+
+    def assoc(self, shift: int, leaf: _Leaf) -> t.Tuple[t.Any, bool]:
+        if leaf[0] != self.hash:
+            # The new key only shares some of the hash.  Put a node in front of this one to sort
+            # them out at this level or below.
+            node = _BitmapNode(1 << ((self.hash >> shift) & _LEVEL_MASK), (self,))
+            return node.assoc(shift, leaf)
+
+        index = self._find(leaf[0], leaf[1])
+        if index == -1:
+            return _CollisionNode(self.hash, self.entries + (leaf,)), True
+
+        entry = self.entries[index]
+        if entry[2] is leaf[2]:
+            return self, False
+        entries = self.entries
+        new_leaf = (entry[0], entry[1], leaf[2])
+        return _CollisionNode(self.hash, entries[:index] + (new_leaf,) + entries[index + 1:]), False
+
+    def dissoc(self, shift: int, key_hash: int, key: t.Hashable) -> t.Any:
+        index = self._find(key_hash, key)
+        if index == -1:
+            raise KeyError(key)
+
+        entries = self.entries[:index] + self.entries[index + 1:]
+        if len(entries) == 1:
+            return entries[0]
+        return _CollisionNode(self.hash, entries)
+
+
+def _merge(shift: int, first: _Leaf, second: _Leaf) -> t.Any:
+    """Create the node which holds two leaves that are in the same slot one level up."""
+    if first[0] == second[0]:
+        return _CollisionNode(first[0], (first, second))
+
+    first_index = (first[0] >> shift) & _LEVEL_MASK
+    second_index = (second[0] >> shift) & _LEVEL_MASK
+    if first_index == second_index:
+        return _BitmapNode(1 << first_index, (_merge(shift + _BITS, first, second),))
+
+    if first_index > second_index:
+        first, second = second, first
+    return _BitmapNode((1 << first_index) | (1 << second_index), (first, second))
+
+
+def _find(node: t.Any, key_hash: int, key: t.Hashable) -> t.Any:
+    """Return the leaf for key or None."""
+    shift = 0
+    while type(node) is _BitmapNode:
+        bit = 1 << ((key_hash >> shift) & _LEVEL_MASK)
+        if not node.bitmap & bit:
+            return None
+
+        entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+        if type(entry) is tuple:
+            return entry if _same_key(entry, key_hash, key) else None
+
+        node = entry
+        shift += _BITS
+
+    index = node._find(key_hash, key)  # pylint: disable=protected-access
+    return None if index == -1 else node.entries[index]
+
+
+def _iter_leaves(root: _BitmapNode) -> t.Iterator[_Leaf]:
+    stack = [iter(root.entries)]
+    while stack:
+        for entry in stack[-1]:
+            if type(entry) is tuple:
+                yield entry
+            else:
+                stack.append(iter(entry.entries))
+                break
+        else:
+            stack.pop()
+
+
+_EMPTY_NODE = _BitmapNode(0, ())
+
+
+class PersistentMap(Mapping):
+    """
+    Immutable Mapping which shares unchanged entries with the map it was derived from.
+
+    :meth:`set`, :meth:`delete`, and :meth:`update` return a new PersistentMap and leave the
+    original alone.  Changing k keys in a map of n keys costs O(k log n) time and memory rather
+    than the O(n) of copying a dict.  Looking up a key is O(log n) but is slower than a dict lookup
+    in practice.
+
+    Takes the same arguments as :class:`dict`.
+
+    .. note:: Keys are iterated in an order determined by their hashes, not in the order that
+        they were added.
+    """
+
+    __slots__ = ('_root', '_len', '_hash')
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._root: _BitmapNode = _EMPTY_NODE
+        self._len: int = 0
+        self._hash: t.Optional[int] = None
+        if args or kwargs:
+            self._root, self._len = self._assoc_all(dict(*args, **kwargs).items())
+
+    @classmethod
+    def _from_root(cls, root: _BitmapNode, length: int) -> 'PersistentMap':
+        new_map = cls.__new__(cls)
+        new_map._root = root
+        new_map._len = length
+        new_map._hash = None
+        return new_map
+
+    def _assoc_all(self, items: t.Iterable[t.Tuple[t.Hashable, t.Any]]
+                   ) -> t.Tuple[_BitmapNode, int]:
+        root = self._root
+        length = self._len
+        for key, value in items:
+            root, added = root.assoc(0, (_hash(key), key, value))
+            length += added
+        return root, length
+
+    def set(self, key: t.Hashable, value: t.Any) -> 'PersistentMap':
+        """Return a new map with key set to value."""
+        root, added = self._root.assoc(0, (_hash(key), key, value))
+        if root is self._root:
+            return self
+        return self._from_root(root, self._len + added)
+
+    def delete(self, key: t.Hashable) -> 'PersistentMap':
+        """Return a new map without key.  Raises :exc:`KeyError` if key is not present."""
+        root = self._root.dissoc(0, _hash(key), key)
+        if root is None:
+            root = _EMPTY_NODE
+        elif type(root) is tuple:
+            # The root must stay a node
+            root = _BitmapNode(1 << (root[0] & _LEVEL_MASK), (root,))
+        return self._from_root(root, self._len - 1)
+
+    def update(self, *args, **kwargs) -> 'PersistentMap':
+        """Return a new map with the entries from a mapping or iterable of pairs set in it."""
+        if len(args) == 1 and not kwargs and isinstance(args[0], Mapping):
+            items = args[0].items()
+        else:
+            items = dict(*args, **kwargs).items()
+
+        root, length = self._assoc_all(items)
+        if root is self._root:
+            return self
+        return self._from_root(root, length)
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        leaf = _find(self._root, _hash(key), key)
+        if leaf is None:
+            raise KeyError(key)
+        return leaf[2]
+
+    def __contains__(self, key: t.Any) -> bool:
+        return _find(self._root, _hash(key), key) is not None
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        leaf = _find(self._root, _hash(key), key)
+        return default if leaf is None else leaf[2]
+
+    def __iter__(self) -> t.Iterator[t.Hashable]:
+        return (leaf[1] for leaf in _iter_leaves(self._root))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(frozenset(self.items()))
+        return self._hash
+
+    def __eq__(self, other: t.Any) -> bool:
+        if not isinstance(other, Mapping):
+            return NotImplemented
+
+        if isinstance(other, PersistentMap) and other._root is self._root:
+            return True
+
+        if len(self) != len(other):
+            return False
+
+        for leaf in _iter_leaves(self._root):
+            if other.get(leaf[1], _MISSING) != leaf[2]:
+                return False
+        return True
+
+    def __reduce__(self) -> t.Tuple:
+        return (type(self), (dict(self.items()),))
+
+    def __repr__(self) -> str:
+        return f'PersistentMap({dict(self.items())!r})'
+
+
+class PersistentMapBuilder(MutableMapping):
+    """
+    Mutable mapping which collects changes to make to a :class:`PersistentMap`.
+
+    Assignments are kept in the :attr:`pending` dict until :meth:`build` applies them to
+    :attr:`base`.  Deletions are applied to :attr:`base` right away.
+
+    :kwarg base: The PersistentMap to start from.  Defaults to an empty map.
+    :kwarg pending: A dict of assignments to start with.  The builder takes ownership of it.
+    """
+
+    __slots__ = ('base', 'pending')
+
+    def __init__(self, base: t.Optional[PersistentMap] = None,
+                 pending: t.Optional[t.Dict] = None) -> None:
+        self.base: PersistentMap = PersistentMap() if base is None else base
+        self.pending: t.Dict = {} if pending is None else pending
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        value = self.pending.get(key, _MISSING)
+        if value is _MISSING:
+            return self.base[key]
+        return value
+
+    def __setitem__(self, key: t.Hashable, value: t.Any) -> None:
+        self.pending[key] = value
+
+    def __delitem__(self, key: t.Hashable) -> None:
+        found = self.pending.pop(key, _MISSING) is not _MISSING
+        if key in self.base:
+            self.base = self.base.delete(key)
+        elif not found:
+            raise KeyError(key)
+
+    def __iter__(self) -> t.Iterator[t.Hashable]:
+        yield from self.base
+        for key in self.pending:
+            if key not in self.base:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.base) + sum(1 for key in self.pending if key not in self.base)
+
+    def clear(self) -> None:
+        self.base = PersistentMap()
+        self.pending.clear()
+
+    def copy(self) -> 'PersistentMapBuilder':
+        return PersistentMapBuilder(self.base, dict(self.pending))
+
+    def build(self) -> PersistentMap:
+        """Return a PersistentMap with the pending assignments applied to the base."""
+        return self.base.update(self.pending)
+
+    def __repr__(self) -> str:
+        return f'PersistentMapBuilder({self.base!r}, {self.pending!r})'
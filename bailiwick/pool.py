@@ -0,0 +1,219 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""Share one instance between frozen values which have the same contents."""
+
+import math
+import sys
+import threading
+import typing as t
+import weakref
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+__all__ = ('InternPool',)
+
+
+#: Types whose instances are interchangeable when they are equal and of the same type.
+_EXACT_SCALARS = frozenset((str, bytes, int, bool, type(None)))
+
+
+def _same_leaf(first: t.Any, second: t.Any) -> bool:
+    """
+    Check whether two values inside of frozen containers can be substituted for each other.
+
+    This is stricter than ``==``: ``1`` and ``1.0`` are equal but a container holding one of them
+    must not be replaced by a container holding the other.  Containers are only the same if they
+    are the same object.  That works because the freezer interns nested containers before the
+    containers which hold them.
+    """
+    if first is second:
+        return True
+
+    type_ = type(first)
+    if type_ is not type(second):
+        return False
+
+    if type_ in _EXACT_SCALARS:
+        return first == second
+
+    if type_ is float:
+        return first == second and math.copysign(1.0, first) == math.copysign(1.0, second)
+
+    return False
+
+
+def _same_frozenset(first: t.AbstractSet, second: t.AbstractSet) -> bool:
+    if len(first) != len(second):
+        return False
+
+    # Map each element to itself so that we can find the element in second which equals one from
+    # first and then check that it is the same type as well
+    members = {value: value for value in second}
+    missing = object()
+    return all(_same_leaf(value, members.get(value, missing)) for value in first)
+
+
+def _same_mapping(first: t.Mapping, second: t.Mapping) -> bool:
+    # Iteration order is observable so it has to match too
+    return len(first) == len(second) and all(
+        _same_leaf(key1, key2) and _same_leaf(value1, value2)
+        for (key1, value1), (key2, value2) in zip(first.items(), second.items()))
+
+
+def _same_contents(first: t.Any, second: t.Any) -> bool:
+    if type(first) is not type(second):
+        return False
+
+    if isinstance(first, tuple):
+        return len(first) == len(second) and all(map(_same_leaf, first, second))
+
+    if isinstance(first, frozenset):
+        return _same_frozenset(first, second)
+
+    if isinstance(first, Mapping):
+        return _same_mapping(first, second)
+
+    return _same_leaf(first, second)
+
+
+class _PoolRef(weakref.ref):
+    __slots__ = ('hash',)
+
+
+class InternPool:
+    """
+    Pool of canonical instances for frozen values.
+
+    :meth:`intern` returns an existing instance from the pool when one with the same contents
+    has already been interned.  Otherwise the value itself becomes the canonical instance.  Pass
+    a pool to :class:`~bailiwick.collections.DefaultFreezer` to have it intern the tuples,
+    frozensets, strings, bytes, and :class:`~bailiwick.collections.ContextDict` objects that it
+    creates.  Many contexts which are frozen from similar data will then share most of their
+    memory.
+
+    Frozen ContextDicts are held by weak references so they leave the pool once nothing else is
+    using them.  Strings are interned with :func:`sys.intern`.  Tuples, frozensets, bytes and
+    other values which cannot be weakly referenced are held in a least recently used cache of
+    ``max_strong`` hash buckets instead.
+
+    Contents are compared more strictly than ``==``.  The values must be of the same type and
+    ``1``, ``1.0``, and ``True`` are all different.  Nested containers are only the same if they
+    are the same object so values should be interned from the innermost containers out.  The
+    freezer does that.
+
+    :kwarg max_strong: The maximum number of hash buckets of values which cannot be weakly
+        referenced to keep.
+
+    .. note:: The values are hashed to find them in the pool.  Values which cannot be hashed are
+        returned without being interned.
+    """
+
+    def __init__(self, max_strong: int = 4096) -> None:
+        self.max_strong = max_strong
+        # Reentrant because a weakref callback can run while the lock is held
+        self._lock = threading.RLock()
+        self._weak: t.Dict[int, t.List[_PoolRef]] = {}
+        self._strong: 'OrderedDict[int, t.List[t.Any]]' = OrderedDict()
+
+        #: Number of times an existing instance was returned.
+        self.hits: int = 0
+        #: Number of times a value became the canonical instance.
+        self.misses: int = 0
+        #: Total of :func:`sys.getsizeof` for the duplicate values that were replaced by an
+        #: existing instance.
+        self.bytes_saved: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of calls to :meth:`intern` which returned an existing instance."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return (sum(len(bucket) for bucket in self._weak.values())
+                    + sum(len(bucket) for bucket in self._strong.values()))
+
+    def _remove_ref(self, ref: _PoolRef) -> None:
+        with self._lock:
+            bucket = self._weak.get(ref.hash)
+            if bucket is None:
+                return
+            try:
+                bucket.remove(ref)
+            except ValueError:
+                pass
+            if not bucket:
+                del self._weak[ref.hash]
+
+    def _count(self, value: t.Any, canonical: t.Any) -> None:
+        if canonical is value:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.bytes_saved += sys.getsizeof(value)
+
+    def _intern_weak(self, value: t.Any, value_hash: int) -> t.Any:
+        bucket = self._weak.setdefault(value_hash, [])
+        for ref in bucket:
+            canonical = ref()
+            if canonical is not None and _same_contents(canonical, value):
+                return canonical
+
+        ref = _PoolRef(value, self._remove_ref)
+        ref.hash = value_hash
+        bucket.append(ref)
+        return value
+
+    def _intern_strong(self, value: t.Any, value_hash: int) -> t.Any:
+        bucket = self._strong.get(value_hash)
+        if bucket is None:
+            bucket = self._strong[value_hash] = []
+            if len(self._strong) > self.max_strong:
+                self._strong.popitem(last=False)
+        else:
+            self._strong.move_to_end(value_hash)
+            for canonical in bucket:
+                if _same_contents(canonical, value):
+                    return canonical
+
+        bucket.append(value)
+        return value
+
+    def intern(self, value: t.Any) -> t.Any:
+        """
+        Return the canonical instance of a frozen value.
+
+        :arg value: A frozen value.  This must not be modified after it is interned.
+        :returns: An instance with the same contents as ``value``.  This is ``value`` itself if
+            there was no such instance in the pool yet.
+        """
+        if type(value) is str:
+            # The interpreter's own table drops strings once nothing else is using them
+            canonical = sys.intern(value)
+            with self._lock:
+                self._count(value, canonical)
+            return canonical
+
+        try:
+            value_hash = hash(value)
+        except TypeError:
+            return value
+
+        with self._lock:
+            if type(value).__weakrefoffset__:
+                canonical = self._intern_weak(value, value_hash)
+            else:
+                canonical = self._intern_strong(value, value_hash)
+            self._count(value, canonical)
+
+        return canonical
+
+    def clear(self) -> None:
+        """Remove all of the values from the pool.  Statistics are not reset."""
+        with self._lock:
+            self._weak.clear()
+            self._strong.clear()
@@ -0,0 +1,375 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Compact, immutable records for contexts which always have the same keys.
+
+A :class:`Schema` declares the keys of a kind of context and generates a record type for it::
+
+    server = Schema('Server', ('host', 'port'))
+    record = server({'host': 'localhost', 'port': 8080})
+    record['port']
+
+Records are read-only :class:`~collections.abc.Mapping` instances like frozen
+:class:`~bailiwick.collections.ContextDict`.  They compare and hash equal to a ContextDict with the
+same contents and can be activated with :func:`~bailiwick.context.activate_context` or
+registered with :func:`~bailiwick.context.register_context`.  Each value is kept in a slot of the
+record instead of in a dict so a record uses a fraction of the memory of a ContextDict and
+looking up a key takes one dict lookup in the record type's table of keys.
+
+Keys can be given a :class:`Field` which declares their type, a default, and a function to convert
+their values with::
+
+    server = Schema('Server', {'host': Field(str), 'port': Field(int, default=80, convert=int)})
+    ctx = ContextDict.new({'host': 'localhost', 'port': '8080'})
+    ctx.freeze(schema=server)
+
+The checks are compiled into a Python function the first time a schema is used with a freezer.
+The function checks, converts, and freezes each value in a single pass over the data so
+validating a context while freezing it costs little more than freezing it.
+"""
+
+import collections
+import operator
+import pickle
+import typing as t
+import weakref
+
+from collections.abc import Mapping
+
+from .collections import _DEFAULT_FREEZER, DefaultFreezer
+from .errors import SchemaError
+
+__all__ = ('MISSING', 'Field', 'Schema', 'SchemaRecord')
+
+
+class _Missing:
+    """Marks a :class:`Field` which has no default."""
+
+    def __repr__(self) -> str:
+        return 'MISSING'
+
+    def __reduce__(self) -> str:
+        return 'MISSING'
+
+
+#: Default of a :class:`Field` which must be present in the data
+MISSING = _Missing()
+
+#: Declaration of one key of a :class:`Schema`.
+#:
+#: ``type`` is a type or tuple of types that the value must be an instance of after it is
+#: converted.  ``default`` is used when the key is not in the data.  It is frozen once, when the
+#: schema is compiled.  ``convert`` is called with the value before it is checked and frozen.
+#: TypeError and ValueError from it are reported as :exc:`~bailiwick.errors.SchemaError`.  Each
+#: of them may be left out.  Another Schema can be used as ``convert`` to nest records.
+Field = collections.namedtuple('Field', ('type', 'default', 'convert'),
+                               defaults=(None, MISSING, None))
+
+
+class SchemaRecord(Mapping):
+    """
+    Base class of the record types which :class:`Schema` generates.
+
+    Records are always frozen.  Values are frozen by the schema's freezer when the record is
+    created.
+    """
+
+    __slots__ = ()
+
+    #: Tells :class:`~bailiwick.collections.DefaultFreezer` not to copy records
+    _bailiwick_immutable = True
+
+    #: The schema which made this record type.  Set on each generated type.
+    _schema: 'Schema'
+    #: The keys in order.  Set on each generated type.
+    _fields: t.Tuple[t.Hashable, ...] = ()
+    #: Function to retrieve the value for each key.  Set on each generated type.
+    _getters: t.Dict[t.Hashable, t.Callable[['SchemaRecord'], t.Any]] = {}
+    #: Descriptor of the slot which caches the hash.  Set on each generated type.
+    _hash_slot: t.Any = None
+
+    @property
+    def frozen(self) -> bool:
+        return True
+
+    @property
+    def schema(self) -> 'Schema':
+        return self._schema
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        return self._getters[key](self)
+
+    def __contains__(self, key: t.Any) -> bool:
+        return key in self._getters
+
+    def __iter__(self) -> t.Iterator[t.Hashable]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def _values(self) -> t.Tuple:
+        return tuple(getter(self) for getter in self._getters.values())
+
+    def __hash__(self) -> int:
+        # Cached in a slot.  Records hash the same as a ContextDict with the same contents.
+        try:
+            return self._cached_hash
+        except AttributeError:
+            pass
+
+        record_hash = hash(frozenset(self.items()))
+        type(self)._hash_slot.__set__(self, record_hash)
+        return record_hash
+
+    def __eq__(self, other: t.Any) -> bool:
+        if self is other:
+            return True
+        if type(other) is type(self):
+            return self._values() == other._values()
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.items()) == other
+
+    def __setattr__(self, name: str, value: t.Any) -> None:
+        raise AttributeError(f'{type(self).__name__} records are immutable')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'{type(self).__name__} records are immutable')
+
+    def __reduce__(self) -> t.Tuple:
+        return (_restore_record, (self._schema, self._values()))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({dict(self.items())!r})'
+
+
+def _restore_record(schema: 'Schema', values: t.Tuple) -> SchemaRecord:
+    return schema._from_values(values)
+
+
+def _field_source(position: int, field: Field, leaf_types: t.Optional[t.Set[type]]) -> t.List[str]:
+    """Return the lines of the validator which check, convert, and freeze one value."""
+    key = f'k{position}'
+    # Check with ``in`` rather than catching KeyError so that mappings with __missing__ (for
+    # instance, defaultdict) do not make up values for missing keys
+    lines = [f'    if {key} in data:',
+             f'        value = data[{key}]']
+    if field.default is not MISSING:
+        lines.append('        found += 1')
+    if field.convert is not None:
+        lines.extend(['        try:',
+                      f'            value = c{position}(value)',
+                      '        except (TypeError, ValueError) as exc:',
+                      f'            raise convert_error({key}, exc) from exc'])
+    if field.type is not None:
+        lines.extend([f'        if not isinstance(value, t{position}):',
+                      f'            raise type_error({key}, value, t{position})'])
+    if leaf_types is not None:
+        # Skip calling the freezer for values which it would return unchanged
+        lines.append('        if type(value) not in leaf_types:')
+        lines.append('            value = freeze(value)')
+    else:
+        lines.append('        value = freeze(value)')
+    lines.append('    else:')
+    if field.default is MISSING:
+        lines.append('        raise mismatch(data)')
+    else:
+        lines.append(f'        value = d{position}')
+    lines.append(f'    v{position} = value')
+    return lines
+
+
+#: Schemas by a pickle of their arguments.  Unpickling a schema returns one of these when there
+#: is one so records keep their type when they are pickled and unpickled in the same process.
+_SCHEMAS: 'weakref.WeakValueDictionary[bytes, Schema]' = weakref.WeakValueDictionary()
+
+
+def _schema_key(name: str, specs: t.Mapping[t.Hashable, Field],
+                freezer: t.Optional[t.Callable[[t.Any], t.Any]]) -> t.Optional[bytes]:
+    try:
+        return pickle.dumps((name, tuple(specs.items()), freezer),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:  # pylint: disable=broad-except
+        # Schemas with converters or freezers that cannot be pickled cannot be unpickled either
+        return None
+
+
+def _restore_schema(name: str, specs: t.Mapping[t.Hashable, Field],
+                    freezer: t.Optional[t.Callable[[t.Any], t.Any]]) -> 'Schema':
+    key = _schema_key(name, specs, freezer)
+    schema = None if key is None else _SCHEMAS.get(key)
+    if schema is None:
+        schema = Schema(name, specs, freezer)
+    return schema
+
+
+class Schema:
+    """
+    Declare the keys of a kind of context and generate an immutable record type for them.
+
+    Calling the schema with a Mapping (or keyword arguments) creates a record.  The Mapping must
+    have the keys of the schema and no others.  Keys whose :class:`Field` has a default may be
+    left out.  :meth:`validate` checks data the same way and returns a dict for a
+    :class:`~bailiwick.collections.ContextDict`.
+
+    Unpickling a schema, or a record, in a process which already has a schema with the same
+    arguments returns that schema so records keep their type when they are sent to another
+    process and back.
+
+    :arg name: Name of the record type.
+    :arg fields: The keys.  They may be any hashable values.  Records iterate over them in this
+        order.  A Mapping of the keys to a :class:`Field` or a type declares how to check and
+        convert the values of each key.
+    :kwarg freezer: Function to freeze the values with.  Defaults to the same freezer as
+        ContextDict uses.
+    :raises ValueError: if a key is listed more than once.
+    """
+
+    def __init__(self, name: str,
+                 fields: t.Union[t.Iterable[t.Hashable], t.Mapping[t.Hashable, t.Any]],
+                 freezer: t.Optional[t.Callable[[t.Any], t.Any]] = None) -> None:
+        self.name = name
+        if isinstance(fields, Mapping):
+            specs = {key: spec if isinstance(spec, Field) else Field(spec)
+                     for key, spec in fields.items()}
+        else:
+            fields = tuple(fields)
+            specs = {key: Field() for key in fields}
+            if len(specs) != len(fields):
+                raise ValueError(f'Keys of the {name} schema must be unique')
+        #: :class:`Field` of each key
+        self.specs: t.Dict[t.Hashable, Field] = specs
+        self.fields: t.Tuple[t.Hashable, ...] = tuple(specs)
+        self.freezer = _DEFAULT_FREEZER if freezer is None else freezer
+        self.record_type = self._make_record_type()
+        self._slots = tuple(getattr(self.record_type, f'_v{position}')
+                            for position in range(len(self.fields)))
+        #: Compiled validators by freezer and whether they return a dict
+        self._validators: t.Dict[t.Tuple[t.Any, bool], t.Callable[[t.Mapping], t.Any]] = {}
+
+        key = _schema_key(name, specs, None if self.freezer is _DEFAULT_FREEZER else self.freezer)
+        if key is not None:
+            _SCHEMAS.setdefault(key, self)
+
+    def _make_record_type(self) -> t.Type[SchemaRecord]:
+        slots = tuple(f'_v{position}' for position in range(len(self.fields)))
+        namespace = {
+            '__slots__': ('_cached_hash',) + slots,
+            '_schema': self,
+            '_fields': self.fields,
+            '_getters': {key: operator.attrgetter(slot) for key, slot in zip(self.fields, slots)},
+        }
+        record_type = type(self.name, (SchemaRecord,), namespace)
+        record_type._hash_slot = record_type.__dict__['_cached_hash']
+        return record_type
+
+    def _compile(self, freezer: t.Callable[[t.Any], t.Any],
+                 as_dict: bool) -> t.Callable[[t.Mapping], t.Any]:
+        namespace: t.Dict[str, t.Any] = {
+            'freeze': freezer,
+            'mismatch': self._mismatch,
+            'type_error': self._type_error,
+            'convert_error': self._convert_error,
+        }
+        leaf_types = None
+        if isinstance(freezer, DefaultFreezer):
+            # Types which the freezer has resolved to a rule that returns the value unchanged.
+            # The freezer empties this when its rules change.
+            leaf_types = namespace['leaf_types'] = freezer._leaf_types
+
+        # Keys without a default are always found when the data is valid so only the keys with
+        # defaults need to be counted to detect unknown keys
+        lines = ['def validate(data):']
+        required = sum(field.default is MISSING for field in self.specs.values())
+        if required < len(self.fields):
+            lines.append('    found = 0')
+            count = f'found + {required}'
+        else:
+            count = str(required)
+
+        for position, (key, field) in enumerate(self.specs.items()):
+            namespace[f'k{position}'] = key
+            namespace[f't{position}'] = field.type
+            namespace[f'c{position}'] = field.convert
+            if field.default is not MISSING:
+                namespace[f'd{position}'] = freezer(field.default)
+            lines.extend(_field_source(position, field, leaf_types))
+
+        values = [f'v{position}' for position in range(len(self.fields))]
+        if as_dict:
+            result = ', '.join(f'k{position}: {value}' for position, value in enumerate(values))
+            result = f'{{{result}}}'
+        else:
+            result = f'({", ".join(values)},)' if values else '()'
+        lines.extend([f'    if len(data) != {count}:',
+                      '        raise mismatch(data)',
+                      f'    return {result}'])
+
+        exec(compile('\n'.join(lines), f'<schema {self.name}>', 'exec'), namespace)
+        return namespace['validate']
+
+    def _validator(self, freezer: t.Callable[[t.Any], t.Any],
+                   as_dict: bool) -> t.Callable[[t.Mapping], t.Any]:
+        try:
+            return self._validators[(freezer, as_dict)]
+        except KeyError:
+            pass
+        validator = self._validators[(freezer, as_dict)] = self._compile(freezer, as_dict)
+        return validator
+
+    def validate(self, data: t.Mapping,
+                 freezer: t.Optional[t.Callable[[t.Any], t.Any]] = None) -> t.Dict:
+        """
+        Check, convert, and freeze data in one pass.
+
+        :arg data: Mapping to validate.
+        :kwarg freezer: Function to freeze the values with.  Defaults to the schema's freezer.
+        :returns: A new dict of the frozen values.  Defaults are filled in for missing keys.
+        :raises ~bailiwick.errors.SchemaError: if data is missing keys, has unknown keys, or has
+            values which cannot be converted or are of the wrong type.
+        """
+        return self._validator(self.freezer if freezer is None else freezer, True)(data)
+
+    def _from_values(self, values: t.Sequence) -> SchemaRecord:
+        """Create a record from frozen values in the order of the fields."""
+        record = object.__new__(self.record_type)
+        for slot, value in zip(self._slots, values):
+            slot.__set__(record, value)
+        return record
+
+    def __call__(self, data: t.Optional[t.Mapping] = None, **kwargs) -> SchemaRecord:
+        if data is None:
+            data = kwargs
+        elif kwargs:
+            data = dict(data, **kwargs)
+        return self._from_values(self._validator(self.freezer, False)(data))
+
+    def _mismatch(self, data: t.Mapping) -> SchemaError:
+        missing = [key for key, field in self.specs.items()
+                   if key not in data and field.default is MISSING]
+        extra = [key for key in data if key not in self.specs]
+        problems = []
+        if missing:
+            problems.append(f'missing keys: {", ".join(map(repr, missing))}')
+        if extra:
+            problems.append(f'unknown keys: {", ".join(map(repr, extra))}')
+        return SchemaError(f'Data does not match the {self.name} schema: {"; ".join(problems)}')
+
+    def _type_error(self, key: t.Hashable, value: t.Any, type_: t.Any) -> SchemaError:
+        types = type_ if isinstance(type_, tuple) else (type_,)
+        expected = ' or '.join(type_.__name__ for type_ in types)
+        return SchemaError(f'{key!r} of the {self.name} schema must be {expected},'
+                           f' not {type(value).__name__}')
+
+    def _convert_error(self, key: t.Hashable, exc: Exception) -> SchemaError:
+        return SchemaError(f'{key!r} of the {self.name} schema could not be converted: {exc}')
+
+    def __reduce__(self) -> t.Tuple:
+        freezer = None if self.freezer is _DEFAULT_FREEZER else self.freezer
+        return (_restore_schema, (self.name, self.specs, freezer))
+
+    def __repr__(self) -> str:
+        return f'Schema({self.name!r}, {self.fields!r})'
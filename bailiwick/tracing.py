@@ -0,0 +1,290 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Find out which keys of a context are read and where they are read from.
+
+Functions which are passed a whole context usually only use a few of its keys.
+:class:`KeyTracer` records the keys which are read from the contexts that it watches, how many
+times each one is read, and the code which read it.  Its :class:`TraceReport` lists the hot keys
+and the keys which were never read.
+
+Tracing is opt-in per context.  Watching a context switches its class to a subclass which
+records each access and stopping the tracer switches it back.  Contexts which are not being
+watched run the same code as they do when this module is not used at all.
+"""
+
+import collections
+import collections.abc
+import os
+import sys
+import threading
+import typing as t
+
+from .collections import ContextDict
+
+__all__ = ('KeyTracer', 'TraceReport')
+
+
+#: Source file and line number and the function which read a key
+CallSite = t.Tuple[str, int, str]
+
+#: Files whose frames are skipped when finding the code which read a key
+_SKIP_FILES = frozenset((os.path.normcase(__file__),
+                         os.path.normcase(collections.abc.Mapping.get.__code__.co_filename)))
+
+#: Tracer and path prefix of each watched context.  Keyed by id of the context.
+_WATCHED: t.Dict[int, t.Tuple['KeyTracer', str, str]] = {}
+#: Held while contexts are watched or stopped being watched by any tracer.  Reentrant because
+#: creating a view of a nested context watches it.
+_WATCHED_LOCK = threading.RLock()
+
+#: Traced subclass of each ContextDict class
+_TRACED_CLASSES: t.Dict[type, type] = {}
+
+
+def _call_site() -> CallSite:
+    frame = sys._getframe(2)  # pylint: disable=protected-access
+    while frame.f_back is not None and os.path.normcase(frame.f_code.co_filename) in _SKIP_FILES:
+        frame = frame.f_back
+    return frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name
+
+
+class _TracedContextDict(ContextDict):
+    __slots__ = ()
+
+    #: The class this was made from.  Set on each traced class.
+    _untraced: type = ContextDict
+
+    def _record(self, key: t.Hashable, value: t.Any = None) -> t.Any:
+        watched = _WATCHED.get(id(self))
+        if watched is not None:
+            tracer, label, prefix = watched
+            return tracer._record(label, prefix, key, value, _call_site())
+        return value
+
+    def __getitem__(self, key: t.Hashable) -> t.Any:
+        return self._record(key, super().__getitem__(key))
+
+    def __contains__(self, key: t.Any) -> bool:
+        found = super().__contains__(key)
+        self._record(key)
+        return found
+
+    def __iter__(self) -> t.Any:
+        watched = _WATCHED.get(id(self))
+        if watched is not None:
+            watched[0]._record_iteration(watched[1])
+        return super().__iter__()
+
+    def __reduce__(self) -> t.Tuple:
+        # Pickle as the untraced class.  Traced classes cannot be imported by the unpickler.
+        restore, args = super().__reduce__()
+        return restore, (self._untraced,) + args[1:]
+
+
+def _traced_class(cls: type) -> type:
+    traced = _TRACED_CLASSES.get(cls)
+    if traced is None:
+        traced = _TRACED_CLASSES[cls] = type(f'Traced{cls.__name__}', (_TracedContextDict, cls),
+                                             {'__slots__': (), '_untraced': cls})
+    return traced
+
+
+def _format_path(prefix: str, key: t.Hashable) -> str:
+    return f'{prefix}{key}'
+
+
+class TraceReport:
+    """
+    Key accesses which a :class:`KeyTracer` recorded.
+
+    Paths are the keys joined by ``.``.  A key in a nested context that was retrieved from a
+    watched context is reported under the path to it.
+
+    .. attribute:: counts
+
+        Mapping of label to a :class:`collections.Counter` of the number of times each path was
+        read.
+
+    .. attribute:: call_sites
+
+        Mapping of ``(label, path)`` to a :class:`collections.Counter` of the ``(filename,
+        line number, function name)`` of the code which read it.
+
+    .. attribute:: iterations
+
+        Mapping of label to the number of times the watched contexts were iterated over.  Reading
+        all of the values of a context (for instance, with ``dict(ctx)``) records each of the
+        keys as well.
+    """
+
+    def __init__(self, counts: t.Dict[str, t.Counter[str]],
+                 call_sites: t.Dict[t.Tuple[str, str], t.Counter[CallSite]],
+                 iterations: t.Dict[str, int], known: t.Dict[str, t.Set[str]]) -> None:
+        self.counts = counts
+        self.call_sites = call_sites
+        self.iterations = iterations
+        self._known = known
+
+    def hot(self, limit: t.Optional[int] = None) -> t.List[t.Tuple[str, str, int]]:
+        """
+        Return the most read paths.
+
+        :kwarg limit: Number of paths to return.  By default, all paths that were read are
+            returned.
+        :returns: List of ``(label, path, count)`` sorted from the most read.
+        """
+        entries = [(label, path, count) for label, counter in self.counts.items()
+                   for path, count in counter.items()]
+        entries.sort(key=lambda entry: (-entry[2], entry[0], entry[1]))
+        return entries[:limit]
+
+    def unread(self) -> t.Dict[str, t.List[str]]:
+        """
+        Return the paths of the watched contexts which were never read.
+
+        Only keys of contexts which were watched are included.  If a nested context was never
+        retrieved, its own path is reported but the keys inside of it are not.
+
+        :returns: Mapping of label to a sorted list of paths.
+        """
+        return {label: sorted(known - set(self.counts.get(label, ())))
+                for label, known in self._known.items()}
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        """Return the report as a dict that can be serialized as JSON."""
+        return {
+            'hot': [{'label': label, 'path': path, 'count': count,
+                     'call_sites': [{'filename': site[0], 'lineno': site[1],
+                                     'function': site[2], 'count': site_count}
+                                    for site, site_count
+                                    in self.call_sites[(label, path)].most_common()]}
+                    for label, path, count in self.hot()],
+            'unread': self.unread(),
+            'iterations': dict(self.iterations),
+        }
+
+
+class KeyTracer:
+    """
+    Record the keys which are read from contexts.
+
+    ::
+
+        with KeyTracer() as tracer:
+            tracer.watch(bailiwick.get_context('app'), label='app')
+            run_the_code()
+        print(tracer.report().unread())
+
+    Reads by ``ctx[key]``, ``ctx.get(key)``, ``key in ctx``, and reading the values while
+    iterating are recorded.  :meth:`ContextDict.getter` and :meth:`ContextDict.get_path` look up
+    their values directly in the context's storage so they are not recorded.
+
+    Each recorded read costs a few microseconds so tracing is meant for finding out how contexts
+    are used, not for production.  When a context that is nested in a watched context is
+    retrieved, a watched view of it is returned instead.  The view shares the nested context's
+    storage but records reads under the path that it was retrieved by.  A nested context which is
+    shared by several keys (for instance, by the freezer's deduplication or an
+    :class:`~bailiwick.pool.InternPool`) therefore has its reads reported under each path
+    separately.
+    """
+
+    def __init__(self) -> None:
+        #: Guards the recorded reads.  The watched contexts and views are guarded by
+        #: _WATCHED_LOCK.
+        self._lock = threading.Lock()
+        self._counts: t.Dict[str, t.Counter[str]] = collections.defaultdict(collections.Counter)
+        self._call_sites: t.Dict[t.Tuple[str, str], t.Counter[CallSite]] = (
+            collections.defaultdict(collections.Counter))
+        self._iterations: t.Counter[str] = collections.Counter()
+        self._known: t.Dict[str, t.Set[str]] = collections.defaultdict(set)
+        #: The watched contexts and their classes before they were watched
+        self._contexts: t.Dict[int, t.Tuple[ContextDict, type]] = {}
+        #: Views of nested contexts and the contexts they view.  Keyed by label, path, and id of
+        #: the nested context.
+        self._views: t.Dict[t.Tuple[str, str, int], t.Tuple[ContextDict, ContextDict]] = {}
+
+    def watch(self, ctx: ContextDict, label: t.Optional[str] = None,
+              _prefix: str = '') -> None:
+        """
+        Start recording reads of ctx.
+
+        :arg ctx: The ContextDict to watch.
+        :kwarg label: Name to report the reads under.  Reads of contexts which are given the same
+            label are reported together.  Defaults to ``context-<n>``.
+        :raises ValueError: if another KeyTracer is watching ctx.
+        """
+        with _WATCHED_LOCK:
+            watched = _WATCHED.get(id(ctx))
+            if watched is not None:
+                if watched[0] is self:
+                    return
+                raise ValueError('The context is already being watched by another KeyTracer')
+
+            with self._lock:
+                if label is None:
+                    label = f'context-{len(self._known)}'
+                self._known[label].update(_format_path(_prefix, key) for key in ctx)
+            self._contexts[id(ctx)] = (ctx, type(ctx))
+            _WATCHED[id(ctx)] = (self, label, _prefix)
+            ctx.__class__ = _traced_class(type(ctx))
+
+    def stop(self) -> None:
+        """Stop recording reads.  The watched contexts go back to their original classes."""
+        with _WATCHED_LOCK:
+            for ctx_id, (ctx, cls) in self._contexts.items():
+                ctx.__class__ = cls
+                del _WATCHED[ctx_id]
+            self._contexts.clear()
+            self._views.clear()
+
+    def __enter__(self) -> 'KeyTracer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _record(self, label: str, prefix: str, key: t.Hashable, value: t.Any,
+                call_site: CallSite) -> t.Any:
+        path = _format_path(prefix, key)
+        with self._lock:
+            self._counts[label][path] += 1
+            self._call_sites[(label, path)][call_site] += 1
+        if isinstance(value, ContextDict):
+            value = self._view(label, path, value)
+        return value
+
+    def _view(self, label: str, path: str, ctx: ContextDict) -> ContextDict:
+        # The path is kept on a view rather than on ctx because ctx may be reachable by more
+        # than one path
+        key = (label, path, id(ctx))
+        with _WATCHED_LOCK:
+            entry = self._views.get(key)
+            if entry is not None:
+                return entry[1]
+
+            cls = getattr(type(ctx), '_untraced', type(ctx))
+            view = cls._from_store(ctx._store, must_be_frozen=ctx._must_be_frozen,
+                                   freezer=ctx.freezer, frozen=ctx.frozen)
+            view._hash = ctx._hash
+            view._digest = ctx._digest
+            view._paths = ctx._paths
+            # Keep ctx alive so that its id is not reused while the view is cached
+            self._views[key] = (ctx, view)
+            self.watch(view, label=label, _prefix=f'{path}.')
+        return view
+
+    def _record_iteration(self, label: str) -> None:
+        with self._lock:
+            self._iterations[label] += 1
+
+    def report(self) -> TraceReport:
+        """Return a snapshot of the reads which have been recorded so far."""
+        with self._lock:
+            return TraceReport(
+                {label: collections.Counter(counter) for label, counter in self._counts.items()},
+                {key: collections.Counter(sites) for key, sites in self._call_sites.items()},
+                dict(self._iterations),
+                {label: set(known) for label, known in self._known.items()})
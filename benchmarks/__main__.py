@@ -0,0 +1,88 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Run the benchmarks.
+
+From the top of the source tree::
+
+    # Run everything and save the results
+    python -m benchmarks run -o before.json
+    # Run the freezer and contextdict benchmarks at a tenth of their sizes
+    python -m benchmarks run -k freezer -k contextdict --scale 0.1
+    # Run again and flag regressions against the saved results
+    python -m benchmarks run -o after.json --compare before.json
+    python -m benchmarks compare before.json after.json
+
+Comparisons exit with status 1 when a benchmark is slower or uses more memory than the threshold
+allows.
+"""
+
+import argparse
+import json
+import sys
+import typing as t
+
+from . import bench_context, bench_contextdict, bench_freezer, bench_schema  # noqa: F401
+from .harness import compare, load, run
+
+
+def _parse_args(args: t.List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run benchmarks')
+    run_parser.add_argument('-k', dest='selected', action='append', default=[],
+                            help='Only run benchmarks whose names contain this.  May be given'
+                            ' more than once.')
+    run_parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiply the benchmark sizes by this.  (default: 1.0)')
+    run_parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of timing loops for each benchmark.  (default: 5)')
+    run_parser.add_argument('-o', '--output', help='Write the results as JSON to this file')
+    run_parser.add_argument('--compare', metavar='BASELINE',
+                            help='Compare the results to results saved in this file')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare saved results')
+    compare_parser.add_argument('baseline', help='JSON file of the results to compare against')
+    compare_parser.add_argument('results', help='JSON file of the results to check')
+
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument('--threshold', type=float, default=0.1,
+                               help='Flag benchmarks which are slower by more than this'
+                               ' fraction.  (default: 0.1)')
+        subparser.add_argument('--memory-threshold', type=float, default=0.1,
+                               help='Flag benchmarks whose peak memory changes by more than this'
+                               ' fraction.  (default: 0.1)')
+
+    return parser.parse_args(args)
+
+
+def main(args: t.List[str]) -> int:
+    options = _parse_args(args)
+
+    if options.command == 'run':
+        results = run(options.selected, scale=options.scale, repeat=options.repeat)
+        if options.output:
+            with open(options.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        if not options.compare:
+            return 0
+        baseline = load(options.compare)
+        print()
+    else:
+        baseline = load(options.baseline)
+        results = load(options.results)
+
+    regressions = compare(baseline, results, threshold=options.threshold,
+                          memory_threshold=options.memory_threshold)
+    if regressions:
+        print(f'\n{len(regressions)} regressions: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,121 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Benchmarks of creating, looking up, and switching contexts.
+
+The concurrent benchmarks run size lookups in each of several threads or fork the registry in
+size asyncio tasks which create, activate, and read contexts.
+"""
+
+import asyncio
+import contextvars
+import threading
+
+import bailiwick
+from bailiwick.collections import ContextDict
+
+from .harness import benchmark
+
+#: Number of threads in the threaded benchmarks
+THREADS = 8
+
+
+def _frozen(data):
+    ctx = ContextDict.new(data)
+    ctx.freeze()
+    return ctx
+
+
+def _create_shared(count):
+    for number in range(count):
+        bailiwick.create_context(f'shared{number}', {'id': -1}).freeze()
+
+
+@benchmark('context.create', sizes=(1000,))
+def create(size):
+    """Create size contexts in a fresh fork of the registry."""
+    def func():
+        with bailiwick.forked_registry():
+            for number in range(size):
+                bailiwick.create_context(f'ctx{number}', {'id': number})
+    return func
+
+
+@benchmark('context.get', sizes=(10, 1000))
+def get(size):
+    """Look up one of size contexts."""
+    _create_shared(size)
+    return lambda: bailiwick.get_context('shared0')
+
+
+@benchmark('context.activate')
+def activate(size):
+    """Activate a context, read it, and switch back."""
+    _create_shared(1)
+    other = _frozen({'id': 1})
+
+    def func():
+        with bailiwick.activate_context('shared0', other):
+            bailiwick.get_context('shared0')['id']
+    return func
+
+
+@benchmark('context.threads', sizes=(1000, 10000))
+def threads(size):
+    """size lookups and activations in each of several threads at once."""
+    _create_shared(10)
+    overrides = [_frozen({'id': number}) for number in range(THREADS)]
+
+    def worker(override):
+        for number in range(size):
+            name = f'shared{number % 10}'
+            with bailiwick.activate_context(name, override):
+                bailiwick.get_context(name)['id']
+
+    def func():
+        # Threads do not inherit the contextvars which hold the benchmark's fork of the
+        # registry so run them in a copy of them
+        workers = [threading.Thread(target=contextvars.copy_context().run,
+                                    args=(worker, override)) for override in overrides]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return func
+
+
+async def _forking_task(number):
+    bailiwick.fork_registry()
+    for name in ('request', 'user'):
+        bailiwick.create_context(name, {'id': number}).freeze()
+
+    override = _frozen({'id': number})
+    with bailiwick.activate_context('shared0', override), \
+            bailiwick.activate_context('shared1', override):
+        await asyncio.sleep(0)
+        return sum(bailiwick.get_context(name)['id']
+                   for name in ('request', 'user', 'shared0', 'shared1'))
+
+
+async def _baseline_task(number):
+    await asyncio.sleep(0)
+    return number
+
+
+async def _gather(task, size):
+    return await asyncio.gather(*(task(number) for number in range(size)))
+
+
+@benchmark('context.tasks', sizes=(1000, 20000))
+def tasks(size):
+    """Fork the registry in size concurrent asyncio tasks with 1000 shared contexts."""
+    _create_shared(1000)
+    return lambda: asyncio.run(_gather(_forking_task, size))
+
+
+@benchmark('context.tasks_baseline', sizes=(1000, 20000))
+def tasks_baseline(size):
+    """The same number of asyncio tasks without using contexts."""
+    return lambda: asyncio.run(_gather(_baseline_task, size))
@@ -0,0 +1,119 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""Benchmarks of ContextDict operations."""
+
+from bailiwick.collections import ContextDict
+
+from .harness import benchmark
+
+
+def _data(size):
+    return {f'key{i}': {'value': i, 'items': [i, i + 1]} for i in range(size)}
+
+
+def _clear_hash(ctx):
+    # freeze() stores a frozen ContextDict which caches the hash as well
+    ctx._hash = None
+    if isinstance(ctx._store, ContextDict):
+        ctx._store._hash = None
+
+
+def _frozen(size, **kwargs):
+    ctx = ContextDict.new(_data(size), **kwargs)
+    ctx.freeze()
+    return ctx
+
+
+@benchmark('contextdict.freeze', sizes=(100, 10000))
+def freeze(size):
+    data = _data(size)
+
+    def func():
+        ContextDict.new(data).freeze()
+    return func
+
+
+@benchmark('contextdict.freeze_lazy', sizes=(100, 10000))
+def freeze_lazy(size):
+    data = _data(size)
+
+    def func():
+        ContextDict.new(data).freeze(lazy=True)
+    return func
+
+
+@benchmark('contextdict.hash', sizes=(100, 10000))
+def hash_(size):
+    """Hash a context which has not cached its hash yet.  Nested contexts have cached theirs."""
+    ctx = _frozen(size)
+
+    def func():
+        _clear_hash(ctx)
+        hash(ctx)
+    return func
+
+
+@benchmark('contextdict.eq', sizes=(100, 10000))
+def eq(size):
+    """Compare two equal contexts which are not the same object."""
+    ctx = _frozen(size)
+    other = _frozen(size)
+
+    def func():
+        _clear_hash(ctx)
+        _clear_hash(other)
+        return ctx == other
+    return func
+
+
+@benchmark('contextdict.union', sizes=(100, 10000))
+def union(size):
+    """Override one key and freeze the result."""
+    ctx = _frozen(size)
+
+    def func():
+        ctx.union({'key0': 'new'}).freeze()
+    return func
+
+
+@benchmark('contextdict.union_persistent', sizes=(100, 10000))
+def union_persistent(size):
+    ctx = _frozen(size, persistent=True)
+
+    def func():
+        ctx.union({'key0': 'new'}).freeze()
+    return func
+
+
+@benchmark('contextdict.derive', sizes=(100, 10000))
+def derive(size):
+    ctx = _frozen(size)
+    return lambda: ctx.derive({'key0': 'new'})
+
+
+@benchmark('contextdict.getitem')
+def getitem(size):
+    ctx = _frozen(10)
+    return lambda: ctx['key1']
+
+
+@benchmark('contextdict.getitem_dict')
+def getitem_dict(size):
+    """Plain dict lookup to compare getitem to."""
+    data = _data(10)
+    return lambda: data['key1']
+
+
+@benchmark('contextdict.getter')
+def getter(size):
+    get_key = _frozen(10).getter('key1')
+    return lambda: get_key()
+
+
+@benchmark('contextdict.get_path', sizes=(100, 10000))
+def get_path(size):
+    ctx = ContextDict.new(_data(size))
+    ctx.freeze(index_paths=True)
+    return lambda: ctx.get_path('key0.value')
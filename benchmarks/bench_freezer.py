@@ -0,0 +1,44 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""Benchmarks of DefaultFreezer on wide, deep, and shared data."""
+
+from bailiwick.collections import DefaultFreezer
+
+from .harness import benchmark
+
+
+@benchmark('freezer.wide', sizes=(100, 10000))
+def freeze_wide(size):
+    """One mapping with size entries of small containers."""
+    data = {f'key{i}': [i, str(i), {'nested': i}] for i in range(size)}
+    freezer = DefaultFreezer()
+    return lambda: freezer(data)
+
+
+@benchmark('freezer.deep', sizes=(100, 5000))
+def freeze_deep(size):
+    """Mappings and lists nested size levels deep."""
+    data = {'leaf': 0}
+    for depth in range(size):
+        data = {'level': depth, 'children': [data]}
+    freezer = DefaultFreezer()
+    return lambda: freezer(data)
+
+
+@benchmark('freezer.shared', sizes=(100, 10000))
+def freeze_shared(size):
+    """size references to the same few containers."""
+    shared = [{'config': list(range(50))} for _dummy in range(4)]
+    data = {f'key{i}': shared[i % len(shared)] for i in range(size)}
+    freezer = DefaultFreezer()
+    return lambda: freezer(data)
+
+
+@benchmark('freezer.refreeze', sizes=(100, 10000))
+def refreeze(size):
+    """Freeze data which the same freezer has already frozen."""
+    freezer = DefaultFreezer()
+    data = freezer({f'key{i}': [i, {'nested': i}] for i in range(size)})
+    return lambda: freezer(data)
@@ -0,0 +1,82 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Benchmarks of schema records and validation.
+
+``schema.freeze_then_validate`` is the baseline for ``schema.freeze_validated``: it freezes the
+same contexts and then checks them with a loop over the schema's fields.
+"""
+
+from collections.abc import Mapping
+
+from bailiwick.collections import ContextDict
+from bailiwick.errors import SchemaError
+from bailiwick.schema import MISSING, Field, Schema
+
+from .harness import benchmark
+
+SERVER = Schema('Server', {
+    'host': Field(str),
+    'port': Field(int, convert=int),
+    'tags': Field((list, tuple), default=()),
+    'options': Field(Mapping),
+    'weight': Field(float),
+    'enabled': Field(bool),
+})
+
+
+def _data(size):
+    return [{'host': f'host{i}', 'port': str(8000 + i), 'options': {'retries': i},
+             'weight': 1.0, 'enabled': True} for i in range(size)]
+
+
+def _validate_separately(ctx):
+    if set(ctx) - set(SERVER.specs):
+        raise SchemaError('unknown keys')
+    for key, field in SERVER.specs.items():
+        if key not in ctx:
+            if field.default is MISSING:
+                raise SchemaError(f'missing {key}')
+            continue
+        value = ctx[key]
+        if field.convert is not None:
+            value = field.convert(value)
+        if not isinstance(value, field.type):
+            raise SchemaError(f'wrong type for {key}')
+
+
+@benchmark('schema.freeze_then_validate', sizes=(1000,))
+def freeze_then_validate(size):
+    """Freeze size contexts and then check each of them."""
+    data = _data(size)
+
+    def func():
+        for entry in data:
+            ctx = ContextDict.new(entry)
+            ctx.freeze()
+            _validate_separately(ctx)
+    return func
+
+
+@benchmark('schema.freeze_validated', sizes=(1000,))
+def freeze_validated(size):
+    """Freeze size contexts with the schema's compiled validator."""
+    data = _data(size)
+
+    def func():
+        for entry in data:
+            ContextDict.new(entry).freeze(schema=SERVER)
+    return func
+
+
+@benchmark('schema.record', sizes=(1000,))
+def record(size):
+    """Create size records."""
+    data = _data(size)
+
+    def func():
+        for entry in data:
+            SERVER(entry)
+    return func
@@ -0,0 +1,185 @@
+# coding: utf-8
+# Author: Toshio Kuratomi <a.badger@gmail.com>
+# License: LGPLv3+
+# Copyright: Toshio Kuratomi, 2021
+"""
+Register, run, and compare benchmarks.
+
+A benchmark is a function which takes a size and returns a function with no arguments to time::
+
+    @benchmark('contextdict.getitem', sizes=(10, 10000))
+    def getitem(size):
+        ctx = ContextDict.new({i: i for i in range(size)})
+        ctx.freeze()
+        return lambda: ctx[0]
+
+Each benchmark is run once for each of its sizes.  The time is the best of several repeats of a
+loop which :meth:`timeit.Timer.autorange` sizes to take at least 0.2 seconds.  The peak memory
+that :mod:`tracemalloc` sees during one more call is recorded as well.
+
+Benchmarks run in a fork of the context registry so the contexts that they create are thrown
+away afterwards.
+"""
+
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+import typing as t
+
+import bailiwick
+
+__all__ = ('BENCHMARKS', 'benchmark', 'compare', 'load', 'run')
+
+
+Setup = t.Callable[[int], t.Callable[[], t.Any]]
+
+
+class Benchmark:
+    def __init__(self, name: str, setup: Setup, sizes: t.Sequence[int]) -> None:
+        self.name = name
+        self.setup = setup
+        self.sizes = tuple(sizes)
+
+
+#: All registered benchmarks by name
+BENCHMARKS: t.Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, sizes: t.Sequence[int] = (1,)) -> t.Callable[[Setup], Setup]:
+    """
+    Register a benchmark.
+
+    :arg name: Dotted name of the benchmark.  The part before the first dot is its group.
+    :kwarg sizes: Sizes to run the benchmark with.  Benchmarks which do not depend on a size can
+        leave this as the default.
+    """
+    def decorator(setup: Setup) -> Setup:
+        if name in BENCHMARKS:
+            raise ValueError(f'A benchmark named {name} is already registered')
+        BENCHMARKS[name] = Benchmark(name, setup, sizes)
+        return setup
+    return decorator
+
+
+def _measure(func: t.Callable[[], t.Any], repeat: int) -> t.Dict[str, t.Any]:
+    timer = timeit.Timer(func)
+    number, _dummy = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': min(times), 'median_seconds': statistics.median(times),
+            'loops': number, 'repeat': repeat, 'peak_bytes': peak}
+
+
+def run(selected: t.Iterable[str] = (), scale: float = 1.0, repeat: int = 5,
+        report: t.Callable[[str], None] = print) -> t.Dict[str, t.Any]:
+    """
+    Run benchmarks.
+
+    :kwarg selected: Substrings of the names of the benchmarks to run.  All benchmarks are run if
+        this is empty.
+    :kwarg scale: Multiply the sizes of the benchmarks by this.
+    :kwarg repeat: Number of times to repeat each timing loop.
+    :kwarg report: Function called with a line of text for each result as it is measured.
+    :returns: dict of the environment and the results which can be serialized as JSON.  Results
+        are keyed by ``name[size]``.
+    """
+    selected = tuple(selected)
+    results = {}
+    for name, bench in sorted(BENCHMARKS.items()):
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+
+        # Small scales can clamp several sizes to the same one.  Only run it once.
+        sizes = sorted({max(1, int(size * scale)) for size in bench.sizes})
+        for size in sizes:
+            with bailiwick.forked_registry():
+                result = _measure(bench.setup(size), repeat)
+            key = f'{name}[{size}]'
+            results[key] = result
+            report(f'{key:<45} {_format_seconds(result["seconds"]):>10}'
+                   f' {_format_bytes(result["peak_bytes"]):>10} peak')
+
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+
+
+def compare(old: t.Dict[str, t.Any], new: t.Dict[str, t.Any], threshold: float = 0.1,
+            memory_threshold: float = 0.1,
+            report: t.Callable[[str], None] = print) -> t.List[str]:
+    """
+    Compare two sets of results from :func:`run`.
+
+    :arg old: The baseline results.
+    :arg new: The results to check.
+    :kwarg threshold: Fraction by which a benchmark may become slower before it is flagged.
+    :kwarg memory_threshold: Fraction by which a benchmark's peak memory may change before it is
+        flagged.  Peaks under 1KiB are ignored.
+    :kwarg report: Function called with a line of text for each benchmark which was compared.
+    :returns: The names of the benchmarks which regressed.
+    """
+    regressions = []
+    old_results = old['results']
+    for key, result in sorted(new['results'].items()):
+        baseline = old_results.get(key)
+        if baseline is None:
+            report(f'{key:<45} {"new":>10}')
+            continue
+
+        flags = []
+        time_ratio = result['seconds'] / baseline['seconds']
+        if time_ratio > 1 + threshold:
+            flags.append('SLOWER')
+        elif time_ratio < 1 - threshold:
+            flags.append('faster')
+
+        old_peak, new_peak = baseline['peak_bytes'], result['peak_bytes']
+        if max(old_peak, new_peak) >= 1024 and \
+                abs(new_peak - old_peak) > memory_threshold * max(old_peak, 1):
+            flags.append('MORE MEMORY' if new_peak > old_peak else 'less memory')
+
+        if 'SLOWER' in flags or 'MORE MEMORY' in flags:
+            regressions.append(key)
+        report(f'{key:<45} {time_ratio:>9.2f}x'
+               f' {_format_bytes(old_peak):>10} -> {_format_bytes(new_peak):<10}'
+               f' {" ".join(flags)}')
+
+    missing = set(old_results) - set(new['results'])
+    if missing:
+        report(f'{len(missing)} benchmarks in the baseline were not run')
+
+    return regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * factor >= 1:
+            return f'{seconds * factor:.2f} {unit}'
+    return f'{seconds * 1e9:.0f} ns'
+
+
+def _format_bytes(size: int) -> str:
+    for unit, factor in (('MiB', 2**20), ('KiB', 2**10)):
+        if size >= factor:
+            return f'{size / factor:.1f} {unit}'
+    return f'{size} B'
+
+
+def load(path: str) -> t.Dict[str, t.Any]:
+    with open(path) as f:
+        return json.load(f)
@@ -59,6 +59,30 @@ class TestContextDictConstructor:
         assert ctx_dict[1] == 'a'
         assert ctx_dict['data2'] == 'test'
 
+    def test_alt_constructor_copies_once(self):
+        data = dict(DATA_DICT)
+        ctx_dict = bc.ContextDict.new(data)
+        data['spam'] = 'eggs'
+
+        assert 'spam' not in ctx_dict._store
+        assert isinstance(ctx_dict._store, dict)
+
+    def test_slotted(self):
+        ctx_dict = bc.ContextDict.new(DATA_DICT)
+
+        assert not hasattr(ctx_dict, '__dict__')
+        with pytest.raises(AttributeError):
+            ctx_dict.spam = 'eggs'
+
+    def test_default_freezer_shared(self):
+        first = bc.ContextDict()
+        second = bc.ContextDict.new(DATA_DICT)
+
+        assert first.freezer is second.freezer
+        assert first.freezer.sealed
+        with pytest.raises(AttributeError):
+            first.freezer.register(list, bc.identity_freezer)
+
 
 class TestContextDictFeatures:
     def test_freeze_reports_frozen(self, ctx_dict):
@@ -68,6 +92,18 @@ class TestContextDictFeatures:
 
         assert ctx_dict.frozen
 
+    def test_freeze_frozen_is_noop(self, ctx_dict):
+        ctx_dict.freeze()
+        store = ctx_dict._store
+        hashed = hash(ctx_dict)
+
+        ctx_dict.freeze()
+        ctx_dict.freeze(lazy=True)
+
+        assert ctx_dict._store is store
+        assert ctx_dict._hash == hashed
+        assert ctx_dict.frozen
+
     def test_freeze_prevents_changes(self, ctx_dict):
         ctx_dict['new'] = True
 
@@ -181,6 +217,67 @@ class TestMappingFeatures:
         other.freeze()
         assert ctx_dict != other
 
+    def test_hash_cached(self, ctx_dict):
+        ctx_dict.freeze()
+        expected = hash(frozenset(ctx_dict.items()))
+
+        assert hash(ctx_dict) == expected
+        assert ctx_dict._hash == expected
+        assert hash(ctx_dict) == expected
+
+    def test_hash_nested(self):
+        ctx_dict = bc.ContextDict.new({'one': {'two': [2]}})
+        ctx_dict.freeze()
+
+        assert hash(ctx_dict) == hash(frozenset({'one': ctx_dict['one']}.items()))
+        assert ctx_dict['one']._hash is not None
+
+    def test_equality_identity(self, ctx_dict):
+        ctx_dict.freeze()
+        assert ctx_dict == ctx_dict
+
+    def test_equality_frozen_hash_collision(self, ctx_dict):
+        ctx_dict.freeze()
+        other = bc.ContextDict.new({'three': 3})
+        other.freeze()
+        other._hash = hash(ctx_dict)
+
+        assert ctx_dict != other
+        assert other != ctx_dict
+
+    def test_equality_nested(self):
+        ctx_dict = bc.ContextDict.new({'one': {'two': [2]}})
+        ctx_dict.freeze()
+        other = bc.ContextDict.new({'one': {'two': [2]}})
+        other.freeze()
+
+        assert ctx_dict == other
+        assert ctx_dict == {'one': {'two': (2,)}}
+        assert ctx_dict != {'one': {'two': (3,)}}
+
+    def test_equality_unhashable_contents(self):
+        ctx_dict = bc.ContextDict.new({'one': [1]}, freezer=bc.identity_freezer)
+        ctx_dict.freeze()
+        other = bc.ContextDict.new({'one': [1]}, freezer=bc.identity_freezer)
+        other.freeze()
+
+        assert ctx_dict == other
+
+    def test_equality_unfrozen_nested_contexts(self):
+        # Hashing the nested contexts raises MustBeFrozen so the contents are compared instead
+        ctx_dict = bc.ContextDict.new({'one': bc.ContextDict.new({'two': 2})},
+                                      freezer=bc.identity_freezer)
+        ctx_dict.freeze()
+        other = bc.ContextDict.new({'one': bc.ContextDict.new({'two': 2})},
+                                   freezer=bc.identity_freezer)
+        other.freeze()
+
+        assert ctx_dict == other
+
+    def test_equality_not_mapping(self, ctx_dict):
+        ctx_dict.freeze()
+        assert ctx_dict != list(DATA_DICT.items())
+
     def test_repr(self, ctx_dict):
         output = repr(ctx_dict)
         print(output)
@@ -278,3 +375,76 @@ class TestMutableMappingFeatures:
 
         assert len(ctx_dict) == 4
         assert ctx_dict._store['three'] == 3
+
+
+class TestGetters:
+    def test_getter(self, ctx_dict):
+        ctx_dict.freeze()
+
+        assert ctx_dict.getter('data')() == 0
+        assert ctx_dict.getter('data', 1)() == (0, 'a')
+
+    def test_path_getter(self):
+        ctx_dict = bc.ContextDict.new({'db': {'hosts': ['a', 'b']}})
+        ctx_dict.freeze()
+
+        assert ctx_dict.path_getter('db', 'hosts', 1)() == 'b'
+        assert ctx_dict.path_getter('db')() is ctx_dict['db']
+        with pytest.raises(IndexError):
+            ctx_dict.path_getter('db', 'hosts', 2)
+
+    @pytest.mark.parametrize('method', ('getter', 'path_getter'))
+    def test_errors(self, ctx_dict, method):
+        with pytest.raises(bailiwick.errors.MustBeFrozen):
+            getattr(ctx_dict, method)('data')
+
+        ctx_dict.freeze()
+        with pytest.raises(KeyError):
+            getattr(ctx_dict, method)('missing')
+        with pytest.raises(TypeError):
+            getattr(ctx_dict, method)()
+
+
+class TestPaths:
+    DATA = {'db': {'pool': {'size': 5}, 'host': 'h'}, 'dbx': [1]}
+
+    @pytest.mark.parametrize('index_paths', (True, False))
+    def test_get_path(self, index_paths):
+        ctx_dict = bc.ContextDict.new(self.DATA)
+        ctx_dict.freeze(index_paths=index_paths)
+
+        assert ctx_dict.get_path('db.pool.size') == 5
+        assert ctx_dict.get_path('dbx') == (1,)
+        for path in ('db.missing', 'dbx.0', 'db.pool.size.x'):
+            with pytest.raises(KeyError):
+                ctx_dict.get_path(path)
+
+    @pytest.mark.parametrize('index_paths', (True, False))
+    def test_prefix_items(self, index_paths):
+        ctx_dict = bc.ContextDict.new(self.DATA)
+        ctx_dict.freeze(index_paths=index_paths)
+
+        assert list(ctx_dict.prefix_items('db.pool')) == [('db.pool.size', 5)]
+        assert [path for path, _dummy in ctx_dict.prefix_items('db')] == [
+            'db.host', 'db.pool', 'db.pool.size']
+        assert len(list(ctx_dict.prefix_items())) == 5
+        assert list(ctx_dict.prefix_items('dbx')) == []
+        with pytest.raises(KeyError):
+            ctx_dict.prefix_items('missing')
+
+    def test_index_frozen_context(self):
+        ctx_dict = bc.ContextDict.new(self.DATA)
+        ctx_dict.freeze()
+        store = ctx_dict._store
+        ctx_dict.freeze(index_paths=True)
+
+        assert ctx_dict._store is store
+        assert ctx_dict._paths is not None
+
+    def test_unfrozen(self):
+        ctx_dict = bc.ContextDict.new(self.DATA)
+
+        with pytest.raises(bailiwick.errors.MustBeFrozen):
+            ctx_dict.get_path('db')
+        with pytest.raises(bailiwick.errors.MustBeFrozen):
+            ctx_dict.prefix_items('db')
@@ -1,3 +1,6 @@
+import pickle
+import threading
+
 import pytest
 
 import bailiwick.collections as bc
@@ -99,6 +102,18 @@ class TestDefaultFreezer:
         assert len(freezer._rules) > 0
         assert freezer.post_rules == [bc.string_freezer, bc.bytes_freezer]
 
+    def test_sealed(self):
+        freezer = bc.DefaultFreezer()
+        freezer.seal()
+
+        assert freezer.sealed
+        with pytest.raises(AttributeError):
+            freezer.register(CustomData, custom_data_freezer)
+        with pytest.raises(AttributeError):
+            freezer.pre_rules = [custom_data_predicate]
+        with pytest.raises(AttributeError):
+            freezer.post_rules = [custom_data_predicate]
+
     @pytest.mark.parametrize('obj, expected', TEST_DICT)
     def test_mapping_freezer(self, obj, expected, default_freezer):
         assert default_freezer.mapping_freezer(obj) == expected
@@ -127,3 +142,273 @@ class TestDefaultFreezer:
 @pytest.mark.parametrize('obj, expected', TEST_DATA)
 def test_calling_default_freezer(obj, expected, default_freezer):
     assert default_freezer(obj) == expected
+
+
+class CustomData:
+    def __init__(self, value=10):
+        self.attribute = value
+
+
+class CustomDataChild(CustomData):
+    pass
+
+
+def custom_data_freezer(obj):
+    return ('CustomData', obj.attribute)
+
+
+def custom_data_predicate(obj):
+    if not isinstance(obj, CustomData):
+        raise bc.FreezeRuleDoesNotMatch
+    return custom_data_freezer(obj)
+
+
+class TestFreezerDispatch:
+    def test_register_rule(self, default_freezer):
+        default_freezer.register(CustomData, custom_data_freezer)
+
+        assert default_freezer(CustomData(1)) == ('CustomData', 1)
+        assert default_freezer([CustomData(2)]) == (('CustomData', 2),)
+
+    def test_register_rule_subclass(self, default_freezer):
+        default_freezer.register(CustomData, custom_data_freezer)
+
+        assert default_freezer({'one': CustomDataChild(1)}) == {'one': ('CustomData', 1)}
+
+    def test_register_overrides_builtin(self, default_freezer):
+        default_freezer.register(list, bc.identity_freezer)
+
+        data = [1, [2]]
+        assert default_freezer(data) is data
+        assert default_freezer((1, [2])) == (1, [2])
+
+    def test_register_after_use(self, default_freezer):
+        obj = CustomData(1)
+        assert default_freezer(obj) is obj
+
+        default_freezer.register(CustomData, custom_data_freezer)
+        assert default_freezer(obj) == ('CustomData', 1)
+
+    def test_pre_rules_take_precedence_over_builtin(self):
+        freezer = bc.DefaultFreezer(pre_rules=[bc.identity_freezer])
+
+        data = {'one': [1]}
+        assert freezer(data) is data
+
+    def test_post_rules_for_unknown_types(self):
+        freezer = bc.DefaultFreezer(post_rules=[custom_data_predicate])
+
+        assert freezer({'one': [CustomData(1)]}) == {'one': (('CustomData', 1),)}
+        assert freezer(['two']) == ('two',)
+
+    def test_setting_rules_clears_cache(self, default_freezer):
+        obj = CustomData(1)
+        assert default_freezer(obj) is obj
+
+        default_freezer.post_rules = [custom_data_predicate]
+        assert default_freezer(obj) == ('CustomData', 1)
+
+
+def _create_deep_data(depth):
+    data = current = {}
+    for level in range(depth):
+        current['next'] = {'level': level, 'list': [level, {level}]}
+        current = current['next']
+    return data
+
+
+def _depth_of(frozen):
+    depth = 0
+    while 'next' in frozen:
+        assert isinstance(frozen, bc.ContextDict)
+        assert frozen['next']['list'] in ((depth, frozenset((depth,))), ())
+        frozen = frozen['next']
+        depth += 1
+    return depth
+
+
+class TestIterativeFreezing:
+    @pytest.mark.parametrize('obj, expected', TEST_DATA + list(TEST_SEQUENCE) + list(TEST_SET))
+    def test_same_output_as_recursive(self, obj, expected):
+        freezer = bc.DefaultFreezer(iterative=True)
+        assert freezer(obj) == expected
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_deeply_nested_data(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        depth = bc.MAX_RECURSION_DEPTH * 50
+
+        frozen = freezer(_create_deep_data(depth))
+
+        assert _depth_of(frozen) == depth
+
+    def test_pre_rules(self):
+        freezer = bc.DefaultFreezer(pre_rules=[custom_data_predicate], iterative=True)
+
+        assert freezer({'one': [CustomData(1), {2}]}) == {'one': (('CustomData', 1),
+                                                                  frozenset((2,)))}
+
+    def test_registered_rules(self):
+        freezer = bc.DefaultFreezer(iterative=True)
+        freezer.register(CustomData, custom_data_freezer)
+
+        assert freezer([{'one': CustomData(1)}]) == ({'one': ('CustomData', 1)},)
+
+
+class TestSharedData:
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_shared_containers_frozen_once(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        shared_dict = {'one': [1, 2]}
+        shared_list = [shared_dict, 'three']
+
+        frozen = freezer({'a': shared_dict, 'b': shared_list, 'c': [shared_list, shared_dict]})
+
+        assert frozen['a'] == {'one': (1, 2)}
+        assert frozen['b'] == (frozen['a'], 'three')
+        assert frozen['b'][0] is frozen['a']
+        assert frozen['c'][0] is frozen['b']
+        assert frozen['c'][1] is frozen['a']
+        assert freezer.deduplicated == 3
+
+    def test_memo_is_per_call(self, default_freezer):
+        shared = [1, 2]
+
+        first = default_freezer(shared)
+        second = default_freezer(shared)
+
+        assert first == second
+        assert default_freezer.deduplicated == 0
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_stats_are_per_call(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        shared = [1, 2]
+        nested = freezer({'one': 1})
+        freezer({'a': shared, 'b': shared})
+
+        frozen, stats = freezer.freeze_with_stats({'a': shared, 'b': shared, 'c': (nested,)})
+
+        assert frozen['a'] is frozen['b']
+        assert stats == bc.FreezeStats(deduplicated=1, reused=2)
+        assert freezer.deduplicated == 2
+        assert freezer.reused == 2
+
+    def test_stats_totals_across_threads(self, default_freezer):
+        shared = [1, 2]
+        barrier = threading.Barrier(4)
+
+        def freeze():
+            barrier.wait()
+            for _dummy in range(200):
+                default_freezer({'a': shared, 'b': shared})
+
+        threads = [threading.Thread(target=freeze) for _dummy in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert default_freezer.deduplicated == 800
+
+    def test_pickle_keeps_totals(self, default_freezer):
+        default_freezer({'a': [1], 'b': [1]})
+        shared = [1]
+        default_freezer({'a': shared, 'b': shared})
+
+        restored = pickle.loads(pickle.dumps(default_freezer))
+
+        assert restored.deduplicated == 1
+        restored({'a': shared, 'b': shared})
+        assert restored.deduplicated == 2
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_cyclic_mapping(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        data = {'one': 1}
+        data['self'] = data
+
+        with pytest.raises(bailiwick.errors.CyclicData):
+            freezer(data)
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_cyclic_sequence(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        data = [1, {'list': []}]
+        data[1]['list'].append(data)
+
+        with pytest.raises(bailiwick.errors.CyclicData):
+            freezer({'data': data})
+
+
+class TestAlreadyFrozen:
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_frozen_context_dict_reused(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        frozen = freezer({'one': [1], 'two': {'three': [3]}})
+
+        refrozen = freezer({'old': frozen, 'new': [4]})
+
+        assert refrozen['old'] is frozen
+        assert refrozen['new'] == (4,)
+        assert freezer(frozen) is frozen
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_unchanged_tuples_reused(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        nested = freezer({'one': 1})
+        data = (nested, (nested, 'two'), frozenset((nested,)))
+
+        assert freezer(data) is data
+        assert freezer.reused > 0
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_frozen_tuples_not_walked(self, iterative):
+        freezer = bc.DefaultFreezer(iterative=iterative)
+        frozen = freezer(([{'one': 1}], frozenset(((2, (3,)),))))
+
+        refrozen, stats = freezer.freeze_with_stats(frozen)
+
+        assert refrozen is frozen
+        # Only the outer tuple.  Walking it would reuse each of the nested containers too.
+        assert stats.reused == 1
+
+        _dummy, stats = freezer.freeze_with_stats({'old': frozen[1], 'new': [4]})
+        assert stats.reused == 1
+
+    def test_frozen_tuples_cache_is_bounded(self, default_freezer):
+        for number in range(bc.FROZEN_CONTAINER_CACHE_SIZE + 10):
+            default_freezer(((number,),))
+
+        assert len(default_freezer._frozen_containers) == bc.FROZEN_CONTAINER_CACHE_SIZE
+
+    def test_frozen_tuples_forgotten_when_rules_change(self, default_freezer):
+        frozen = default_freezer(([1],))
+        default_freezer.register(int, str)
+
+        assert default_freezer(frozen) == (('1',),)
+
+    def test_changed_tuple_copied(self, default_freezer):
+        data = ([1], 'two')
+
+        assert default_freezer(data) == ((1,), 'two')
+
+    def test_other_freezers_context_dict_refrozen(self, default_freezer):
+        frozen = bc.DefaultFreezer()({'one': [1]})
+
+        refrozen = default_freezer(frozen)
+
+        assert refrozen is not frozen
+        assert refrozen == frozen
+        assert refrozen.freezer is default_freezer
+
+    def test_union_refreeze_reuses_values(self):
+        ctx = bc.ContextDict.new({'one': {'two': [2]}, 'three': [3]})
+        ctx.freeze()
+
+        derived = ctx.union({'four': [4]})
+        derived.freeze()
+
+        assert derived['one'] is ctx['one']
+        assert derived['three'] is ctx['three']
+        assert derived['four'] == (4,)
@@ -0,0 +1,22 @@
+import pytest
+
+import bailiwick.collections
+import bailiwick.context
+
+
+@pytest.fixture
+def global_registry(monkeypatch):
+    # Forget the contexts that a test creates
+    monkeypatch.setattr(bailiwick.context, '_GLOBAL_REGISTRY', bailiwick.context._GLOBAL_REGISTRY)
+
+
+def _frozen(data, **kwargs):
+    ctx = bailiwick.collections.ContextDict.new(data, **kwargs)
+    ctx.freeze()
+    return ctx
+
+
+@pytest.fixture
+def frozen():
+    """Function which creates a frozen ContextDict.  Takes the arguments of ContextDict.new()."""
+    return _frozen
@@ -0,0 +1,207 @@
+import array
+import gc
+import multiprocessing
+import sys
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick import binary
+from bailiwick.buffers import FrozenBuffer
+from bailiwick.errors import MustBeFrozen
+
+
+DATA = {
+    'none': None,
+    'bools': (True, False),
+    'ints': [0, -1, 2**62, -2**63, 2**100, -2**100],
+    'float': 1.5,
+    'str': 'café',
+    'bytes': b'\x00\xff',
+    'set': {1, 'two'},
+    'nested': {'one': {'two': [3, {'four': 4}]}},
+    ('tuple', 2): 'tuple key',
+    7: 'int key',
+}
+
+
+@pytest.fixture
+def frozen_ctx():
+    ctx = bc.ContextDict.new(DATA)
+    ctx.freeze()
+    return ctx
+
+
+def _read_shared(name):
+    ctx = binary.attach_shared(name)
+    return ctx['nested']['one']['two'][1]['four']
+
+
+class TestRoundTrip:
+    def test_equal(self, frozen_ctx):
+        loaded = binary.loads(binary.dumps(frozen_ctx))
+
+        assert loaded.frozen
+        assert loaded == frozen_ctx
+        assert hash(loaded) == hash(frozen_ctx)
+        assert list(loaded) == list(frozen_ctx)
+        assert isinstance(loaded['nested'], bc.ContextDict)
+        assert isinstance(loaded['nested']._store, binary.MappedMapping)
+
+    def test_lookup(self, frozen_ctx):
+        loaded = binary.loads(binary.dumps(frozen_ctx))
+
+        assert loaded[('tuple', 2)] == 'tuple key'
+        assert loaded[7] == 'int key'
+        assert 'set' in loaded
+        assert 'missing' not in loaded
+        assert ['unhashable'] not in loaded._store
+        with pytest.raises(KeyError):
+            loaded['missing']
+
+    def test_freeze_does_not_decode(self, frozen_ctx):
+        loaded = binary.loads(binary.dumps(frozen_ctx))
+        store = loaded._store
+        loaded.freeze()
+
+        assert loaded._store is store
+
+    def test_shared_objects_written_once(self):
+        value = tuple(range(100))
+        ctx = bc.ContextDict.new({'one': value, 'two': value})
+        ctx.freeze()
+        single = bc.ContextDict.new({'one': value})
+        single.freeze()
+
+        assert len(binary.dumps(ctx)) < len(binary.dumps(single)) + 100
+
+    def test_buffers(self):
+        ctx = bc.ContextDict.new({
+            'doubles': array.array('d', [0.5, -1.0, 2.25]),
+            'matrix': memoryview(array.array('h', range(6))).cast('B').cast('h', (2, 3)),
+            'empty': array.array('b'),
+            'raw': bytearray(b'abc'),
+        })
+        ctx.freeze()
+        loaded = binary.loads(binary.dumps(ctx))
+
+        assert loaded == ctx
+        assert hash(loaded) == hash(ctx)
+        doubles = loaded['doubles']
+        assert isinstance(doubles, FrozenBuffer)
+        assert doubles.tolist() == [0.5, -1.0, 2.25]
+        assert loaded['matrix'].shape == (2, 3)
+        assert loaded['matrix'].format == 'h'
+        assert len(loaded['empty']) == 0
+        assert loaded['raw'] == b'abc'
+
+    def test_non_native_buffer_formats(self):
+        numpy = pytest.importorskip('numpy')
+        ctx = bc.ContextDict.new({
+            'unicode': array.array('u', 'abc'),
+            'big_endian': numpy.arange(6, dtype='>i4').reshape(2, 3),
+            'records': numpy.zeros(2, dtype=[('x', '<i4'), ('y', '<f8')]),
+            'dates': numpy.array(['2021-01-01', '2021-06-30'], dtype='datetime64[D]'),
+        })
+        ctx.freeze()
+        loaded = binary.loads(binary.dumps(ctx))
+
+        assert loaded == ctx
+        assert hash(loaded) == hash(ctx)
+        assert loaded['big_endian'].format == '>i'
+        assert loaded['big_endian'].shape == (2, 3)
+        assert loaded['dates'].format == '<M8[D]'
+        assert loaded['dates'].tobytes() == ctx['dates'].tobytes()
+
+    def test_buffers_are_read_only(self):
+        ctx = bc.ContextDict.new({'doubles': array.array('d', [0.5])})
+        ctx.freeze()
+        loaded = binary.loads(bytearray(binary.dumps(ctx)))
+
+        with pytest.raises(TypeError):
+            loaded['doubles'].memoryview().cast('B')[0] = 0
+
+    def test_version_1(self, frozen_ctx):
+        data = bytearray(binary.dumps(frozen_ctx))
+        data[7] = 1
+
+        assert binary.loads(data) == frozen_ctx
+
+    def test_pickle(self, frozen_ctx):
+        import pickle
+        loaded = binary.loads(binary.dumps(frozen_ctx))
+
+        assert pickle.loads(pickle.dumps(loaded)) == frozen_ctx
+
+
+class TestErrors:
+    def test_unfrozen(self):
+        with pytest.raises(MustBeFrozen):
+            binary.dumps(bc.ContextDict.new({}))
+
+    def test_unsupported(self):
+        ctx = bc.ContextDict.new({'one': object()}, freezer=lambda x: x)
+        ctx.freeze()
+
+        with pytest.raises(TypeError):
+            binary.dumps(ctx)
+
+    @pytest.mark.parametrize('data', (b'', b'x' * 24, binary.MAGIC + b'\x00' * 7 + b'\xff' * 9))
+    def test_bad_buffer(self, data):
+        with pytest.raises(ValueError):
+            binary.loads(data)
+
+
+class TestFile:
+    def test_round_trip(self, tmp_path, frozen_ctx):
+        path = tmp_path / 'ctx.bin'
+        binary.write_file(frozen_ctx, path)
+        loaded = binary.open_file(path)
+
+        assert loaded['nested']['one']['two'][1]['four'] == 4
+        assert loaded == frozen_ctx
+        assert not (tmp_path / 'ctx.bin.tmp').exists()
+
+    def test_buffer_outlives_context(self, tmp_path):
+        ctx = bc.ContextDict.new({'doubles': array.array('d', range(1000))})
+        ctx.freeze()
+        path = tmp_path / 'ctx.bin'
+        binary.write_file(ctx, path)
+
+        doubles = binary.open_file(path)['doubles']
+        gc.collect()
+
+        assert doubles.tolist() == list(map(float, range(1000)))
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / 'ctx.bin'
+        path.write_bytes(b'')
+
+        with pytest.raises(ValueError):
+            binary.open_file(path)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 8), reason='shared memory requires Python-3.8')
+class TestSharedMemory:
+    def test_attach_in_other_process(self, frozen_ctx):
+        shm = binary.export_shared(frozen_ctx)
+        try:
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                assert pool.apply(_read_shared, (shm.name,)) == 4
+
+            attached = binary.attach_shared(shm.name)
+            assert attached == frozen_ctx
+            del attached
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def test_shared_memory_unavailable(frozen_ctx, monkeypatch):
+    # Python-3.7 does not have multiprocessing.shared_memory
+    monkeypatch.setitem(sys.modules, 'multiprocessing.shared_memory', None)
+
+    with pytest.raises(NotImplementedError, match='Python-3.8'):
+        binary.export_shared(frozen_ctx)
+    with pytest.raises(NotImplementedError, match='Python-3.8'):
+        binary.attach_shared('name')
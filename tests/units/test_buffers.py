@@ -0,0 +1,155 @@
+import array
+import pickle
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick.buffers import FrozenBuffer, buffer_freezer, ndarray_freezer
+
+
+def _freeze(value):
+    return bc.DefaultFreezer()(value)
+
+
+def test_bytearray_becomes_bytes():
+    data = bytearray(b'abc')
+    frozen = _freeze({'data': data})
+    data[0] = ord('z')
+
+    assert frozen['data'] == b'abc'
+    assert type(frozen['data']) is bytes
+
+
+@pytest.mark.parametrize('value', (
+    array.array('d', [1.0, 2.5, -3.0]),
+    memoryview(bytearray(b'abcdef')),
+    memoryview(array.array('i', range(6))).cast('B').cast('i', (2, 3)),
+))
+def test_buffer_is_copied(value):
+    frozen = _freeze(value)
+
+    assert isinstance(frozen, FrozenBuffer)
+    assert frozen.tolist() == memoryview(value).tolist()
+    assert frozen.format == memoryview(value).format
+    assert frozen.shape == memoryview(value).shape
+    assert frozen.memoryview().readonly
+    with pytest.raises(TypeError):
+        frozen.memoryview().cast('B')[0] = 0
+
+    memoryview(value).cast('B')[0] ^= 0xff
+    assert frozen.tolist() != memoryview(value).tolist()
+
+
+def test_readonly_bytes_view_is_not_copied():
+    view = memoryview(b'abcdef')[1:4]
+    frozen = buffer_freezer(view)
+
+    assert frozen.obj is view
+    assert frozen.tobytes() == b'bcd'
+
+
+def test_equal_and_hash():
+    first = _freeze(array.array('i', [1, 2, 3]))
+    second = _freeze(array.array('i', [1, 2, 3]))
+
+    assert first == second
+    assert hash(first) == hash(second)
+    assert first != _freeze(array.array('i', [1, 2, 4]))
+    assert first != _freeze(array.array('I', [1, 2, 3]))
+    assert first != (1, 2, 3)
+
+
+def test_in_context_dict():
+    ctx = bc.ContextDict.new({'samples': array.array('d', [0.5] * 1000), 'raw': bytearray(10)})
+    ctx.freeze()
+    other = bc.ContextDict.new({'samples': array.array('d', [0.5] * 1000), 'raw': bytes(10)})
+    other.freeze()
+
+    assert isinstance(ctx['samples'], FrozenBuffer)
+    assert len(ctx['samples']) == 1000
+    assert ctx == other
+    assert hash(ctx) == hash(other)
+
+
+def test_pickle():
+    frozen = _freeze(memoryview(array.array('h', range(6))).cast('B').cast('h', (3, 2)))
+    restored = pickle.loads(pickle.dumps(frozen))
+
+    assert restored == frozen
+    assert restored.shape == (3, 2)
+
+
+def test_format_not_supported_by_memoryview():
+    value = array.array('u', 'abc')
+    frozen = _freeze(value)
+
+    assert frozen.format == memoryview(value).format
+    assert frozen.shape == (3,)
+    assert frozen.itemsize == value.itemsize
+    assert frozen.tobytes() == value.tobytes()
+
+    restored = pickle.loads(pickle.dumps(frozen))
+    assert restored == frozen
+    assert hash(restored) == hash(frozen)
+    assert restored.format == frozen.format
+    assert restored.shape == (3,)
+    with pytest.raises(NotImplementedError):
+        restored[0]
+
+
+class TestNumpy:
+    @pytest.fixture(autouse=True)
+    def numpy(self):
+        return pytest.importorskip('numpy')
+
+    def test_writeable_array_is_copied(self, numpy):
+        original = numpy.arange(12, dtype='float64').reshape(3, 4)
+        frozen = _freeze({'array': original})['array']
+        original[0, 0] = 100
+
+        assert isinstance(frozen, FrozenBuffer)
+        assert not frozen.obj.flags.writeable
+        assert frozen.obj[0, 0] == 0
+        assert frozen == _freeze(numpy.arange(12, dtype='float64').reshape(3, 4))
+
+    def test_readonly_array_is_copied(self, numpy):
+        original = numpy.arange(5)
+        original.flags.writeable = False
+        frozen = ndarray_freezer(original)
+
+        assert frozen.obj is not original
+        # Whoever holds the original can make it writeable again
+        original.flags.writeable = True
+        original[0] = 99
+        assert frozen[0] == 0
+        assert frozen == _freeze(numpy.arange(5))
+
+    def test_pickle(self, numpy):
+        frozen = _freeze(numpy.arange(6).reshape(2, 3))
+        restored = pickle.loads(pickle.dumps(frozen))
+
+        assert restored == frozen
+        assert not restored.obj.flags.writeable
+
+    @pytest.mark.parametrize('dtype', ('>i4', '<f2', 'complex128', [('x', '<i4'), ('y', '>f8')],
+                                       'datetime64[s]', 'timedelta64[ms]'))
+    def test_formats(self, numpy, dtype):
+        original = numpy.arange(6).astype(dtype).reshape(2, 3)
+        frozen = _freeze(original)
+        original[0, 0] = original[1, 1]
+
+        assert isinstance(frozen, FrozenBuffer)
+        assert frozen.shape == (2, 3)
+        assert frozen.nbytes == original.nbytes
+        assert frozen.obj.dtype == numpy.dtype(dtype)
+        assert frozen[0, 0] == numpy.arange(6).astype(dtype)[0]
+        assert frozen == _freeze(numpy.arange(6).astype(dtype).reshape(2, 3))
+        assert frozen != _freeze(numpy.arange(6).astype(dtype))
+
+        restored = pickle.loads(pickle.dumps(frozen))
+        assert restored == frozen
+        assert hash(restored) == hash(frozen)
+
+    def test_object_array(self, numpy):
+        with pytest.raises(TypeError):
+            _freeze(numpy.array([{}, []], dtype=object))
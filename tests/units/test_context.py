@@ -1,5 +1,10 @@
+import asyncio
+import threading
+
 import pytest
 
+import bailiwick.binary
+import bailiwick.collections
 import bailiwick.context as bc
 import bailiwick.errors
 
@@ -7,19 +12,20 @@ import bailiwick.errors
 DATA = {'data': 0}
 
 
+pytestmark = pytest.mark.usefixtures('global_registry')
+
+
 @pytest.fixture
 def simple_ctx():
     ctx = bc.create_context('test', DATA)
     ctx.freeze()
-    yield ctx
-    del bc._CONTEXT.get()['test']
+    return ctx
 
 
 def test_create_ctx():
     app_ctx = bc.create_context('app', DATA)
     app_ctx.freeze()
     assert app_ctx['data'] == 0
-    del bc._CONTEXT.get()['app']
 
 
 def test_error_creating_created_ctx(simple_ctx):
@@ -35,3 +41,165 @@ def test_get_ctx(simple_ctx):
 
 def test_immutable():
     pass
+
+
+def test_register_ctx(other_ctx):
+    bc.register_context('registered', other_ctx)
+
+    assert bc.get_context('registered') is other_ctx
+    with pytest.raises(bailiwick.errors.DuplicateContext):
+        bc.register_context('registered', other_ctx)
+
+
+def test_create_mapped_ctx(tmp_path, other_ctx):
+    path = tmp_path / 'test.ctx'
+    bailiwick.binary.write_file(other_ctx, path)
+
+    ctx = bc.create_mapped_context('mapped', path)
+    assert ctx.frozen
+    assert ctx == other_ctx
+    assert bc.get_context('mapped') is ctx
+    with pytest.raises(bailiwick.errors.DuplicateContext):
+        bc.create_mapped_context('mapped', path)
+
+
+@pytest.fixture
+def other_ctx():
+    ctx = bailiwick.collections.ContextDict.new({'data': 1})
+    ctx.freeze()
+    return ctx
+
+
+def test_activate_ctx(simple_ctx, other_ctx):
+    with bc.activate_context('test', other_ctx) as active:
+        assert active is other_ctx
+        assert bc.get_context('test') is other_ctx
+
+        third_ctx = other_ctx.union({'data': 2})
+        third_ctx.freeze()
+        with bc.activate_context('test', third_ctx):
+            assert bc.get_context('test')['data'] == 2
+
+        assert bc.get_context('test') is other_ctx
+
+    assert bc.get_context('test') is simple_ctx
+
+
+def test_activate_ctx_decorator(simple_ctx, other_ctx):
+    @bc.activate_context('test', other_ctx)
+    def use_ctx(recurse):
+        if recurse:
+            use_ctx(False)
+        return bc.get_context('test')['data']
+
+    assert use_ctx(True) == 1
+    assert bc.get_context('test') is simple_ctx
+
+
+def test_activate_ctx_coroutine(simple_ctx, other_ctx):
+    @bc.activate_context('test', other_ctx)
+    async def use_ctx():
+        await asyncio.sleep(0)
+        return bc.get_context('test')['data']
+
+    assert asyncio.run(use_ctx()) == 1
+    assert bc.get_context('test') is simple_ctx
+
+
+def test_activate_ctx_is_thread_local(simple_ctx, other_ctx):
+    seen = []
+    with bc.activate_context('test', other_ctx):
+        thread = threading.Thread(target=lambda: seen.append(bc.get_context('test')))
+        thread.start()
+        thread.join()
+
+    assert seen == [simple_ctx]
+
+
+def test_activate_ctx_reentered(simple_ctx, other_ctx):
+    activation = bc.activate_context('test', other_ctx)
+    with activation:
+        with pytest.raises(RuntimeError, match='already active'):
+            with activation:
+                pass
+        assert bc.get_context('test') is other_ctx
+    assert bc.get_context('test') is simple_ctx
+
+    # Once exited, it can be used again
+    with activation:
+        assert bc.get_context('test') is other_ctx
+    assert bc.get_context('test') is simple_ctx
+
+
+def test_activate_unfrozen_ctx(simple_ctx):
+    with pytest.raises(bailiwick.errors.MustBeFrozen):
+        bc.activate_context('test', bailiwick.collections.ContextDict.new({'data': 1}))
+
+
+def test_activate_unknown_ctx(other_ctx):
+    with pytest.raises(KeyError):
+        with bc.activate_context('unknown', other_ctx):
+            pass
+
+
+def test_forked_registry(simple_ctx):
+    with bc.forked_registry():
+        forked_ctx = bc.create_context('forked', DATA)
+
+        assert bc.get_context('forked') is forked_ctx
+        assert bc.get_context('test') is simple_ctx
+
+    with pytest.raises(KeyError):
+        bc.get_context('forked')
+
+
+def test_fork_registry_isolates_tasks(simple_ctx):
+    async def task(name):
+        bc.fork_registry()
+        ctx = bc.create_context(name, {'name': name})
+        ctx.freeze()
+        await asyncio.sleep(0)
+        with pytest.raises(KeyError):
+            bc.get_context('first' if name == 'second' else 'second')
+        return bc.get_context(name)['name'], bc.get_context('test') is simple_ctx
+
+    async def main():
+        return await asyncio.gather(task('first'), task('second'))
+
+    assert asyncio.run(main()) == [('first', True), ('second', True)]
+    with pytest.raises(KeyError):
+        bc.get_context('first')
+
+
+def test_child_tasks_inherit_fork():
+    async def child():
+        return bc.get_context('parent')['data']
+
+    async def main():
+        bc.fork_registry()
+        bc.create_context('parent', DATA).freeze()
+        return await asyncio.create_task(child())
+
+    assert asyncio.run(main()) == 0
+
+
+def test_duplicate_in_fork(simple_ctx):
+    with bc.forked_registry():
+        with pytest.raises(bailiwick.errors.DuplicateContext):
+            bc.create_context('test')
+
+
+def test_nested_forks(simple_ctx):
+    with bc.forked_registry():
+        for number in range(3):
+            bc.create_context(f'outer{number}')
+        with bc.forked_registry():
+            inner_ctx = bc.create_context('inner')
+
+            assert bc.get_context('outer2') is not None
+            assert bc.get_context('inner') is inner_ctx
+            assert bc.get_context('test') is simple_ctx
+
+        with pytest.raises(KeyError):
+            bc.get_context('inner')
+        assert bc.get_context('outer0') is not None
@@ -0,0 +1,109 @@
+import pickle
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick import delta
+from bailiwick.errors import MustBeFrozen
+
+
+OLD = {'db': {'pool': {'size': 5, 'timeout': 1.0}, 'hosts': ['a', 'b']},
+       'log': {'level': 'info'}, 'name': 'app', 'removed': True}
+NEW = {'db': {'pool': {'size': 10, 'timeout': 1.0}, 'hosts': ['a', 'b']},
+       'log': {'level': 'info'}, 'name': 'app', 'added': {'x': 1}}
+
+
+class TestDigest:
+    def test_equal_contents(self, frozen):
+        assert delta.digest(frozen(OLD)) == delta.digest(frozen(dict(reversed(OLD.items()))))
+        assert delta.digest(frozen(OLD)) != delta.digest(frozen(NEW))
+        assert delta.digest((1, 'a')) != delta.digest(('a', 1))
+        assert delta.digest(frozenset((1, 'a'))) == delta.digest(frozenset(('a', 1)))
+        assert delta.digest(1) != delta.digest(1.0) != delta.digest(True)
+
+    def test_cached(self, frozen):
+        ctx = frozen(OLD)
+        ctx_digest = delta.digest(ctx)
+
+        assert ctx._digest == ctx_digest
+        assert ctx['db']._digest is not None
+
+    def test_undigestable(self, frozen):
+        ctx = frozen({'one': object()})
+
+        assert delta.digest(ctx) is None
+        assert delta.digest(ctx) is None
+
+    def test_unfrozen(self):
+        with pytest.raises(MustBeFrozen):
+            delta.digest(bc.ContextDict.new({}))
+
+    def test_equality_uses_digest(self, frozen):
+        one = frozen(OLD)
+        two = frozen(OLD)
+        delta.digest(one)
+        delta.digest(two)
+        two._store = None
+
+        assert one == two
+
+
+class TestDiff:
+    def test_diff(self, frozen):
+        changes = delta.diff(frozen(OLD), frozen(NEW))
+
+        assert set(changes) == {
+            ('set', ('db', 'pool', 'size'), 10),
+            ('set', ('added',), frozen({'x': 1})),
+            ('delete', ('removed',), None),
+        }
+
+    def test_no_changes(self, frozen):
+        old = frozen(OLD)
+
+        assert delta.diff(old, old) == ()
+        assert delta.diff(old, frozen(OLD)) == ()
+
+    def test_type_change(self, frozen):
+        assert delta.diff(frozen({'a': 1}), frozen({'a': 1.0})) == (
+            ('set', ('a',), 1.0),)
+
+    def test_unfrozen(self, frozen):
+        with pytest.raises(MustBeFrozen):
+            delta.diff(frozen(OLD), bc.ContextDict.new(NEW))
+
+
+class TestApplyDelta:
+    @pytest.mark.parametrize('persistent', (False, True))
+    def test_round_trip(self, persistent, frozen):
+        old = frozen(OLD, persistent=persistent)
+        new = frozen(NEW)
+
+        applied = delta.apply_delta(old, pickle.loads(pickle.dumps(delta.diff(old, new))))
+        assert applied == new
+        assert applied.frozen
+        assert applied.persistent is persistent
+        # Unchanged values are shared with the old context
+        assert applied['log'] is old['log']
+        assert applied['db']['hosts'] is old['db']['hosts']
+
+    def test_freezes_values(self, frozen):
+        applied = delta.apply_delta(frozen(OLD), [('set', ('db', 'hosts'), ['c'])])
+
+        assert applied['db']['hosts'] == ('c',)
+
+    def test_empty(self, frozen):
+        old = frozen(OLD)
+
+        assert delta.apply_delta(old, ()) is old
+
+    @pytest.mark.parametrize('change, exception', (
+        (('delete', ('missing',), None), KeyError),
+        (('set', ('missing', 'x'), 1), KeyError),
+        (('set', ('name', 'x'), 1), ValueError),
+        (('set', (), 1), ValueError),
+        (('replace', ('name',), 1), ValueError),
+    ))
+    def test_errors(self, change, exception, frozen):
+        with pytest.raises(exception):
+            delta.apply_delta(frozen(OLD), [change])
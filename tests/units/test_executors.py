@@ -0,0 +1,93 @@
+import gc
+import os
+
+import pytest
+
+import bailiwick.collections
+import bailiwick.context as bc
+import bailiwick.executors as be
+
+
+pytestmark = pytest.mark.usefixtures('global_registry')
+
+
+@pytest.fixture
+def app_ctx():
+    ctx = bc.create_context('app', {'data': [0]})
+    ctx.freeze()
+    return ctx
+
+
+def read_app_ctx(key='data'):
+    return bc.get_context('app')[key]
+
+
+def app_ctx_identity(_dummy=None):
+    return id(bc.get_context('app')), os.getpid()
+
+
+class TestThreadPool:
+    def test_active_context(self, app_ctx, frozen):
+        other_ctx = frozen({'data': 1})
+        with be.ContextThreadPoolExecutor(max_workers=1) as executor:
+            with bc.activate_context('app', other_ctx):
+                future = executor.submit(bc.get_context, 'app')
+
+            assert future.result() is other_ctx
+            assert executor.submit(bc.get_context, 'app').result() is app_ctx
+
+    def test_forked_registry(self, app_ctx):
+        with be.ContextThreadPoolExecutor(max_workers=1) as executor:
+            with bc.forked_registry():
+                forked_ctx = bc.create_context('forked')
+                assert executor.submit(bc.get_context, 'forked').result() is forked_ctx
+
+
+class TestProcessPool:
+    def test_active_context(self, app_ctx, frozen):
+        with be.ContextProcessPoolExecutor(max_workers=1) as executor:
+            with bc.activate_context('app', frozen({'data': [1]})):
+                assert executor.submit(read_app_ctx).result() == (1,)
+            assert executor.submit(read_app_ctx).result() == (0,)
+
+    def test_context_sent_once(self, app_ctx, frozen):
+        with be.ContextProcessPoolExecutor(max_workers=1) as executor:
+            results = list(executor.map(app_ctx_identity, range(4)))
+
+            assert len(set(results)) == 1
+            assert len(os.listdir(executor._ctx_directory)) == 1
+
+    def test_equal_contexts_sent_separately(self, app_ctx, frozen):
+        # 1, True, and 1.0 are equal and hash the same but must not share one pickle
+        with be.ContextProcessPoolExecutor(max_workers=1) as executor:
+            results = []
+            for value in (1, True, 1.0):
+                with bc.activate_context('app', frozen({'data': value})):
+                    results.append(executor.submit(read_app_ctx).result())
+
+            assert [type(result) for result in results] == [int, bool, float]
+
+    def test_pickle_removed_with_context(self, app_ctx, frozen):
+        with be.ContextProcessPoolExecutor(max_workers=1) as executor:
+            other_ctx = frozen({'data': 1})
+            with bc.activate_context('app', other_ctx):
+                executor.submit(read_app_ctx).result()
+            assert len(os.listdir(executor._ctx_directory)) == 1
+
+            del other_ctx
+            gc.collect()
+            assert os.listdir(executor._ctx_directory) == []
+            assert executor._ctx_tokens == {}
+
+    def test_unhashable_context(self, app_ctx, frozen):
+        unhashable = frozen({'data': [2]}, freezer=bailiwick.collections.identity_freezer)
+        with be.ContextProcessPoolExecutor(max_workers=1) as executor:
+            with bc.activate_context('app', unhashable):
+                assert executor.submit(read_app_ctx).result() == [2]
+
+    def test_directory_removed(self, app_ctx):
+        executor = be.ContextProcessPoolExecutor(max_workers=1)
+        executor.submit(read_app_ctx).result()
+        executor.shutdown()
+
+        assert not os.path.exists(executor._ctx_directory)
@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+import bailiwick.collections as bc
+import bailiwick.errors
+from bailiwick.lazy import LazyFrozenMap
+
+
+class CountingFreezer:
+    def __init__(self):
+        self.calls = []
+        self.freezer = bc.DefaultFreezer()
+
+    def __call__(self, obj):
+        self.calls.append(obj)
+        return self.freezer(obj)
+
+
+@pytest.fixture
+def lazy_ctx():
+    freezer = CountingFreezer()
+    ctx = bc.ContextDict.new({'one': [1], 'two': {'three': [3]}, 'four': 4}, freezer=freezer)
+    ctx.freeze(lazy=True)
+    return ctx
+
+
+class TestLazyFreeze:
+    def test_nothing_frozen_up_front(self, lazy_ctx):
+        assert lazy_ctx.frozen
+        assert lazy_ctx.freezer.calls == []
+        assert list(lazy_ctx) == ['one', 'two', 'four']
+        assert 'two' in lazy_ctx
+        assert len(lazy_ctx) == 3
+        assert lazy_ctx.freezer.calls == []
+
+    def test_frozen_on_access(self, lazy_ctx):
+        assert lazy_ctx['one'] == (1,)
+        assert lazy_ctx['one'] is lazy_ctx['one']
+        assert lazy_ctx['two']['three'] == (3,)
+        assert lazy_ctx.freezer.calls == [[1], {'three': [3]}]
+        assert lazy_ctx._store.pending == 1
+
+    def test_still_immutable(self, lazy_ctx):
+        with pytest.raises(TypeError):
+            lazy_ctx['five'] = 5
+        with pytest.raises(AttributeError):
+            lazy_ctx.update({'five': 5})
+
+    def test_hash_and_equality(self, lazy_ctx):
+        eager = bc.ContextDict.new({'one': [1], 'two': {'three': [3]}, 'four': 4})
+        eager.freeze()
+
+        assert hash(lazy_ctx) == hash(eager)
+        assert lazy_ctx == eager
+        assert lazy_ctx._store.pending == 0
+
+    def test_later_changes_not_seen(self):
+        nested = [1]
+        shared = {'nested': nested}
+        table = {'one': shared, 'two': shared}
+        ctx = bc.ContextDict.new({'table': table, 'items': [nested]})
+        ctx.freeze(lazy=True)
+
+        table['new'] = 2
+        shared['new'] = 2
+        nested.append(3)
+
+        assert ctx['table'] == {'one': {'nested': (1,)}, 'two': {'nested': (1,)}}
+        assert ctx['table']['one'] is ctx['table']['two']
+        assert ctx['items'] == ((1,),)
+
+    def test_other_values_frozen_up_front(self):
+        freezer = CountingFreezer()
+        inner = bc.ContextDict.new({'one': [1]}, must_be_frozen=False)
+        ctx = bc.ContextDict.new({'inner': inner, 'list': [1]}, freezer=freezer)
+        ctx.freeze(lazy=True)
+
+        assert freezer.calls == [inner]
+        inner['one'].append(2)
+        assert ctx['inner'] == {'one': (1,)}
+        assert ctx._store.pending == 1
+
+    def test_cyclic_data_raises_up_front(self):
+        data = {'one': 1}
+        data['self'] = data
+        ctx = bc.ContextDict.new({'data': data})
+
+        with pytest.raises(bailiwick.errors.CyclicData):
+            ctx.freeze(lazy=True)
+        assert not ctx.frozen
+        assert ctx._store['data'] is data
+
+    def test_deep_nesting_frozen_up_front(self):
+        data = []
+        for _dummy in range(bc.MAX_RECURSION_DEPTH * 2):
+            data = [data]
+        ctx = bc.ContextDict.new({'data': data})
+        ctx.freeze(lazy=True)
+
+        assert ctx._store.pending == 0
+
+    def test_freeze_again(self, lazy_ctx):
+        store = lazy_ctx._store
+        lazy_ctx.freeze()
+
+        assert lazy_ctx._store is store
+
+
+class TestLazyFrozenMap:
+    def test_freezes_once_across_threads(self):
+        calls = []
+
+        def freezer(obj):
+            calls.append(obj)
+            return tuple(obj)
+
+        lazy_map = LazyFrozenMap({'one': [1]}, freezer)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(lazy_map['one']))
+                   for _dummy in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+
+    def test_missing_key(self):
+        lazy_map = LazyFrozenMap({}, tuple)
+
+        with pytest.raises(KeyError):
+            lazy_map['one']
@@ -0,0 +1,87 @@
+import io
+import json
+import sys
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick import loaders
+
+
+DOCUMENT = {'name': 'app', 'db': {'hosts': ['a', 'b'], 'port': 5432}, 'matrix': [[1, 2], [3]]}
+
+
+def test_load_json():
+    ctx = loaders.load_json(io.StringIO(json.dumps(DOCUMENT)))
+
+    assert ctx.frozen
+    assert ctx['db']['hosts'] == ('a', 'b')
+    assert ctx['matrix'] == ((1, 2), (3,))
+    assert isinstance(ctx['db'], bc.ContextDict)
+    assert ctx['db'].frozen
+    assert hash(ctx)
+
+
+def test_load_json_same_as_freeze():
+    expected = bc.ContextDict.new(DOCUMENT)
+    expected.freeze()
+
+    assert loaders.load_json(io.StringIO(json.dumps(DOCUMENT))) == expected
+
+
+def test_load_json_not_object():
+    with pytest.raises(ValueError):
+        loaders.load_json(io.StringIO('[1, 2]'))
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason='tomllib is new in Python-3.11')
+def test_load_toml():
+    ctx = loaders.load_toml(io.BytesIO(b'name = "app"\n[db]\nhosts = ["a", "b"]\n'))
+
+    assert ctx.frozen
+    assert ctx['db']['hosts'] == ('a', 'b')
+
+
+def test_load_toml_unavailable(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'tomllib', None)
+    monkeypatch.setitem(sys.modules, 'tomli', None)
+
+    with pytest.raises(ImportError, match='tomli') as exc_info:
+        loaders.load_toml(io.BytesIO(b'name = "app"\n'))
+    assert isinstance(exc_info.value.__cause__, ImportError)
+
+
+class TestEnv:
+    ENVIRON = {'APP_DB__HOST': 'localhost', 'APP_DB__PORT': '5432', 'APP_NAME': 'app',
+               'HOME': '/root'}
+
+    def test_load_env(self):
+        ctx = loaders.load_env(self.ENVIRON, prefix='APP_')
+
+        assert ctx.frozen
+        assert ctx == {'db': {'host': 'localhost', 'port': '5432'}, 'name': 'app'}
+        assert ctx['db'].frozen
+
+    def test_no_nesting(self):
+        ctx = loaders.load_env(self.ENVIRON, prefix='APP_', separator='', lowercase=False)
+
+        assert ctx == {'DB__HOST': 'localhost', 'DB__PORT': '5432', 'NAME': 'app'}
+
+    @pytest.mark.parametrize('environ', (
+        {'A': '1', 'A__B': '2'},
+        {'A__B': '2', 'A': '1'},
+    ))
+    def test_value_and_nested(self, environ):
+        with pytest.raises(ValueError):
+            loaders.load_env(environ)
+
+    def test_load_env_file(self):
+        env_file = io.StringIO('# comment\n\nexport APP_NAME="my app"\nAPP_DB__HOST = db\n'
+                               "OTHER='x'\n")
+
+        ctx = loaders.load_env_file(env_file, prefix='APP_')
+        assert ctx == {'name': 'my app', 'db': {'host': 'db'}}
+
+    def test_bad_line(self):
+        with pytest.raises(ValueError, match='Line 2'):
+            loaders.load_env_file(io.StringIO('A=1\nnot an assignment\n'))
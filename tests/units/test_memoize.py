@@ -0,0 +1,117 @@
+import pytest
+
+import bailiwick.collections
+import bailiwick.context as bctx
+import bailiwick.errors
+from bailiwick import memoize as bm
+from bailiwick.schema import Schema
+
+
+pytestmark = pytest.mark.usefixtures('global_registry')
+
+
+@pytest.fixture
+def app_ctx():
+    ctx = bctx.create_context('app', {'scale': 2, 'name': 'one'})
+    ctx.freeze()
+    return ctx
+
+
+def test_caches_per_context(app_ctx, frozen):
+    calls = []
+
+    @bm.memoize('app')
+    def scaled(value):
+        calls.append(value)
+        return value * bctx.get_context('app')['scale']
+
+    assert scaled(3) == 6
+    assert scaled(3) == 6
+    with bctx.activate_context('app', frozen({'scale': 10, 'name': 'one'})):
+        assert scaled(3) == 30
+    assert scaled(3) == 6
+
+    assert calls == [3, 3]
+    assert scaled.cache_info() == bm.CacheInfo(hits=2, misses=2, maxsize=128, currsize=2)
+
+
+def test_keys(app_ctx, frozen):
+    calls = []
+
+    @bm.memoize('app', keys=('scale',))
+    def scaled(value):
+        calls.append(value)
+        return value * bctx.get_context('app')['scale']
+
+    scaled(3)
+    with bctx.activate_context('app', frozen({'scale': 2, 'name': 'two'})):
+        assert scaled(3) == 6
+
+    assert calls == [3]
+
+
+def test_keys_with_schema_record(app_ctx):
+    record = Schema('App', ('scale', 'name'))(scale=5, name='record')
+
+    @bm.memoize('app', keys=('scale',))
+    def scaled(value):
+        return value * bctx.get_context('app')['scale']
+
+    with bctx.activate_context('app', record):
+        assert scaled(3) == 15
+
+
+def test_maxsize(app_ctx):
+    @bm.memoize('app', maxsize=2)
+    def identity(value):
+        return value
+
+    for value in (1, 2, 1, 3, 1):
+        identity(value)
+
+    assert identity.cache_info() == bm.CacheInfo(hits=2, misses=3, maxsize=2, currsize=2)
+    identity(2)
+    assert identity.cache_info().misses == 4
+
+    identity.cache_clear()
+    assert identity.cache_info() == bm.CacheInfo(hits=0, misses=0, maxsize=2, currsize=0)
+
+
+def test_ttl(app_ctx, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(bm.time, 'monotonic', lambda: now[0])
+
+    @bm.memoize('app', ttl=10)
+    def identity(value):
+        return value
+
+    identity(1)
+    now[0] += 5
+    identity(1)
+    now[0] += 10
+    identity(1)
+
+    assert identity.cache_info().hits == 1
+    assert identity.cache_info().misses == 2
+
+
+def test_kwargs(app_ctx):
+    @bm.memoize('app')
+    def add(one, two=0):
+        return one + two
+
+    assert add(1, two=2) == 3
+    assert add(1, two=3) == 4
+    assert add(1, two=2) == 3
+    assert add.cache_info().hits == 1
+
+
+def test_unfrozen_context():
+    bctx.create_context('unfrozen')
+
+    @bm.memoize('unfrozen')
+    def identity(value):
+        return value
+
+    with pytest.raises(bailiwick.errors.MustBeFrozen):
+        identity(1)
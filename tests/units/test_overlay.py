@@ -0,0 +1,97 @@
+import pytest
+
+import bailiwick.collections as bc
+import bailiwick.errors
+from bailiwick.overlay import OverlayMap
+from bailiwick.persistent import PersistentMap
+
+
+@pytest.fixture
+def default_ctx():
+    ctx = bc.ContextDict.new({'one': 1, 'two': [2], 'three': {'four': 4}})
+    ctx.freeze()
+    return ctx
+
+
+class TestOverlayMap:
+    def test_lookup(self):
+        overlay = OverlayMap({'one': 'uno'}, {'one': 1, 'two': 2})
+
+        assert overlay['one'] == 'uno'
+        assert overlay['two'] == 2
+        with pytest.raises(KeyError):
+            overlay['three']
+
+    def test_iteration_order(self):
+        overlay = OverlayMap({'three': 3, 'one': 'uno'}, {'one': 1, 'two': 2})
+
+        assert list(overlay) == ['one', 'two', 'three']
+        assert len(overlay) == 3
+        assert dict(overlay) == {'one': 'uno', 'two': 2, 'three': 3}
+
+    def test_none_values(self):
+        overlay = OverlayMap({'one': None}, OverlayMap({}, {'one': 1}))
+
+        assert overlay['one'] is None
+
+    def test_compacts_after_wasted_lookups(self):
+        overlay = {'one': 1, 'two': 2}
+        for number in range(3):
+            overlay = OverlayMap({number: number}, overlay)
+
+        assert overlay.depth == 3
+        # Each lookup of a key from the root skips two overlays.  The root has two keys.
+        overlay['one']
+        assert overlay.depth == 3
+        overlay['two']
+
+        assert overlay.depth == 1
+        assert dict(overlay) == {'one': 1, 'two': 2, 0: 0, 1: 1, 2: 2}
+
+    def test_flattened_persistent(self):
+        overlay = OverlayMap({'two': 2}, OverlayMap({'one': 'uno'}, PersistentMap(one=1)))
+        flat = overlay.flattened()
+
+        assert isinstance(flat, PersistentMap)
+        assert flat == {'one': 'uno', 'two': 2}
+
+
+class TestDerive:
+    def test_derive(self, default_ctx):
+        derived = default_ctx.derive({'one': [1], 'five': 5})
+
+        assert derived.frozen
+        assert derived['one'] == (1,)
+        assert derived['five'] == 5
+        assert derived['two'] is default_ctx['two']
+        assert len(derived) == 4
+        assert default_ctx['one'] == 1
+
+    def test_derive_requires_frozen(self):
+        ctx = bc.ContextDict.new({'one': 1})
+
+        with pytest.raises(bailiwick.errors.MustBeFrozen):
+            ctx.derive({'two': 2})
+
+    def test_derived_is_immutable(self, default_ctx):
+        derived = default_ctx.derive({'five': 5})
+
+        with pytest.raises(TypeError):
+            derived['six'] = 6
+
+    def test_max_depth(self, default_ctx):
+        ctx = default_ctx
+        for number in range(10):
+            ctx = ctx.derive({number: number}, max_depth=4)
+
+        assert ctx._store.depth <= 4
+        assert ctx[0] == 0
+        assert ctx['one'] == 1
+
+    def test_equality(self, default_ctx):
+        derived = default_ctx.derive({'five': 5})
+        union = default_ctx.union({'five': 5})
+        union.freeze()
+
+        assert derived == union
+        assert hash(derived) == hash(union)
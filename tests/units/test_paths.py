@@ -0,0 +1,24 @@
+from bailiwick.paths import PathIndex
+
+
+ROOT = {'db': {'pool': {'size': 5}, 'host': 'h'}, 'dbx': 1, 2: 'not a str key'}
+
+
+def test_lookup():
+    index = PathIndex(ROOT)
+
+    assert index['db.pool.size'] == 5
+    assert index['db.pool'] == {'size': 5}
+    assert 'dbx' in index
+    assert 'db.missing' not in index
+    assert len(index) == 5
+
+
+def test_prefix_items():
+    index = PathIndex(ROOT)
+
+    assert list(index.prefix_items('db')) == [
+        ('db.host', 'h'), ('db.pool', {'size': 5}), ('db.pool.size', 5)]
+    assert list(index.prefix_items('db.host')) == []
+    assert [path for path, _dummy in index.prefix_items()] == [
+        'db', 'db.host', 'db.pool', 'db.pool.size', 'dbx']
@@ -0,0 +1,196 @@
+import pickle
+import random
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick.persistent import PersistentMap, PersistentMapBuilder
+
+
+class CollidingKey:
+    """Keys which all hash the same unless given different hashes."""
+
+    def __init__(self, name, key_hash=1):
+        self.name = name
+        self.key_hash = key_hash
+
+    def __hash__(self):
+        return self.key_hash
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+
+    def __repr__(self):
+        return f'CollidingKey({self.name!r})'
+
+
+class TestPersistentMap:
+    def test_constructor(self):
+        pmap = PersistentMap({'one': 1}, two=2)
+
+        assert len(pmap) == 2
+        assert pmap['one'] == 1
+        assert pmap['two'] == 2
+        assert dict(pmap) == {'one': 1, 'two': 2}
+
+    def test_set_leaves_original_alone(self):
+        original = PersistentMap(one=1)
+        changed = original.set('one', 'uno').set('two', 2)
+
+        assert dict(original) == {'one': 1}
+        assert dict(changed) == {'one': 'uno', 'two': 2}
+
+    def test_set_same_value(self):
+        value = object()
+        pmap = PersistentMap(one=value)
+
+        assert pmap.set('one', value) is pmap
+
+    def test_delete(self):
+        pmap = PersistentMap(one=1, two=2)
+
+        assert dict(pmap.delete('one')) == {'two': 2}
+        assert len(pmap) == 2
+        with pytest.raises(KeyError):
+            pmap.delete('three')
+
+    def test_missing_key(self):
+        pmap = PersistentMap(one=1)
+
+        with pytest.raises(KeyError):
+            pmap['two']
+        assert pmap.get('two') is None
+        assert 'two' not in pmap
+
+    def test_collisions(self):
+        keys = [CollidingKey(name) for name in 'abc'] + [CollidingKey('d', key_hash=1 + 2 ** 40)]
+        pmap = PersistentMap()
+        for number, key in enumerate(keys):
+            pmap = pmap.set(key, number)
+
+        assert len(pmap) == 4
+        assert [pmap[key] for key in keys] == [0, 1, 2, 3]
+        assert CollidingKey('e') not in pmap
+
+        for key in keys:
+            pmap = pmap.delete(key)
+        assert len(pmap) == 0
+
+    def test_matches_dict(self):
+        rng = random.Random(0)
+        pmap = PersistentMap()
+        model = {}
+        for _dummy in range(5000):
+            key = rng.randrange(600)
+            if key in model and rng.random() < 0.4:
+                pmap = pmap.delete(key)
+                del model[key]
+            else:
+                pmap = pmap.set(key, -key)
+                model[key] = -key
+
+        assert len(pmap) == len(model)
+        assert dict(pmap) == model
+
+    def test_shares_structure(self):
+        pmap = PersistentMap((str(number), number) for number in range(10000))
+        changed = pmap.set('0', 'zero')
+
+        shared = set(map(id, pmap._root.entries)) & set(map(id, changed._root.entries))
+        assert len(shared) == len(pmap._root.entries) - 1
+
+    def test_equality_and_hash(self):
+        pmap = PersistentMap(one=1, two=2)
+
+        assert pmap == {'one': 1, 'two': 2}
+        assert pmap == PersistentMap(two=2, one=1)
+        assert pmap != {'one': 1}
+        assert hash(pmap) == hash(PersistentMap(two=2, one=1))
+
+    def test_pickle(self):
+        pmap = PersistentMap(one=1, two=(2,))
+
+        assert pickle.loads(pickle.dumps(pmap)) == pmap
+
+
+class TestPersistentMapBuilder:
+    def test_pending_changes(self):
+        builder = PersistentMapBuilder(PersistentMap(one=1, two=2))
+        builder['two'] = 'dos'
+        builder['three'] = 3
+        del builder['one']
+
+        assert dict(builder) == {'two': 'dos', 'three': 3}
+        assert len(builder) == 2
+        assert builder.pending == {'two': 'dos', 'three': 3}
+        assert builder.build() == {'two': 'dos', 'three': 3}
+
+    def test_delete_missing(self):
+        builder = PersistentMapBuilder()
+
+        with pytest.raises(KeyError):
+            del builder['one']
+
+
+class TestPersistentContextDict:
+    def test_freeze(self):
+        ctx = bc.ContextDict.new({'one': [1]}, persistent=True)
+        ctx.freeze()
+
+        assert ctx.persistent
+        assert isinstance(ctx._store, PersistentMap)
+        assert ctx['one'] == (1,)
+
+    def test_union_shares_base(self):
+        base = bc.ContextDict.new({str(number): [number] for number in range(100)},
+                                  persistent=True)
+        base.freeze()
+
+        derived = base.union({'1': ['one'], 'new': {'a': []}})
+        derived.freeze()
+
+        assert derived.persistent
+        assert derived['1'] == ('one',)
+        assert derived['new'] == {'a': ()}
+        assert derived['2'] is base['2']
+        assert len(derived) == 101
+        assert base['1'] == (1,)
+
+    def test_union_only_freezes_overrides(self):
+        frozen = []
+
+        def freezer(obj):
+            frozen.append(dict(obj))
+            return bc.DefaultFreezer()(obj)
+
+        base = bc.ContextDict.new({'one': 1, 'two': 2}, persistent=True, freezer=freezer)
+        base.freeze()
+        frozen.clear()
+
+        derived = base.union({'three': [3]})
+        derived.freeze()
+
+        assert frozen == [{'three': [3]}]
+
+    def test_unfrozen_union(self):
+        base = bc.ContextDict.new({'one': 1}, persistent=True)
+        base['two'] = 2
+
+        derived = base.union({'three': 3})
+        del derived['one']
+        derived.freeze()
+
+        assert dict(derived) == {'two': 2, 'three': 3}
+        assert base.frozen is False
+        assert len(base) == 2
+
+    def test_equal_to_dict_backed(self):
+        data = {'one': [1], 'two': {'three': 3}}
+        persistent = bc.ContextDict.new(data, persistent=True)
+        persistent.freeze()
+        regular = bc.ContextDict.new(data)
+        regular.freeze()
+
+        assert persistent == regular
+        assert regular == persistent
+        assert hash(persistent) == hash(regular)
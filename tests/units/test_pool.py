@@ -0,0 +1,126 @@
+import gc
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick.pool import InternPool
+
+
+@pytest.fixture
+def pool():
+    return InternPool()
+
+
+class TestIntern:
+    @pytest.mark.parametrize('value, duplicate', (
+        ((1, 'two'), tuple([1, 'two'])),
+        (frozenset((1, 2)), frozenset([1, 2])),
+        ('three', ''.join(['th', 'ree'])),
+        (b'four', b''.join([b'fo', b'ur'])),
+    ))
+    def test_strong_values(self, pool, value, duplicate):
+        assert duplicate is not value
+
+        assert pool.intern(value) is value
+        assert pool.intern(duplicate) is value
+        assert pool.hits == 1
+        assert pool.misses == 1
+
+    def test_context_dict(self, pool, frozen):
+        first = frozen({'one': 1})
+        second = frozen({'one': 1})
+
+        assert pool.intern(first) is first
+        assert pool.intern(second) is first
+        assert pool.bytes_saved > 0
+        assert pool.hit_rate == 0.5
+
+    @pytest.mark.parametrize('first, second', (
+        ((1,), (1.0,)),
+        ((1,), (True,)),
+        ((0.0,), (-0.0,)),
+        (frozenset((1, 2)), frozenset((1.0, 2))),
+        ((('nested',),), (('nested',),)),
+    ))
+    def test_equal_but_not_same(self, pool, first, second):
+        assert first == second
+
+        pool.intern(first)
+
+        assert pool.intern(second) is second
+
+    def test_mapping_order_matters(self, pool, frozen):
+        first = frozen({'one': 1, 'two': 2})
+        second = frozen({'two': 2, 'one': 1})
+
+        pool.intern(first)
+
+        assert pool.intern(second) is second
+
+    def test_unhashable(self, pool):
+        value = [1, 2]
+        assert pool.intern(value) is value
+        assert len(pool) == 0
+
+    def test_weak_values_are_released(self, pool, frozen):
+        pool.intern(frozen({'one': 1}))
+        gc.collect()
+
+        assert len(pool) == 0
+
+    def test_strong_values_are_bounded(self):
+        pool = InternPool(max_strong=2)
+        for number in range(5):
+            pool.intern((number,))
+
+        assert len(pool) == 2
+
+    def test_clear(self, pool):
+        pool.intern((1,))
+        pool.clear()
+
+        assert len(pool) == 0
+
+
+class TestFreezerPool:
+    def test_separate_freezes_share(self, pool):
+        freezer = bc.DefaultFreezer(pool=pool)
+        data = {'one': [1, 'two'], 'three': {'four': (4,)}, 'five': {5}}
+
+        first = freezer(data)
+        second = freezer({'one': [1, 'two'], 'three': {'four': [4]}, 'five': {5}})
+
+        assert second is first
+        assert pool.hits > 0
+
+    def test_nested_values_share(self, pool):
+        freezer = bc.DefaultFreezer(pool=pool)
+
+        first = freezer({'name': 'a', 'shared': {'tags': ['x', 'y']}})
+        second = freezer({'name': 'b', 'shared': {'tags': ['x', 'y']}})
+
+        assert first is not second
+        assert second['shared'] is first['shared']
+        assert second['shared']['tags'] is first['shared']['tags']
+
+    @pytest.mark.parametrize('iterative', (False, True))
+    def test_strings_and_keys_share(self, pool, iterative):
+        freezer = bc.DefaultFreezer(pool=pool, iterative=iterative)
+        key = ''.join(['ke', 'y'])
+        value = ''.join(['val', 'ue'])
+
+        first = freezer({'key': 'value'})
+        second = freezer({key: [value]})
+
+        assert next(iter(second)) is next(iter(first))
+        assert second[key][0] is first['key']
+
+    def test_context_dict_freeze(self, pool):
+        freezer = bc.DefaultFreezer(pool=pool)
+        first = bc.ContextDict.new({'one': [1]}, freezer=freezer)
+        second = bc.ContextDict.new({'one': [1]}, freezer=freezer)
+
+        first.freeze()
+        second.freeze()
+
+        assert second._store is first._store
@@ -0,0 +1,203 @@
+import collections
+import pickle
+import weakref
+
+import pytest
+
+import bailiwick.collections as bc
+import bailiwick.context as bctx
+import bailiwick.schema as schema_module
+from bailiwick.errors import SchemaError
+from bailiwick.schema import Field, Schema, SchemaRecord
+
+
+SERVER = Schema('Server', ('host', 'port', 'tags'))
+
+
+@pytest.fixture
+def record():
+    return SERVER({'host': 'localhost', 'port': 8080, 'tags': ['a', 'b']})
+
+
+class TestRecord:
+    def test_mapping(self, record):
+        assert isinstance(record, SchemaRecord)
+        assert record.frozen
+        assert record.schema is SERVER
+        assert record['port'] == 8080
+        assert record['tags'] == ('a', 'b')
+        assert list(record) == ['host', 'port', 'tags']
+        assert len(record) == 3
+        assert 'host' in record
+        assert 'missing' not in record
+        assert record.get('missing') is None
+        with pytest.raises(KeyError):
+            record['missing']
+
+    def test_immutable(self, record):
+        with pytest.raises(AttributeError):
+            record._v0 = 'other'
+        with pytest.raises(AttributeError):
+            record.other = 'other'
+        with pytest.raises(TypeError):
+            record['host'] = 'other'
+        assert not hasattr(record, '__dict__')
+
+    def test_equal_to_context_dict(self, record):
+        ctx = bc.ContextDict.new({'host': 'localhost', 'port': 8080, 'tags': ['a', 'b']})
+        ctx.freeze()
+
+        assert record == ctx
+        assert ctx == record
+        assert hash(record) == hash(ctx)
+        assert record == SERVER(host='localhost', port=8080, tags=('a', 'b'))
+        assert record != SERVER(host='localhost', port=80, tags=('a', 'b'))
+
+    def test_not_copied_by_freezer(self, record):
+        ctx = bc.ContextDict.new({'server': record})
+        ctx.freeze()
+
+        assert ctx['server'] is record
+
+    def test_pickle(self, record):
+        restored = pickle.loads(pickle.dumps(record))
+
+        assert restored == record
+        assert type(restored) is type(record)
+        assert isinstance(restored, SERVER.record_type)
+        assert restored.schema is SERVER
+
+    def test_pickle_without_schema(self, record, monkeypatch):
+        # As in a process which has not created the schema
+        data = pickle.dumps(record)
+        monkeypatch.setattr(schema_module, '_SCHEMAS', weakref.WeakValueDictionary())
+        restored = pickle.loads(data)
+
+        assert restored == record
+        assert restored.schema is not SERVER
+        assert type(pickle.loads(data)) is type(restored)
+
+    @pytest.mark.usefixtures('global_registry')
+    def test_activate(self, record):
+        bctx.register_context('server', record)
+
+        with bctx.activate_context('server', SERVER(host='other', port=1, tags=())):
+            assert bctx.get_context('server')['host'] == 'other'
+        assert bctx.get_context('server') is record
+
+
+class TestSchema:
+    @pytest.mark.parametrize('data, message', (
+        ({'host': 'h', 'port': 1}, "missing keys: 'tags'"),
+        ({'host': 'h', 'port': 1, 'tags': (), 'extra': 1}, "unknown keys: 'extra'"),
+    ))
+    def test_mismatch(self, data, message):
+        with pytest.raises(SchemaError, match=message):
+            SERVER(data)
+
+    def test_duplicate_keys(self):
+        with pytest.raises(ValueError):
+            Schema('Bad', ('one', 'one'))
+
+    def test_keys_which_are_not_identifiers(self):
+        schema = Schema('Odd', ('items', 'with-dash', 1))
+        record = schema({'items': 'x', 'with-dash': 'y', 1: 'z'})
+
+        assert dict(record) == {'items': 'x', 'with-dash': 'y', 1: 'z'}
+        assert list(record.items()) == [('items', 'x'), ('with-dash', 'y'), (1, 'z')]
+
+
+TYPED = Schema('Typed', {
+    'host': Field(str),
+    'port': Field(int, default=80, convert=int),
+    'tags': Field((tuple, list), default=['web']),
+    'extra': None,
+})
+
+
+class TestValidate:
+    def test_convert_and_defaults(self):
+        store = TYPED.validate({'host': 'localhost', 'port': '8080', 'extra': {'a': [1]}})
+
+        assert store == {'host': 'localhost', 'port': 8080, 'tags': ('web',),
+                         'extra': {'a': (1,)}}
+        assert isinstance(store['extra'], bc.ContextDict)
+        assert store['extra'].frozen
+
+    def test_record(self):
+        record = TYPED(host='localhost', extra=None)
+
+        assert dict(record) == {'host': 'localhost', 'port': 80, 'tags': ('web',), 'extra': None}
+
+    @pytest.mark.parametrize('data, message', (
+        ({'host': 1, 'extra': None}, "'host' of the Typed schema must be str, not int"),
+        ({'host': 'h', 'tags': 'a', 'extra': None}, 'must be tuple or list, not str'),
+        ({'host': 'h', 'port': 'http', 'extra': None}, "'port' of the Typed schema could not be"),
+        ({'host': 'h'}, "missing keys: 'extra'"),
+        ({'host': 'h', 'extra': None, 'other': 1}, "unknown keys: 'other'"),
+    ))
+    def test_invalid(self, data, message):
+        with pytest.raises(SchemaError, match=message):
+            TYPED.validate(data)
+
+    def test_defaultdict(self):
+        data = collections.defaultdict(int, {'host': 'h'})
+
+        with pytest.raises(SchemaError, match="missing keys: 'extra'"):
+            TYPED.validate(data)
+        with pytest.raises(SchemaError, match="missing keys: 'port', 'tags'"):
+            SERVER(data)
+        assert data == {'host': 'h'}
+
+        data['extra'] = None
+        assert TYPED.validate(data)['port'] == 80
+        assert data == {'host': 'h', 'extra': None}
+
+    def test_nested_schema(self):
+        outer = Schema('Outer', {'server': Field(convert=SERVER)})
+        record = outer(server={'host': 'h', 'port': 1, 'tags': ()})
+
+        assert isinstance(record['server'], SERVER.record_type)
+        with pytest.raises(SchemaError, match='could not be converted'):
+            outer(server={'host': 'h'})
+
+    def test_custom_freezer(self):
+        freezer = bc.DefaultFreezer()
+        freezer.register(str, str.upper)
+        schema = Schema('Upper', ('name',), freezer=freezer)
+
+        assert schema(name='low')['name'] == 'LOW'
+        assert schema.validate({'name': 'low'}, freezer=lambda value: value) == {'name': 'low'}
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(TYPED))
+
+        assert restored is TYPED
+        assert restored.validate({'host': 'h', 'extra': 1})['port'] == 80
+
+
+class TestFreeze:
+    @pytest.mark.parametrize('persistent', (False, True))
+    def test_freeze_with_schema(self, persistent):
+        ctx = bc.ContextDict.new({'host': 'h', 'port': '1', 'extra': [1]}, persistent=persistent)
+        ctx.freeze(schema=TYPED, index_paths=True)
+
+        assert ctx.frozen
+        assert ctx.persistent is persistent
+        assert dict(ctx) == {'host': 'h', 'port': 1, 'tags': ('web',), 'extra': (1,)}
+        assert ctx.get_path('port') == 1
+
+    def test_invalid_is_not_frozen(self):
+        ctx = bc.ContextDict.new({'host': 'h'})
+        with pytest.raises(SchemaError):
+            ctx.freeze(schema=TYPED)
+
+        assert not ctx.frozen
+
+    @pytest.mark.parametrize('frozen, lazy', ((True, False), (False, True)))
+    def test_freeze_errors(self, frozen, lazy):
+        ctx = bc.ContextDict.new({'host': 'h', 'extra': 1})
+        if frozen:
+            ctx.freeze()
+        with pytest.raises(ValueError):
+            ctx.freeze(lazy=lazy, schema=TYPED)
@@ -0,0 +1,120 @@
+import json
+import pickle
+import threading
+
+import pytest
+
+import bailiwick.collections as bc
+from bailiwick.tracing import KeyTracer
+
+
+@pytest.fixture
+def ctx():
+    ctx = bc.ContextDict.new({'one': 1, 'two': 2, 'db': {'host': 'h', 'port': 1}})
+    ctx.freeze()
+    return ctx
+
+
+def read_one(ctx):
+    return ctx['one']
+
+
+def test_counts_and_call_sites(ctx):
+    with KeyTracer() as tracer:
+        tracer.watch(ctx, label='app')
+        for _dummy in range(3):
+            read_one(ctx)
+        assert ctx.get('two') == 2
+        assert ctx['db']['host'] == 'h'
+        assert 'missing' not in ctx
+
+    report = tracer.report()
+    assert report.hot(2) == [('app', 'one', 3), ('app', 'db', 1)]
+    assert report.counts['app']['db.host'] == 1
+    assert report.counts['app']['missing'] == 1
+    sites = report.call_sites[('app', 'one')]
+    assert [site[2] for site in sites] == ['read_one']
+    assert [site[2] for site in report.call_sites[('app', 'two')]] == [
+        'test_counts_and_call_sites']
+    assert report.unread() == {'app': ['db.port']}
+    json.dumps(report.as_dict())
+
+
+def test_stop_restores_class(ctx):
+    tracer = KeyTracer()
+    tracer.watch(ctx)
+    assert type(ctx) is not bc.ContextDict
+    assert pickle.loads(pickle.dumps(ctx)) == ctx
+    assert type(pickle.loads(pickle.dumps(ctx))) is bc.ContextDict
+
+    tracer.stop()
+    assert type(ctx) is bc.ContextDict
+    ctx['one']
+    assert tracer.report().counts == {}
+
+
+def test_iteration(ctx):
+    with KeyTracer() as tracer:
+        tracer.watch(ctx, label='app')
+        dict(ctx)
+
+    report = tracer.report()
+    assert report.iterations == {'app': 1}
+    assert report.unread() == {'app': ['db.host', 'db.port']}
+
+
+def test_one_tracer_per_context(ctx):
+    with KeyTracer() as tracer:
+        tracer.watch(ctx)
+        tracer.watch(ctx)
+        with pytest.raises(ValueError):
+            KeyTracer().watch(ctx)
+
+
+def test_one_tracer_per_context_across_threads(ctx):
+    tracers = [KeyTracer() for _dummy in range(8)]
+    barrier = threading.Barrier(len(tracers))
+    watching = []
+
+    def watch(tracer):
+        barrier.wait()
+        try:
+            tracer.watch(ctx)
+        except ValueError:
+            return
+        watching.append(tracer)
+
+    threads = [threading.Thread(target=watch, args=(tracer,)) for tracer in tracers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(watching) == 1
+    ctx['one']
+    assert watching[0].report().counts['context-0']['one'] == 1
+
+    for tracer in tracers:
+        tracer.stop()
+    assert type(ctx) is bc.ContextDict
+
+
+def test_shared_nested_context():
+    shared = {'x': 1, 'y': 2}
+    ctx = bc.ContextDict.new({'m': shared, 'n': shared})
+    ctx.freeze()
+    assert ctx['m'] is ctx['n']
+
+    with KeyTracer() as tracer:
+        tracer.watch(ctx, label='app')
+        assert ctx['n']['y'] == 2
+        assert ctx['m']['x'] == 1
+        assert ctx['m']['x'] == 1
+        assert ctx['m'] == ctx['n']
+
+    report = tracer.report()
+    assert report.counts['app']['m.x'] == 2
+    assert report.counts['app']['n.y'] == 1
+    assert 'n.x' not in report.counts['app']
+    assert report.unread() == {'app': ['m.y', 'n.x']}
+    assert type(ctx['m']) is bc.ContextDict